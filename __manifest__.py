@@ -1,11 +1,11 @@
 {
     "name": "SA40 Biopro Sync",
-    "version": "18.0.1.0",
+    "version": "18.0.1.2",
     "summary": "Sync ZKTeco SA40 attendance & users into Odoo",
     "description": "Fetch logs from an external SA40 sync server and map them to hr.employee and hr.attendance.",
     "category": "Human Resources",
     "author": "Shifter",
-    "depends": ["base", 'mail', "hr"],
+    "depends": ["base", 'mail', "hr", "hr_attendance"],
     'external_dependencies': {
         'python': ['openpyxl'],
     },
@@ -14,9 +14,16 @@
         # "security/sa40_security.xml",
         "views/sa40_device_views.xml",
         "views/sa40_user_views.xml",
-        # "views/sa40_sync_wizard_views.xml",
+        "views/sa40_sync_wizard_views.xml",
         "views/sa40_attendance_views.xml",
+        "views/sa40_attendance_archive_views.xml",
+        "views/sa40_fingerprint_views.xml",
         "views/sa40_export_wizard_view.xml",
+        "views/sa40_usb_import_wizard_views.xml",
+        "views/sa40_user_reconcile_wizard_views.xml",
+        "views/sa40_user_distribute_wizard_views.xml",
+        "views/sa40_sync_run_views.xml",
+        "views/sa40_punctuality_views.xml",
         "data/cron_data.xml",
     ],
     "installable": True,
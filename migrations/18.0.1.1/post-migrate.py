@@ -0,0 +1,28 @@
+# migrations/18.0.1.1/post-migrate.py
+"""
+Compact sa40_attendance_log: recover the punch type from the raw pyzk payload
+("<Attendance>: <user_id> : <timestamp> (<status>, <punch>)") into the new typed
+column, then drop the payloads, which only repeat the structured columns.
+"""
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    if not version:
+        return
+
+    cr.execute(r"""
+        UPDATE sa40_attendance_log
+           SET punch = substring(raw from '\(\s*-?\d+\s*,\s*(-?\d+)\s*\)\s*$')::integer
+         WHERE punch IS NULL
+           AND raw ~ '\(\s*-?\d+\s*,\s*-?\d+\s*\)\s*$'
+    """)
+    _logger.info("sa40_attendance_log: punch type recovered for %s rows", cr.rowcount)
+
+    # every device starts in the 'none' raw storage mode
+    cr.execute("UPDATE sa40_attendance_log SET raw = NULL WHERE raw IS NOT NULL")
+    _logger.info("sa40_attendance_log: raw payload dropped from %s rows "
+                 "(run VACUUM FULL sa40_attendance_log to give the space back to the OS)", cr.rowcount)
+    cr.execute("ANALYZE sa40_attendance_log")
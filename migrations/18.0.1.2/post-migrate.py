@@ -0,0 +1,99 @@
+# migrations/18.0.1.2/post-migrate.py
+"""
+Attendance timestamps used to be stored as read from the device clock (local time)
+while Odoo reads them as UTC. The sheets were implicitly read in the administrator's
+timezone: when it is set, give it to the devices (their new timezone field only holds
+the column default) and shift their stored logs to UTC. Without it nothing is shifted
+and the devices are logged, to be configured by hand.
+
+The unique index on (device, user, timestamp) stays in place: the punches that would
+collide once shifted (a clock reading inside the spring DST gap lands on the same
+instant as the one an hour later) are moved to ``<table>_tz_conflict`` for review.
+"""
+import logging
+
+_logger = logging.getLogger(__name__)
+
+TABLES = ('sa40_attendance_log', 'sa40_attendance_log_archive')
+
+# shifted rows are parked this far away first, so no row ever meets an unshifted one
+PARKING = "interval '1000 years'"
+
+
+def migrate(cr, version):
+    if not version:
+        return
+
+    cr.execute("""
+        SELECT p.tz
+          FROM ir_model_data d
+          JOIN res_users u ON u.id = d.res_id
+          JOIN res_partner p ON p.id = u.partner_id
+         WHERE d.module = 'base' AND d.name = 'user_admin'
+    """)
+    row = cr.fetchone()
+    tz = row and row[0]
+    if tz:
+        cr.execute("SELECT 1 FROM pg_timezone_names WHERE name = %s", (tz,))
+        if not cr.fetchone():
+            tz = None
+    cr.execute("SELECT id, name, tz FROM sa40_device ORDER BY id")
+    devices = cr.fetchall()
+    if not tz:
+        if devices:
+            _logger.warning(
+                "No usable administrator timezone: attendance timestamps of devices %s are left as read "
+                "from the device clocks. Set the Timezone of each device and convert its logs by hand.",
+                ', '.join(f"{name} (#{id_})" for id_, name, _tz in devices))
+        return
+    if tz == 'UTC':
+        return
+
+    cr.execute("UPDATE sa40_device SET tz = %s", (tz,))
+    _logger.info("Timezone %s given to devices %s; their logs are shifted to UTC",
+                 tz, ', '.join(f"{name} (#{id_})" for id_, name, _tz in devices))
+
+    for table in TABLES:
+        conflict_table = f'{table}_tz_conflict'
+        # keep the punch whose clock reading exists in the timezone, park the other ones
+        cr.execute(f"""
+            WITH ranked AS (
+                SELECT t.id,
+                       (t.timestamp AT TIME ZONE d.tz) AT TIME ZONE d.tz = t.timestamp AS real_time,
+                       row_number() OVER (
+                           PARTITION BY t.device_id, t.log_user_uid, (t.timestamp AT TIME ZONE d.tz) AT TIME ZONE 'UTC'
+                           ORDER BY (t.timestamp AT TIME ZONE d.tz) AT TIME ZONE d.tz = t.timestamp DESC, t.id
+                       ) AS rank
+                  FROM {table} t
+                  JOIN sa40_device d ON d.id = t.device_id
+                 WHERE t.log_user_uid IS NOT NULL
+            )
+            SELECT id, real_time FROM ranked WHERE rank > 1
+        """)
+        colliding = cr.fetchall()
+        if any(real_time for _id, real_time in colliding):
+            # two existing clock readings cannot meet on one instant: the data is not what this
+            # migration expects, stop before anything is moved
+            raise ValueError(
+                f"{table}: {sum(1 for _id, real in colliding if real)} punches would collide after the "
+                f"conversion from {tz} to UTC outside a DST gap; migration aborted"
+            )
+        if colliding:
+            cr.execute(f'CREATE TABLE IF NOT EXISTS {conflict_table} (LIKE {table})')
+            cr.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {table} WHERE id = ANY(%s) RETURNING *
+                )
+                INSERT INTO {conflict_table} SELECT * FROM moved
+            """, ([id_ for id_, _real_time in colliding],))
+            _logger.warning("%s: %s punches read inside a DST gap would duplicate another punch once in UTC; "
+                            "moved to %s for review", table, cr.rowcount, conflict_table)
+
+        cr.execute(f"""
+            UPDATE {table} t
+               SET timestamp = (t.timestamp AT TIME ZONE d.tz) AT TIME ZONE 'UTC' + {PARKING}
+              FROM sa40_device d
+             WHERE d.id = t.device_id
+        """)
+        cr.execute(f"UPDATE {table} SET timestamp = timestamp - {PARKING}")
+        _logger.info("%s: %s timestamps shifted from %s to UTC", table, cr.rowcount, tz)
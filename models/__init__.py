@@ -4,3 +4,13 @@ from . import sa40_attendance
 from . import res_partner
 from . import sa40_sync_wizard
 from . import sa40_export_wizad
+from . import sa40_usb_import_wizard
+from . import sa40_user_reconcile_wizard
+from . import sa40_user_distribute_wizard
+from . import sa40_export_cache
+from . import sa40_sync_run
+from . import sa40_attendance_archive
+from . import hr_employee
+from . import hr_attendance
+from . import sa40_fingerprint
+from . import sa40_punctuality
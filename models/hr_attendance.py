@@ -0,0 +1,10 @@
+# models/hr_attendance.py
+from odoo import models, fields
+
+
+class HrAttendance(models.Model):
+    _inherit = 'hr.attendance'
+
+    sa40_paired = fields.Boolean(
+        string='Paired from SA40 punches', readonly=True, copy=False,
+        help='Created by the SA40 pairing: re-paired when a late punch reaches its time span.')
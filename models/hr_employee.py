@@ -0,0 +1,231 @@
+# models/hr_employee.py
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError, ValidationError
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter keys of the check-in/check-out pairing
+PARAM_MAX_SHIFT_HOURS = 'biopro_sa40_sync.pairing_max_shift_hours'
+PARAM_DEBOUNCE_MINUTES = 'biopro_sa40_sync.pairing_debounce_minutes'
+PARAM_BACKFILL_DAYS = 'biopro_sa40_sync.pairing_backfill_days'
+DEFAULT_MAX_SHIFT_HOURS = 16
+DEFAULT_DEBOUNCE_MINUTES = 2
+DEFAULT_BACKFILL_DAYS = 7
+# employees paired per punch query / batched create
+PAIRING_BATCH_SIZE = 500
+# pyzk punch type -> direction, on devices with in/out punch states
+PUNCH_KINDS = {0: 'in', 1: 'out', 2: 'out', 3: 'in', 4: 'in', 5: 'out'}
+
+
+class HrEmployee(models.Model):
+    _inherit = 'hr.employee'
+
+    sa40_attendance_watermark = fields.Integer(
+        string='SA40 punches paired until', readonly=True, copy=False, groups='hr.group_hr_user',
+        help='Id of the last device punch log taken into the HR attendance of this employee.')
+
+    ####################################################################
+    # Check-in / check-out pairing
+    ####################################################################
+    @api.model
+    def _sa40_pair_attendances(self, batch_size=PAIRING_BATCH_SIZE):
+        """
+        Turn the sa40.attendance.log punches of employees (matched through their res.users)
+        into hr.attendance. The watermark follows ingestion (log id), so a punch reaching the
+        database late is still seen: the SA40 attendances within a max shift length of the
+        earliest new punch are dropped and their punches paired again with the new ones.
+        Punches are walked in time order and paired check-in / check-out, following the
+        punch type on devices with in/out punch states and alternating otherwise. A punch
+        within the debounce delay of the previous one is a double punch and ignored; an
+        open shift longer than the max shift length is a forgotten check-out and is closed
+        on its check-in (no hours invented). The backfill window only bounds the first run
+        of an employee: once paired, every punch past the watermark is taken, however old.
+        Returns the counters.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_shift = timedelta(hours=float(ICP.get_param(PARAM_MAX_SHIFT_HOURS, DEFAULT_MAX_SHIFT_HOURS) or DEFAULT_MAX_SHIFT_HOURS))
+        debounce = timedelta(minutes=float(ICP.get_param(PARAM_DEBOUNCE_MINUTES, DEFAULT_DEBOUNCE_MINUTES) or 0))
+        floor = fields.Datetime.now() - timedelta(days=int(ICP.get_param(PARAM_BACKFILL_DAYS, DEFAULT_BACKFILL_DAYS) or 0))
+
+        self.env.flush_all()
+        self.env.cr.execute("""
+            SELECT DISTINCT e.id
+              FROM hr_employee e
+              JOIN sa40_attendance_log l ON l.user_id = e.user_id
+             WHERE e.active AND l.id > COALESCE(e.sa40_attendance_watermark, 0)
+               AND (e.sa40_attendance_watermark > 0 OR l.timestamp >= %s)
+        """, (floor,))
+        employee_ids = sorted(row[0] for row in self.env.cr.fetchall())
+
+        totals = defaultdict(int)
+        for start in range(0, len(employee_ids), batch_size):
+            self.sudo().browse(employee_ids[start:start + batch_size])._sa40_pair_batch(floor, max_shift, debounce, totals)
+        _logger.info("SA40 pairing: %s", ', '.join(f"{k}={v}" for k, v in sorted(totals.items())) or 'nothing to pair')
+        return dict(totals)
+
+    def _sa40_pair_batch(self, floor, max_shift, debounce, totals):
+        Attendance = self.env['hr.attendance'].sudo()
+        # punches ingested since the watermark: earliest time they touch and last log id
+        self.env.cr.execute("""
+            SELECT e.id, min(l.timestamp), max(l.id)
+              FROM hr_employee e
+              JOIN sa40_attendance_log l ON l.user_id = e.user_id
+             WHERE e.id = ANY(%s) AND l.id > COALESCE(e.sa40_attendance_watermark, 0)
+               AND (e.sa40_attendance_watermark > 0 OR l.timestamp >= %s)
+             GROUP BY e.id
+        """, (self.ids, floor))
+        news = {employee_id: (first, last_id) for employee_id, first, last_id in self.env.cr.fetchall()}
+        if not news:
+            return
+
+        # the SA40 attendances a new punch may change are paired again: every one ending within
+        # a max shift before it (a late check-out, a double punch, a stale shift to close again)
+        redo = defaultdict(lambda: Attendance.browse())
+        for att in Attendance.search([
+            ('employee_id', 'in', list(news)), ('sa40_paired', '=', True),
+            '|', ('check_out', '=', False), ('check_out', '>=', min(first for first, _last in news.values()) - max_shift),
+        ]):
+            first = news[att.employee_id.id][0]
+            if not att.check_out or att.check_out >= first - max_shift:
+                redo[att.employee_id.id] |= att
+        starts = {
+            employee_id: min([first] + redo[employee_id].mapped('check_in'))
+            for employee_id, (first, _last) in news.items()
+        }
+
+        ids, stamps = zip(*starts.items())
+        self.env.cr.execute("""
+            SELECT w.id, l.timestamp, CASE WHEN d.punch_states THEN l.punch END
+              FROM unnest(%s::int[], %s::timestamp[]) AS w(id, start)
+              JOIN hr_employee e ON e.id = w.id
+              JOIN sa40_attendance_log l ON l.user_id = e.user_id
+              LEFT JOIN sa40_device d ON d.id = l.device_id
+             WHERE l.timestamp >= w.start
+             ORDER BY w.id, l.timestamp, l.id
+        """, (list(ids), list(stamps)))
+        punches = defaultdict(list)
+        for employee_id, ts, punch in self.env.cr.fetchall():
+            punches[employee_id].append((ts, PUNCH_KINDS.get(punch)))
+        # an open attendance entered by hand is kept: punches after it close it
+        open_by_employee = {
+            att.employee_id.id: att
+            for att in Attendance.search([('employee_id', 'in', list(news)), ('check_out', '=', False), ('sa40_paired', '=', False)])
+        }
+
+        # employee -> (attendances dropped, open attendance, writes on it, create vals, last log id)
+        plans = {}
+        for employee in self.filtered(lambda e: e.id in news):
+            current = open_by_employee.get(employee.id)
+            pairs, adopted = self._sa40_pair_punches(punches[employee.id], current, max_shift, debounce, totals)
+            writes = {}
+            if adopted is not None:
+                check_out = pairs.pop(adopted)[1]
+                if check_out:
+                    writes = {'check_out': check_out}
+            plans[employee] = (redo[employee.id], current, writes, [
+                {'employee_id': employee.id, 'check_in': check_in, 'check_out': check_out, 'sa40_paired': True}
+                for check_in, check_out in pairs
+            ], news[employee.id][1])
+
+        try:
+            with self.env.cr.savepoint():
+                Attendance.union(*(plan[0] for plan in plans.values())).unlink()
+                for _redo, current, writes, _vals_list, _last in plans.values():
+                    if writes:
+                        current.write(writes)
+                Attendance.create([vals for plan in plans.values() for vals in plan[3]])
+            done = plans
+        except (ValidationError, UserError):
+            # an overlapping attendance (usually entered by hand) rejects the batch: isolate it
+            done = {}
+            for employee, plan in plans.items():
+                dropped, current, writes, vals_list, _last = plan
+                try:
+                    with self.env.cr.savepoint():
+                        dropped.unlink()
+                        if writes:
+                            current.write(writes)
+                        Attendance.create(vals_list)
+                    done[employee] = plan
+                except (ValidationError, UserError) as exc:
+                    totals['employees_failed'] += 1
+                    _logger.warning("SA40 pairing: attendance of %s left unpaired: %s", employee.name, exc)
+
+        for dropped, _current, writes, vals_list, _last in done.values():
+            totals['repaired'] += len(dropped)
+            totals['extended'] += 1 if writes else 0
+            totals['created'] += len(vals_list)
+        totals['employees'] += len(done)
+
+        # advance the watermarks in one statement, also for employees whose punches were all skipped
+        if done:
+            ids, last_ids = zip(*((employee.id, plan[4]) for employee, plan in done.items()))
+            self.env.cr.execute("""
+                UPDATE hr_employee e
+                   SET sa40_attendance_watermark = w.log_id
+                  FROM unnest(%s::int[], %s::int[]) AS w(id, log_id)
+                 WHERE e.id = w.id
+            """, (list(ids), list(last_ids)))
+            self.invalidate_recordset(['sa40_attendance_watermark'])
+
+    @api.model
+    def _sa40_pair_punches(self, punches, current, max_shift, debounce, totals):
+        """
+        Pair the time ordered ``punches`` [(timestamp, 'in' / 'out' / None)] of one employee
+        into [(check_in, check_out or False)]. ``current`` is an open attendance entered by
+        hand: punches before its check-in are paired on their own, the shift it opened takes
+        over from there. Returns the pairs and the index of the pair of ``current`` (None).
+        """
+        pairs = []
+        open_in = None
+        adopted = None
+        last_punch = None
+
+        def close_stale():
+            # forgotten check-out: the shift is closed on its check-in
+            pairs.append((open_in, open_in))
+            totals['stale_closed'] += 1
+
+        for ts, kind in punches:
+            if last_punch and ts - last_punch < debounce:
+                totals['debounced'] += 1
+                continue
+            if current and adopted is None and ts > current.check_in:
+                if open_in is not None:
+                    close_stale()
+                adopted, open_in = len(pairs), current.check_in
+            elif current and adopted is None and ts == current.check_in:
+                # the punch that opened the hand-entered attendance
+                totals['skipped'] += 1
+                continue
+            last_punch = ts
+            totals['punches'] += 1
+            if open_in is not None and ts - open_in > max_shift:
+                close_stale()
+                open_in = None
+            if kind == 'out' and open_in is None:
+                # check-out without check-in: nothing to close
+                totals['orphan_out'] += 1
+            elif kind == 'in' and open_in is not None:
+                close_stale()
+                open_in = ts
+            elif open_in is None:
+                open_in = ts
+            else:
+                pairs.append((open_in, ts))
+                open_in = None
+        if current and adopted is None:
+            if open_in is not None:
+                close_stale()
+            adopted, open_in = len(pairs), current.check_in
+        if open_in is not None:
+            pairs.append((open_in, False))
+        return pairs, adopted
+
+    @api.model
+    def cron_sa40_pair_attendances(self):
+        return self._sa40_pair_attendances()
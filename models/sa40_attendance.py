@@ -9,25 +9,30 @@ class Sa40AttendanceLog(models.Model):
 
     device_id = fields.Many2one('sa40.device', required=True, ondelete='cascade')
     log_user_uid = fields.Char(string='Device User ID')
-    timestamp = fields.Datetime(required=True)
+    timestamp = fields.Datetime(required=True, index=True)
     status = fields.Char()
+    punch = fields.Integer(string='Punch Type')
+    # only filled for devices storing the full payload (sa40.device.raw_storage)
     raw = fields.Text()
 
     user_id = fields.Many2one('res.users', string='Linked User', compute='_compute_user_id', store=True)
     def _compute_user_id(self):
+        # one sa40.user search for the whole batch (sudo: cron/imports), keyed by (device, uid)
+        linkable = self.filtered(lambda r: r.device_id and r.log_user_uid)
+        users = {}
+        if linkable:
+            for user in self.env['sa40.user'].sudo().search([
+                ('device_id', 'in', linkable.device_id.ids),
+                ('device_user_id', 'in', list(set(linkable.mapped('log_user_uid')))),
+            ]):
+                users.setdefault((user.device_id.id, user.device_user_id), user)
         for record in self:
             # defensive: if no device or uid, clear user
             if not record.device_id or not record.log_user_uid:
                 _logger.debug("No device_id or log_user_uid for log %s -> clearing user", record.id)
                 record.user_id = False
                 continue
-
-            # do search as sudo to avoid permission issues in cron/imports
-            user = self.env['sa40.user'].sudo().search(
-                [('device_id', '=', record.device_id.id),
-                 ('device_user_id', '=', record.log_user_uid)],
-                limit=1
-            )
+            user = users.get((record.device_id.id, record.log_user_uid))
             record.user_id = user.user_id.id if user and user.user_id else False
 
     _sql_constraints = [
@@ -36,17 +41,18 @@ class Sa40AttendanceLog(models.Model):
     
     
     
-    @api.model
-    def create(self, vals):
-        rec = super().create(vals)
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
         # fallback: ensure user set right away for new records (computes normally run,
         # but this guarantees it if something bypassed compute)
-        if not rec.user_id and rec.device_id and rec.log_user_uid:
+        missing = records.filtered(lambda r: not r.user_id and r.device_id and r.log_user_uid)
+        if missing:
             try:
-                rec._compute_user_id()
+                missing._compute_user_id()
             except Exception as e:
-                _logger.error("Error computing user for created log %s: %s", rec.id, e)
-        return rec
+                _logger.error("Error computing user for created logs %s: %s", missing.ids, e)
+        return records
 
     def write(self, vals):
         res = super().write(vals)
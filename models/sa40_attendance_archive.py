@@ -0,0 +1,123 @@
+# models/sa40_attendance_archive.py
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter key: age (days) after which logs leave the hot table (0 keeps everything)
+PARAM_LOG_RETENTION_DAYS = 'biopro_sa40_sync.log_retention_days'
+DEFAULT_LOG_RETENTION_DAYS = 365
+# logs moved per statement (and per commit in the cron)
+ARCHIVE_BATCH_SIZE = 50000
+
+
+class Sa40AttendanceLogArchive(models.Model):
+    _name = 'sa40.attendance.log.archive'
+    _description = 'SA40 archived attendance logs'
+    _order = 'timestamp desc, id desc'
+
+    device_id = fields.Many2one('sa40.device', required=True, ondelete='cascade', index=True, readonly=True)
+    log_user_uid = fields.Char(string='Device User ID', readonly=True)
+    timestamp = fields.Datetime(required=True, index=True, readonly=True)
+    status = fields.Char(readonly=True)
+    punch = fields.Integer(string='Punch Type', readonly=True)
+    raw = fields.Text(readonly=True)
+    user_id = fields.Many2one('res.users', string='Linked User', index=True, readonly=True)
+    archived_at = fields.Datetime(readonly=True)
+
+    _sql_constraints = [
+        ('uniq_archive_by_device_user_ts', 'unique(device_id, log_user_uid, timestamp)', 'Duplicate archived log for user and timestamp'),
+    ]
+
+    ####################################################################
+    # Retention horizon
+    ####################################################################
+    @api.model
+    def _get_retention_cutoff(self):
+        """Return the datetime before which logs belong to the archive, or None when retention is off."""
+        days = int(self.env['ir.config_parameter'].sudo().get_param(PARAM_LOG_RETENTION_DAYS, DEFAULT_LOG_RETENTION_DAYS) or 0)
+        if days <= 0:
+            return None
+        return fields.Datetime.now() - timedelta(days=days)
+
+    @api.model
+    def _reaches_archive(self, date_from):
+        """True when a range starting at ``date_from`` (None: unbounded) may hold archived logs."""
+        cutoff = self._get_retention_cutoff()
+        if date_from and cutoff and fields.Datetime.to_datetime(date_from) >= cutoff:
+            return False
+        return bool(self.sudo().search_count([], limit=1))
+
+    ####################################################################
+    # Bulk move
+    ####################################################################
+    @api.model
+    def _archive_logs_before(self, cutoff, batch_size=ARCHIVE_BATCH_SIZE, commit=False):
+        """
+        Move every sa40.attendance.log older than ``cutoff`` into the archive, ``batch_size``
+        rows per statement (delete ... returning feeding the insert). A punch already archived
+        is dropped from the hot table. ``commit`` commits after each batch (cron only).
+        Returns the number of rows moved out of the hot table.
+        """
+        cr = self.env.cr
+        self.env.flush_all()
+        moved_total = 0
+        while True:
+            cr.execute("""
+                WITH moved AS (
+                    DELETE FROM sa40_attendance_log
+                     WHERE id IN (SELECT id FROM sa40_attendance_log
+                                   WHERE timestamp < %s
+                                   ORDER BY id
+                                   LIMIT %s
+                                     FOR UPDATE SKIP LOCKED)
+                 RETURNING device_id, log_user_uid, timestamp, status, punch, raw, user_id, create_uid, create_date
+                ), archived AS (
+                    INSERT INTO sa40_attendance_log_archive
+                           (device_id, log_user_uid, timestamp, status, punch, raw, user_id, archived_at,
+                            create_uid, create_date, write_uid, write_date)
+                    SELECT device_id, log_user_uid, timestamp, status, punch, raw, user_id, now() at time zone 'UTC',
+                           create_uid, create_date, %s, now() at time zone 'UTC'
+                      FROM moved
+                        ON CONFLICT (device_id, log_user_uid, timestamp) DO NOTHING
+                 RETURNING 1
+                )
+                SELECT (SELECT count(*) FROM moved), (SELECT count(*) FROM archived)
+            """, (cutoff, batch_size, self.env.uid))
+            moved, archived = cr.fetchone()
+            if not moved:
+                break
+            moved_total += moved
+            _logger.info("SA40 archive: moved %s logs (%s already archived)", moved, moved - archived)
+            if commit:
+                cr.commit()
+        if moved_total:
+            self.env['sa40.attendance.log'].invalidate_model()
+            self.invalidate_model()
+        return moved_total
+
+    @api.model
+    def cron_archive_attendance_logs(self):
+        cutoff = self._get_retention_cutoff()
+        if not cutoff:
+            return 0
+        moved = self._archive_logs_before(cutoff, commit=True)
+        _logger.info("SA40 archive: %s logs older than %s archived", moved, cutoff)
+        return moved
+
+    ####################################################################
+    # Reads spanning hot table and archive
+    ####################################################################
+    @api.model
+    def _search_logs(self, domain, date_from=None):
+        """
+        Return the sa40.attendance.log records matching ``domain`` followed by the archived
+        ones when a range starting at ``date_from`` reaches into the archive. Both models
+        share the fields read by verification and exports.
+        """
+        logs = list(self.env['sa40.attendance.log'].sudo().search(domain))
+        if self._reaches_archive(date_from):
+            logs += list(self.sudo().search(domain))
+        return logs
@@ -2,18 +2,410 @@
 from odoo import models, fields, api
 from odoo import fields as ofields
 from odoo.exceptions import UserError
+from odoo.addons.base.models.res_partner import _tz_get
+import base64
 import logging
+import psycopg2
+import pytz
+import random
+import threading
+import time as pytime
+import weakref
+from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager, nullcontext
 from datetime import datetime, time, timedelta
+from itertools import islice
 
-# try import pyzk
+from .sa40_sync_run import SyncRunRecorder
+
+# try import pyzk (once per process; the failure is kept for diagnostics)
 try:
     from zk import ZK, const
-except Exception:
+    PYZK_IMPORT_ERROR = None
+except Exception as pyzk_exc:
     ZK = None
     const = None
+    PYZK_IMPORT_ERROR = str(pyzk_exc) or pyzk_exc.__class__.__name__
+# only template replication needs it: a pyzk build without it still syncs
+try:
+    from zk.finger import Finger
+except Exception:
+    Finger = None
 
 _logger = logging.getLogger(__name__)
 
+# circuit breaker: backoff after consecutive connection failures (seconds)
+BREAKER_BASE_BACKOFF = 300
+BREAKER_MAX_BACKOFF = 6 * 3600
+# connect timeout (s) used for the single half-open probe of a failing device
+BREAKER_PROBE_TIMEOUT = 3
+# max concurrent probes of the fleet health scan
+HEALTH_SCAN_WORKERS = 16
+# devices written concurrently by distribute_users
+DISTRIBUTION_WORKERS = 8
+# first key of the per-device PostgreSQL advisory locks (second key is the device id)
+DEVICE_LOCK_NAMESPACE = 0x5A40
+# transaction cursor -> [cursor holding its device locks, number of locks held]
+_LOCK_CURSORS = weakref.WeakKeyDictionary()
+_LOCK_CURSORS_GUARD = threading.Lock()
+# adaptive polling: aim for this many new punches per poll; weight of the newest rate sample
+POLL_TARGET_PUNCHES = 40
+POLL_RATE_SMOOTHING = 0.5
+# a device claimed by a sync worker is not handed out again before this delay (crashed worker)
+CLAIM_LEASE_MINUTES = 15
+# a sync worker stops claiming devices after this time (s) and triggers a follow-up run
+SYNC_TICK_BUDGET = 60
+# scheduled actions running cron_sync_all_devices (data/cron_data.xml)
+SYNC_WORKER_CRONS = (
+    'biopro_sa40_sync.ir_cron_sa40_sync',
+    'biopro_sa40_sync.ir_cron_sa40_sync_worker_2',
+    'biopro_sa40_sync.ir_cron_sa40_sync_worker_3',
+)
+# attendance records persisted per bulk dedupe query / batched create
+INGEST_CHUNK_SIZE = 1000
+# users whose templates are uploaded per HR_save_usertemplates call
+TEMPLATE_PUSH_BATCH = 50
+# user table: characters of a name kept by the terminal, highest uid, lines per report section
+DEVICE_NAME_LENGTH = 24
+DEVICE_MAX_UID = 65535
+RECONCILE_REPORT_LINES = 50
+# reconciliation archives the synced users missing from the device, unless more than this
+# share of them (and more than this many) went missing at once: a reset or swapped device
+RECONCILE_MAX_MISSING_RATIO = 0.1
+RECONCILE_MAX_MISSING_USERS = 5
+
+
+class DeviceBusyError(UserError):
+    """Raised when another session currently holds the lock of a device."""
+
+
+# compact attendance record, as streamed from a device to persist_attendances
+AttendanceRecord = namedtuple('AttendanceRecord', ['user_id', 'timestamp', 'status', 'punch', 'raw'])
+
+
+def _drain_attendances(attendances, keep_raw=False):
+    """
+    Yield an AttendanceRecord per pyzk attendance of the list ``attendances``, emptying the
+    list as it goes so every pyzk object is released once converted. The ``str(a)`` payload
+    is only built with ``keep_raw``.
+    """
+    attendances.reverse()
+    while attendances:
+        a = attendances.pop()
+        yield AttendanceRecord(
+            getattr(a, 'user_id', None),
+            getattr(a, 'timestamp', None),   # keep datetime, don't isoformat()
+            getattr(a, 'status', None),
+            getattr(a, 'punch', None),
+            str(a) if keep_raw else None,
+        )
+
+
+def _device_user_key(user_id, uid):
+    """Identity of a person on a device: its user_id (badge number), the uid when empty."""
+    return str(user_id) if user_id not in (None, False, '') else str(uid)
+
+
+def _same_device_name(a, b):
+    """Compare names the way the terminal stores them (24 characters, padding stripped)."""
+    return (a or '').strip()[:DEVICE_NAME_LENGTH] == (b or '').strip()[:DEVICE_NAME_LENGTH]
+
+
+def _checkpoint_key(user_id, timestamp):
+    """Identity of a device log record, as kept by the ingestion checkpoint."""
+    return f"{user_id}|{timestamp}"
+
+
+def _as_attendance_record(rec):
+    """Accept the legacy dict records (preview wizard, imports) next to AttendanceRecord."""
+    if isinstance(rec, AttendanceRecord):
+        return rec
+    return AttendanceRecord(rec.get('user_id'), rec.get('timestamp'), rec.get('status'), rec.get('punch'), rec.get('raw'))
+
+
+def _log_user_uid(user_id):
+    """Device user id as stored in sa40.attendance.log (None for punches without one)."""
+    return str(user_id) if user_id not in (None, False) else None
+
+
+def _punch_value(punch):
+    """pyzk punch type (0 check-in, 1 check-out, ...) as an int, False when unknown."""
+    try:
+        return int(punch)
+    except (TypeError, ValueError):
+        return False
+
+
+def _chunked(iterable, size):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ZK constructor calling conventions of the known pyzk forks, in probing order
+_ZK_VARIANTS = (
+    # Common modern signature: positional ip, then named args
+    ('keywords', lambda ip, port, timeout, password: ZK(ip, port=port, timeout=timeout, password=password, force_udp=False)),
+    # Older signature: purely positional (ip, port, timeout, password, force_udp)
+    ('positional', lambda ip, port, timeout, password: ZK(ip, port, timeout, password, False)),
+    # keyword args with ip= as well
+    ('ip_keyword', lambda ip, port, timeout, password: ZK(ip=ip, port=port, timeout=timeout, password=password, force_udp=False)),
+)
+# ZK class -> (variant name, builder). Keyed by class so a substituted ZK (fake device) renegotiates.
+_ZK_FACTORY = {}
+
+
+def _make_zk(ip, port, timeout, password):
+    """
+    Build a pyzk ZK object. The constructor convention is negotiated on first use and
+    cached per process, so later connections are a single direct call.
+    """
+    args = (ip, int(port), int(timeout), int(password))
+    cached = _ZK_FACTORY.get(ZK)
+    if cached:
+        return cached[1](*args)
+
+    last_exc = None
+    for name, build in _ZK_VARIANTS:
+        try:
+            zk = build(*args)
+        except TypeError as exc:
+            last_exc = exc
+            continue
+        _ZK_FACTORY[ZK] = (name, build)
+        _logger.info("pyzk: negotiated the '%s' ZK constructor convention", name)
+        return zk
+    # Give up and raise a helpful UserError
+    raise UserError(
+        "Failed to construct ZK object for pyzk. Tried multiple constructor signatures.\n"
+        f"Last error: {last_exc}\n"
+        "Check that pyzk is installed and compatible with this code."
+    )
+
+
+def _pyzk_diagnostics():
+    """Human readable pyzk status: import failure, negotiated constructor convention or pending."""
+    if ZK is None:
+        return f"pyzk unavailable: {PYZK_IMPORT_ERROR}"
+    cached = _ZK_FACTORY.get(ZK)
+    module = getattr(ZK, '__module__', '?')
+    if not cached:
+        return f"pyzk ({module}) loaded, constructor not negotiated yet"
+    return f"pyzk ({module}) loaded, constructor convention: {cached[0]}"
+
+
+def _probe_device(ip, port, timeout, password, tz_name):
+    """
+    Lightweight handshake (no disable/enable): connect, read firmware, serial number and
+    clock, disconnect. Runs in a worker thread, so it must not touch the ORM.
+    """
+    res = {'ok': False, 'latency_ms': 0, 'firmware': False, 'serial': False, 'clock_skew': 0, 'error': False}
+    conn = None
+    try:
+        zk = _make_zk(ip, port, timeout, password)
+        start = pytime.perf_counter()
+        conn = zk.connect()
+        res['latency_ms'] = int((pytime.perf_counter() - start) * 1000)
+        res['firmware'] = conn.get_firmware_version() or False
+        res['serial'] = conn.get_serialnumber() or False
+        device_time = conn.get_time()
+        if device_time:
+            local_now = datetime.now(pytz.timezone(tz_name)).replace(tzinfo=None)
+            res['clock_skew'] = int((device_time - local_now).total_seconds())
+        res['ok'] = True
+    except Exception as exc:
+        res['error'] = str(exc) or exc.__class__.__name__
+    finally:
+        if conn:
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+    return res
+
+
+def _push_users_session(ip, port, timeout, password, entries, reserved=()):
+    """
+    Write ``entries`` (dicts: uid, user_id, name, card) on one device in a single disabled
+    session. The device table is read first: a person already enrolled keeps its uid (and
+    privilege, password, card), a planned uid held by someone else is replaced by one free
+    on the device and not in ``reserved`` (uids known to Odoo). Runs in a worker thread,
+    so it must not touch the ORM.
+    Returns the result: ok, error, pushed, failed, errors, uids (user_id -> uid written), seconds.
+    """
+    res = {'ok': False, 'error': False, 'pushed': 0, 'failed': 0, 'errors': [], 'uids': {}, 'seconds': 0.0}
+    start = pytime.perf_counter()
+    conn = None
+    try:
+        conn = _make_zk(ip, port, timeout, password).connect()
+        conn.disable_device()
+        on_device = {int(u.uid): u for u in conn.get_users() or []}
+        uid_by_user_id = {str(u.user_id): uid for uid, u in on_device.items() if getattr(u, 'user_id', None)}
+        used = set(on_device) | set(reserved) | {entry['uid'] for entry in entries}
+        for entry in entries:
+            uid = uid_by_user_id.get(entry['user_id'], entry['uid'])
+            current = on_device.get(uid)
+            if current is not None and str(getattr(current, 'user_id', '')) != entry['user_id']:
+                uid = max(used) + 1
+                used.add(uid)
+                current = None
+            try:
+                conn.set_user(uid=uid,
+                              name=entry['name'][:DEVICE_NAME_LENGTH],
+                              privilege=getattr(current, 'privilege', 0) if current else 0,
+                              password=getattr(current, 'password', '') if current else '',
+                              group_id=getattr(current, 'group_id', '') if current else '',
+                              user_id=entry['user_id'],
+                              card=entry['card'] or (getattr(current, 'card', 0) if current else 0))
+                res['uids'][entry['user_id']] = uid
+                res['pushed'] += 1
+            except Exception as exc:
+                res['failed'] += 1
+                res['errors'].append(f"{entry['user_id']}: {exc}")
+        res['ok'] = True
+    except Exception as exc:
+        res['error'] = str(exc) or exc.__class__.__name__
+    finally:
+        if conn:
+            try:
+                conn.enable_device()
+            except Exception:
+                pass
+            try:
+                conn.disconnect()
+            except Exception:
+                pass
+        res['seconds'] = pytime.perf_counter() - start
+    return res
+
+
+class TimestampNormalizer:
+    """
+    Turn batches of device punch timestamps (naive, in the device timezone) into the naive
+    UTC datetimes stored by Odoo. UTC offsets are computed once per hour of the day seen.
+    """
+
+    def __init__(self, tz_name):
+        try:
+            self.tz = pytz.timezone(tz_name or 'UTC')
+        except pytz.UnknownTimeZoneError:
+            _logger.warning("Unknown device timezone %r, using UTC", tz_name)
+            self.tz = pytz.utc
+        self.is_utc = self.tz.zone == 'UTC'
+        self._to_utc_offsets = {}
+        self._to_local_offsets = {}
+
+    def to_utc(self, local):
+        """Naive device-local datetime -> naive UTC datetime."""
+        if self.is_utc:
+            return local
+        hour = local.replace(minute=0, second=0, microsecond=0)
+        offset = self._to_utc_offsets.get(hour)
+        if offset is None:
+            offset = self._to_utc_offsets[hour] = self.tz.localize(hour, is_dst=False).utcoffset()
+        return local - offset
+
+    def to_local(self, utc):
+        """Naive UTC datetime -> naive device-local datetime."""
+        if self.is_utc:
+            return utc
+        hour = utc.replace(minute=0, second=0, microsecond=0)
+        offset = self._to_local_offsets.get(hour)
+        if offset is None:
+            offset = self._to_local_offsets[hour] = pytz.utc.localize(hour).astimezone(self.tz).utcoffset()
+        return utc + offset
+
+    def normalize(self, values):
+        """
+        Convert a batch of raw timestamps to naive UTC. Returns a list aligned on ``values``
+        holding None for every missing or unparseable value.
+        """
+        kinds = set(map(type, values))
+        if kinds == {datetime} and not any(v.tzinfo for v in values):
+            # pyzk: every punch is a naive device-local datetime
+            return [self.to_utc(v) for v in values]
+        return [self._convert(v) for v in values]
+
+    def _convert(self, value):
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.strip())
+            except ValueError:
+                return None
+        if not isinstance(value, datetime):
+            return None
+        if value.tzinfo:
+            # already anchored (e.g. lines of the preview wizard, stored in UTC)
+            return value.astimezone(pytz.utc).replace(tzinfo=None)
+        return self.to_utc(value)
+
+    @staticmethod
+    def reject_reason(value):
+        if not value:
+            return 'missing_timestamp'
+        if isinstance(value, str):
+            return 'invalid_timestamp'
+        return 'unsupported_timestamp'
+
+
+class IngestDiagnostics:
+    """
+    Sampled, rate-limited diagnostics for the ingestion loop.
+
+    Per run, at most ``SAMPLES_PER_RUN`` messages are logged per category, and a category
+    that was sampled for the same device less than ``INTERVAL`` seconds ago stays silent.
+    Everything is still counted and reported by :meth:`summary`. With ``trace`` (the
+    device's debug switch) every message is logged.
+    """
+    SAMPLES_PER_RUN = 5
+    INTERVAL = 60.0
+    # (device_id, category) -> monotonic time of the last sampled run, shared by the cron
+    # threads; entries older than INTERVAL are dropped, so it holds recent keys only
+    _last_sampled = {}
+    _last_sampled_lock = threading.Lock()
+
+    def __init__(self, device, trace=False):
+        self.device = device
+        self.trace = trace
+        self.counts = defaultdict(int)
+        self.muted = set()
+
+    def sample(self, category, msg, *args):
+        seen = self.counts[category]
+        self.counts[category] += 1
+        if self.trace:
+            _logger.info("[%s] " + msg, self.device.name, *args)
+            return
+        if seen == 0 and not self._claim_sample(category):
+            self.muted.add(category)
+        if category in self.muted or seen >= self.SAMPLES_PER_RUN:
+            return
+        _logger.warning("[%s] " + msg, self.device.name, *args)
+
+    def _claim_sample(self, category):
+        """True when no run sampled ``category`` for this device in the last INTERVAL seconds."""
+        key = (self.device.id, category)
+        now = pytime.monotonic()
+        with self._last_sampled_lock:
+            last = self._last_sampled.get(key)
+            if last is not None and now - last < self.INTERVAL:
+                return False
+            expired = [k for k, ts in self._last_sampled.items() if now - ts >= self.INTERVAL]
+            for k in expired:
+                del self._last_sampled[k]
+            self._last_sampled[key] = now
+            return True
+
+    def summary(self, **totals):
+        counts = ', '.join(f"{k}={v}" for k, v in sorted(self.counts.items()))
+        _logger.info("Ingestion for device %s: %s%s", self.device.name,
+                     ', '.join(f"{k}={v}" for k, v in totals.items()),
+                     f" (diagnostics: {counts})" if counts else '')
+
 
 class Sa40Device(models.Model):
     _name = 'sa40.device'
@@ -28,6 +420,64 @@ class Sa40Device(models.Model):
     note = fields.Char("Note")
     
     tolerance_period = fields.Float('Tolerance Period', help='Tolerance period in minutes for attendance logs', default=30.0)
+    tz = fields.Selection(_tz_get, string='Timezone', required=True, default=lambda self: self.env.user.tz or 'UTC',
+                          help='Timezone of the device clock. Punches are converted from it to UTC when stored, '
+                               'and attendance sheet hours are read in it.')
+    debug_trace = fields.Boolean('Trace ingestion', help='Log every ingested record and every rejected/duplicate record. '
+                                                          'Leave off in production: only sampled diagnostics are logged otherwise.')
+    raw_storage = fields.Selection([
+        ('none', 'Typed columns only'),
+        ('full', 'Full payload'),
+    ], string='Raw payload storage', default='none', required=True,
+        help='The raw device payload repeats the user, timestamp, status and punch columns. '
+             'Keep it only to troubleshoot a terminal.')
+    punch_states = fields.Boolean('In/out punch states',
+                                  help='The device asks check-in or check-out on every punch (state keys). HR attendance '
+                                       'pairing then follows the punch type instead of alternating punches.')
+
+    # connection health (circuit breaker)
+    health_state = fields.Selection([
+        ('closed', 'Healthy'),
+        ('open', 'Unreachable'),
+    ], string='Health', default='closed', required=True, readonly=True, copy=False,
+        help='Healthy: connections are attempted normally. Unreachable: connections are refused until '
+             'the next retry time, then one cheap connection attempt decides whether the device is back.')
+    consecutive_failures = fields.Integer(readonly=True, copy=False)
+    next_retry_at = fields.Datetime('Next retry', readonly=True, copy=False)
+    last_error = fields.Char(readonly=True, copy=False)
+    last_health_check = fields.Datetime(readonly=True, copy=False)
+    health_latency_ms = fields.Integer('Latency (ms)', readonly=True, copy=False)
+    firmware_version = fields.Char(readonly=True, copy=False)
+    serial_number = fields.Char(readonly=True, copy=False)
+    clock_skew = fields.Integer('Clock skew (s)', readonly=True, copy=False,
+                                help='Device clock minus the current time in the device timezone (Timezone field) '
+                                     'at the last health check.')
+    pyzk_info = fields.Char('pyzk', compute='_compute_pyzk_info')
+
+    # adaptive polling schedule
+    poll_interval_min = fields.Integer('Min poll interval (min)', default=1,
+                                       help='Polling interval during punch peaks and around session starts.')
+    poll_interval_max = fields.Integer('Max poll interval (min)', default=60,
+                                       help='Polling interval when nobody punches (nights, week-ends).')
+    next_poll_at = fields.Datetime('Next poll', readonly=True, copy=False, index=True)
+    last_poll_at = fields.Datetime('Last poll', readonly=True, copy=False)
+    punch_rate = fields.Float('Punch rate (/min)', readonly=True, copy=False, digits=(16, 2),
+                              help='Smoothed number of new punches per minute seen by recent polls.')
+
+    # device log retention
+    clear_after_sync = fields.Boolean('Clear device log after sync',
+                                      help='After a scheduled sync has committed every fetched record (checked by counting '
+                                           'them back in the database), clear the attendance table of the terminal in the '
+                                           'same session, so transfers stay small over the school year.')
+    last_cleared_at = fields.Datetime('Device log cleared on', readonly=True, copy=False)
+    last_cleared_count = fields.Integer('Records cleared', readonly=True, copy=False)
+
+    # crash-resumable ingestion (scheduled sync)
+    ingest_checkpoint = fields.Integer('Device records ingested', readonly=True, copy=False,
+                                       help='Number of records at the head of the device log already committed by the '
+                                            'scheduled sync; the next run resumes after them.')
+    ingest_checkpoint_key = fields.Char('Last ingested record', readonly=True, copy=False)
+    ingest_checkpoint_at = fields.Datetime('Checkpoint saved on', readonly=True, copy=False)
     
 
     ####################################################################
@@ -37,59 +487,34 @@ class Sa40Device(models.Model):
         if ZK is None:
             raise UserError(
                 "pyzk (ZK) library is not available in this Python environment. "
-                "Install it or vendor it into the addon (see README)."
+                "Install it or vendor it into the addon (see README).\n"
+                f"Import error: {PYZK_IMPORT_ERROR}"
             )
 
+    def _compute_pyzk_info(self):
+        info = _pyzk_diagnostics()
+        for device in self:
+            device.pyzk_info = info
+
     def _connect_to_device(self, device):
         """
         Connect to device and return (zk, conn).
         This method is robust to several pyzk constructor signatures.
+        Connections to a device whose circuit breaker is open are refused until its retry
+        time (Test Connection / Health Scan probe it regardless).
         Caller MUST call conn.enable_device() and conn.disconnect() in finally.
         """
         self._ensure_pyzk()
+        timeout = device._breaker_before_connect()
 
-        # attempt multiple ways to instantiate ZK (some forks use different signatures)
-        zk = None
-        last_exc = None
-        try:
-            # Common modern signature: positional ip, then named args
-            zk = ZK(device.device_ip,
-                    port=int(device.device_port),
-                    timeout=int(device.device_timeout),
-                    password=int(device.device_password),
-                    force_udp=False)
-        except TypeError as te:
-            last_exc = te
-            try:
-                # Older signature: purely positional (ip, port, timeout, password, force_udp)
-                zk = ZK(device.device_ip,
-                        int(device.device_port),
-                        int(device.device_timeout),
-                        int(device.device_password),
-                        False)
-            except Exception as e2:
-                last_exc = e2
-                try:
-                    # As a last attempt try keyword args but with ip= instead of host=
-                    zk = ZK(ip=device.device_ip,
-                            port=int(device.device_port),
-                            timeout=int(device.device_timeout),
-                            password=int(device.device_password),
-                            force_udp=False)
-                except Exception as e3:
-                    last_exc = e3
-                    # Give up and raise a helpful UserError
-                    raise UserError(
-                        "Failed to construct ZK object for pyzk. Tried multiple constructor signatures.\n"
-                        f"Last error: {last_exc}\n"
-                        "Check that pyzk is installed and compatible with this code."
-                    )
+        with self._run_phase('construct'):
+            zk = _make_zk(device.device_ip, device.device_port, timeout, device.device_password)
 
         # connect
         conn = None
         try:
-            conn = zk.connect()
-            return zk, conn
+            with self._run_phase('connect'):
+                conn = zk.connect()
         except Exception as exc:
             # cleanup on partial connect
             try:
@@ -97,54 +522,316 @@ class Sa40Device(models.Model):
                     conn.disconnect()
             except Exception:
                 pass
+            device._breaker_record_failure(exc)
             raise UserError(f"Failed to connect to device {device.device_ip}:{device.device_port} -> {exc}")
+        device._breaker_record_success()
+        return zk, conn
 
     ####################################################################
-    # Test connectivity (UI button)
+    # Per-device lock
     ####################################################################
-    def test_connectivity(self):
+    def _acquire_device_lock(self, operation):
+        """
+        Take the device's session-level advisory lock without waiting, or raise DeviceBusyError.
+        The locks of a transaction are held on a cursor of their own, shared by its nested
+        operations (session locks are re-entrant, each acquire needs one
+        :meth:`_release_device_lock`): they survive the commits and rollbacks of the
+        transaction, which they never touch. PostgreSQL frees them if the worker dies.
+        """
+        self.ensure_one()
+        lock_cr = self._hold_lock_cursor()
+        try:
+            lock_cr.execute("SELECT pg_try_advisory_lock(%s, %s)", (DEVICE_LOCK_NAMESPACE, self.id))
+            locked = lock_cr.fetchone()[0]
+            lock_cr.commit()
+        except Exception:
+            self._drop_lock_cursor()
+            raise
+        if not locked:
+            self._drop_lock_cursor()
+            raise DeviceBusyError(
+                f"Device {self.name} is busy with another operation (sync, fetch or push); "
+                f"{operation} skipped. Try again in a moment."
+            )
+
+    def _release_device_lock(self):
+        self.ensure_one()
+        lock_cr = _LOCK_CURSORS[self.env.cr][0]
+        try:
+            lock_cr.execute("SELECT pg_advisory_unlock(%s, %s)", (DEVICE_LOCK_NAMESPACE, self.id))
+            lock_cr.commit()
+        finally:
+            self._drop_lock_cursor()
+
+    def _hold_lock_cursor(self):
+        """Return the lock cursor of the current transaction, opened by its first device lock."""
+        with _LOCK_CURSORS_GUARD:
+            entry = _LOCK_CURSORS.get(self.env.cr)
+            if entry is None:
+                entry = _LOCK_CURSORS[self.env.cr] = [self.env.registry.cursor(), 0]
+            entry[1] += 1
+            return entry[0]
+
+    def _drop_lock_cursor(self):
+        """Forget one lock of the current transaction; the last one closes the lock cursor."""
+        with _LOCK_CURSORS_GUARD:
+            entry = _LOCK_CURSORS[self.env.cr]
+            entry[1] -= 1
+            if entry[1]:
+                return
+            del _LOCK_CURSORS[self.env.cr]
+        entry[0].close()
+
+    @contextmanager
+    def _device_lock(self, operation):
+        self._acquire_device_lock(operation)
+        try:
+            yield
+        finally:
+            self._release_device_lock()
+
+    ####################################################################
+    # Circuit breaker
+    ####################################################################
+    def _breaker_before_connect(self):
+        """
+        Gate a connection attempt: raise while the breaker is open, allow a single short
+        probe once the retry time is reached. Returns the connect timeout.
+        """
+        self.ensure_one()
+        if self.health_state == 'closed':
+            return int(self.device_timeout)
+        if self.next_retry_at and self.next_retry_at > ofields.Datetime.now():
+            raise UserError(
+                f"Device {self.name} is unreachable ({self.consecutive_failures} consecutive failures); "
+                f"next retry at {ofields.Datetime.to_string(self.next_retry_at)} (UTC). "
+                "Use Test Connection to retry now."
+            )
+        return min(int(self.device_timeout), BREAKER_PROBE_TIMEOUT)
+
+    def _breaker_write(self, vals):
+        """
+        Write breaker state that must survive the caller's transaction: a failed connection
+        is usually followed by a UserError rolling it back (manual buttons, sync cron).
+        The state is committed on its own cursor and only put in the cache of the current
+        transaction: writing the row there too would make it conflict with the committed
+        version. When this transaction already locks the device row, the side write gives
+        up quickly and the state follows the transaction.
+        """
+        self.ensure_one()
+        try:
+            with self.env.registry.cursor() as cr:
+                cr.execute("SET LOCAL lock_timeout = '2s'")
+                self.with_env(self.env(cr=cr)).sudo().write(vals)
+        except psycopg2.Error:
+            _logger.debug("Device %s row locked by the current transaction, breaker state not committed apart", self.name)
+            self.write(vals)
+            return
+        for fname, value in vals.items():
+            field = self._fields[fname]
+            self.env.cache.update(self, field, [field.convert_to_cache(value, self)])
+
+    def _breaker_record_failure(self, exc, apart=True):
+        """
+        Open the breaker after a failed connection. With ``apart`` the state is committed on
+        its own cursor (see :meth:`_breaker_write`); callers whose transaction commits
+        anyway (health scan, distribution) write it in place.
+        """
         self.ensure_one()
-        if not self.id:
+        failures = self.consecutive_failures + 1
+        backoff = min(BREAKER_BASE_BACKOFF * 2 ** (failures - 1), BREAKER_MAX_BACKOFF)
+        backoff *= random.uniform(0.9, 1.1)  # spread retries of devices that failed together
+        vals = {
+            'health_state': 'open',
+            'consecutive_failures': failures,
+            'next_retry_at': ofields.Datetime.now() + timedelta(seconds=backoff),
+            'last_error': str(exc)[:255],
+        }
+        if apart:
+            self._breaker_write(vals)
+        else:
+            self.write(vals)
+        _logger.warning("Device %s unreachable (%s failures in a row), next retry in %ds: %s",
+                        self.name, failures, backoff, exc)
+
+    def _breaker_record_success(self):
+        self.ensure_one()
+        if self.health_state != 'closed' or self.consecutive_failures:
+            _logger.info("Device %s reachable again after %s failures", self.name, self.consecutive_failures)
+            self.write({
+                'health_state': 'closed',
+                'consecutive_failures': 0,
+                'next_retry_at': False,
+                'last_error': False,
+            })
+
+    def _breaker_is_due(self):
+        """True when a (non-forced) connection attempt would be allowed now."""
+        self.ensure_one()
+        return (self.health_state == 'closed' or not self.next_retry_at
+                or self.next_retry_at <= ofields.Datetime.now())
+
+    def _get_user_resolution_map(self, device):
+        """
+        Map device user identifiers (as strings) -> sa40.user for one device, built with a
+        single query. Both device_uid and device_user_id are keys; device_user_id wins on clash.
+        """
+        users = self.env['sa40.user'].sudo().search([('device_id', '=', device.id)])
+        by_key = {}
+        for user in users:
+            if user.device_uid:
+                by_key[str(user.device_uid)] = user
+        for user in users:
+            if user.device_user_id:
+                by_key[str(user.device_user_id)] = user
+        return by_key
+
+    ####################################################################
+    # Run journal (sa40.sync.run)
+    ####################################################################
+    @contextmanager
+    def _track_run(self, device, operation):
+        """
+        Yield ``device`` bound to a run recorder (context key ``sa40_run``) and journal the
+        run in sa40.sync.run on exit. Nested calls reuse the outer run.
+        """
+        recorder = self.env.context.get('sa40_run')
+        if recorder is not None:
+            yield device.with_context(sa40_run=recorder)
+            return
+
+        recorder = SyncRunRecorder()
+        started_at = ofields.Datetime.now()
+        start = pytime.perf_counter()
+        try:
+            yield device.with_context(sa40_run=recorder)
+        except Exception as exc:
+            recorder.error = str(exc)
+            raise
+        finally:
+            self.env['sa40.sync.run']._record(device, operation, recorder, started_at, pytime.perf_counter() - start)
+
+    def _run_phase(self, name):
+        recorder = self.env.context.get('sa40_run')
+        return recorder.phase(name) if recorder is not None else nullcontext()
+
+    def _run_add_time(self, name, seconds):
+        recorder = self.env.context.get('sa40_run')
+        if recorder is not None:
+            recorder.add_time(name, seconds)
+
+    def _run_count(self, **counts):
+        recorder = self.env.context.get('sa40_run')
+        if recorder is not None:
+            recorder.add_counts(**counts)
+
+    ####################################################################
+    # Test connectivity / fleet health scan
+    ####################################################################
+    def _health_scan(self, force=False):
+        """
+        Probe the devices in ``self`` concurrently and store latency, firmware, serial number
+        and clock skew. Results feed the circuit breaker. Without ``force``, devices whose
+        breaker is open and not yet due are left alone. Returns {device: probe result}.
+        """
+        self._ensure_pyzk()
+        devices = self if force else self.filtered(lambda d: d._breaker_is_due())
+        if not devices:
+            return {}
+        with ExitStack() as locks:
+            jobs = []
+            for d in devices:
+                # a device in the middle of a sync/push is obviously alive: don't disturb its session
+                try:
+                    locks.enter_context(d._device_lock('health check'))
+                except DeviceBusyError:
+                    continue
+                timeout = int(d.device_timeout) if d.health_state == 'closed' else min(int(d.device_timeout), BREAKER_PROBE_TIMEOUT)
+                jobs.append((d, (d.device_ip, d.device_port, timeout, d.device_password, d.tz)))
+            if not jobs:
+                return {}
+            with ThreadPoolExecutor(max_workers=min(HEALTH_SCAN_WORKERS, len(jobs))) as pool:
+                futures = [(device, pool.submit(_probe_device, *args)) for device, args in jobs]
+                results = {device: future.result() for device, future in futures}
+
+        now = ofields.Datetime.now()
+        for device, res in results.items():
+            vals = {'last_health_check': now}
+            if res['ok']:
+                vals.update({
+                    'health_latency_ms': res['latency_ms'],
+                    'firmware_version': res['firmware'],
+                    'serial_number': res['serial'],
+                    'clock_skew': res['clock_skew'],
+                })
+                device._breaker_record_success()
+            else:
+                device._breaker_record_failure(res['error'], apart=False)
+            device.write(vals)
+        return results
+
+    def action_health_scan(self):
+        """UI button: probe the selected devices (all active devices when called on none)."""
+        devices = self or self.search([('active', '=', True)])
+        results = devices._health_scan(force=True)
+        failed = [d.name for d, r in results.items() if not r['ok']]
+        msg = f"{len(results) - len(failed)}/{len(results)} device(s) reachable."
+        if failed:
+            msg += " Unreachable: " + ", ".join(failed)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {'title': 'Health Scan', 'message': msg, 'sticky': bool(failed),
+                       'type': 'warning' if failed else 'success'}
+        }
+
+    def test_connectivity(self):
+        if not self.ids:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {'title': 'Save first', 'message': 'Please save the device before testing.', 'sticky': False}
             }
+        if len(self) > 1:
+            return self.action_health_scan()
 
         try:
-            zk, conn = self._connect_to_device(self)
-            try:
-                conn.disable_device()
-                msg = f"Connected to {self.name} ({self.device_ip})"
-                _logger.info(msg)
-                return {
-                    'type': 'ir.actions.client',
-                    'tag': 'display_notification',
-                    'params': {'title': 'Connection OK', 'message': msg, 'sticky': False, 'type': 'success'}
-                }
-            finally:
-                try:
-                    conn.enable_device()
-                except Exception:
-                    pass
-                try:
-                    conn.disconnect()
-                except Exception:
-                    pass
+            res = self._health_scan(force=True).get(self)
         except UserError as ue:
-            _logger.exception('Connectivity test failed')
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {'title': 'Connection Failed', 'message': str(ue), 'sticky': False, 'type': 'warning'}
             }
-        except Exception as exc:
-            _logger.exception('Unexpected error during connectivity test')
+        if res is None:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
-                'params': {'title': 'Connection Error', 'message': f'Unexpected error: {exc}', 'sticky': False, 'type': 'warning'}
+                'params': {'title': 'Device Busy', 'message': f"{self.name} is currently being synced; it is reachable.",
+                           'sticky': False, 'type': 'info'}
             }
+        if not res['ok']:
+            _logger.warning('Connectivity test failed for %s: %s', self.name, res['error'])
+            return {
+                'type': 'ir.actions.client',
+                'tag': 'display_notification',
+                'params': {'title': 'Connection Failed', 'message': f"Failed to connect to device {self.device_ip}:{self.device_port} -> {res['error']}",
+                           'sticky': False, 'type': 'warning'}
+            }
+        msg = (f"Connected to {self.name} ({self.device_ip}) in {res['latency_ms']} ms. "
+               f"Firmware: {res['firmware'] or '?'}, serial: {res['serial'] or '?'}, clock skew: {res['clock_skew']} s. "
+               f"{_pyzk_diagnostics()}")
+        _logger.info(msg)
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {'title': 'Connection OK', 'message': msg, 'sticky': False, 'type': 'success'}
+        }
+
+    @api.model
+    def cron_health_scan(self):
+        self.search([('active', '=', True)])._health_scan()
+        return True
 
 
     ####################################################################
@@ -157,15 +844,21 @@ class Sa40Device(models.Model):
         """
         Sa40User = self.env['sa40.user']
         overall_fetched = overall_created = overall_updated = 0
+        overall_linked = overall_ambiguous = 0
         created_uids = []
 
         for device in self:
+            device._acquire_device_lock('fetch users')
             zk = conn = None
+            disabled_at = None
             try:
                 zk, conn = self._connect_to_device(device)
                 conn.disable_device()
-                uds = conn.get_users() or []
+                disabled_at = pytime.perf_counter()
+                with self._run_phase('get_users'):
+                    uds = conn.get_users() or []
                 fetched = len(uds)
+                self._run_count(users_fetched=fetched)
                 created = updated = 0
 
                 for u in uds:
@@ -173,8 +866,8 @@ class Sa40Device(models.Model):
                     device_user_id = getattr(u, 'user_id', None) or device_uid
                     name = getattr(u, 'name', None) or 'Unknown'
 
-                    # find existing with sudo to avoid access rights issues
-                    existing = Sa40User.sudo().search([
+                    # find existing with sudo to avoid access rights issues (archived ones too: the uid stays taken)
+                    existing = Sa40User.sudo().with_context(active_test=False).search([
                         ('device_id', '=', device.id),
                         ('device_uid', '=', device_uid)
                     ], limit=1)
@@ -184,6 +877,8 @@ class Sa40Device(models.Model):
                         'device_id': device.id,
                         'device_uid': device_uid,
                         'device_user_id': device_user_id,
+                        # same clock as write_date: the reconciliation compares them
+                        'device_synced_at': self.env.cr.now(),
                     }
 
                     if existing:
@@ -214,13 +909,23 @@ class Sa40Device(models.Model):
                         conn.enable_device()
                     except Exception:
                         pass
+                    if disabled_at is not None:
+                        self._run_add_time('disable', pytime.perf_counter() - disabled_at)
                     try:
                         conn.disconnect()
                     except Exception:
                         pass
+                device._release_device_lock()
+
+            # link the still unlinked device users to res.users (and relink their logs)
+            linked = Sa40User.sudo().search([('device_id', '=', device.id), ('user_id', '=', False)])._auto_link()
+            overall_linked += linked['linked_by_id'] + linked['linked_by_name']
+            overall_ambiguous += linked['ambiguous']
         # notify
         # build message
         msg = f"Fetched {overall_fetched} users: created {overall_created}, updated {overall_updated}."
+        if overall_linked or overall_ambiguous:
+            msg += f" Linked {overall_linked} to Odoo users, {overall_ambiguous} ambiguous (see SA40 Users)."
         
         return {
             'type': 'ir.actions.client',
@@ -233,25 +938,95 @@ class Sa40Device(models.Model):
     # Fetch attendances (no persistence)
     ####################################################################
     def fetch_attendances_from_device(self):
-        results = []
+        """Return the AttendanceRecord list of every device in ``self`` (see iter_attendances_from_device)."""
+        return list(self.iter_attendances_from_device())
+
+    def iter_attendances_from_device(self):
+        """
+        Yield the attendance of every device in ``self`` as AttendanceRecord tuples, one
+        device session at a time. The session (and device lock) is held until the device's
+        records are consumed, so feed the iterator straight into persist_attendances.
+        """
         for device in self:
+            device._acquire_device_lock('fetch attendance')
             zk = conn = None
+            disabled_at = None
+            try:
+                try:
+                    zk, conn = self._connect_to_device(device)
+                    conn.disable_device()
+                    disabled_at = pytime.perf_counter()
+                    with self._run_phase('get_attendance'):
+                        attendances = conn.get_attendance() or []
+                except Exception as exc:
+                    _logger.exception('Failed to fetch attendance from device %s:%s', device.device_ip, device.device_port)
+                    raise UserError(f"Failed to fetch attendance from {device.name}: {exc}")
+                self._run_count(attendance_fetched=len(attendances))
+                yield from _drain_attendances(attendances, keep_raw=device.raw_storage == 'full')
+            finally:
+                if conn:
+                    try:
+                        conn.enable_device()
+                    except Exception:
+                        pass
+                    if disabled_at is not None:
+                        self._run_add_time('disable', pytime.perf_counter() - disabled_at)
+                    try:
+                        conn.disconnect()
+                    except Exception:
+                        pass
+                device._release_device_lock()
+
+    def _sync_attendance_session(self, commit=False):
+        """
+        Fetch and persist the attendance of one device within a single device session.
+        With ``commit`` (scheduled sync), every chunk is committed together with the ingestion
+        checkpoint, so a run killed halfway resumes after the last committed chunk; with
+        ``clear_after_sync`` the device log is then cleared in the same session, once the key
+        of every fetched record has been found back in the database and the device holds no
+        record that was not fetched.
+        Returns the persist_attendances counters.
+        """
+        self.ensure_one()
+        device = self
+        zk = conn = None
+        disabled_at = None
+        with self._device_lock('fetch attendance'):
             try:
                 zk, conn = self._connect_to_device(device)
                 conn.disable_device()
-                attendances = conn.get_attendance() or []
-                for a in attendances:
-                    ts = getattr(a, 'timestamp', None)
-                    # Keep timestamp as a python datetime object when possible
-                    rec = {
-                        'user_id': getattr(a, 'user_id', None),
-                        'timestamp': ts,   # keep datetime, don't isoformat()
-                        'status': getattr(a, 'status', None) if hasattr(a, 'status') else None,
-                        'raw': str(a),
-                    }
-                    results.append(rec)
+                disabled_at = pytime.perf_counter()
+                with self._run_phase('get_attendance'):
+                    attendances = conn.get_attendance() or []
+                self._run_count(attendance_fetched=len(attendances))
+
+                checkpoint = None
+                resumed = 0
+                # keys of the fetched records, checked back before the device log is cleared
+                keys = set() if commit and device.clear_after_sync else None
+                if commit:
+                    # the device log only grows: skip the head committed by previous runs
+                    resumed = device._get_resume_point(attendances)
+                    if keys is not None and resumed:
+                        keys |= self._attendance_keys(device, _drain_attendances(attendances[:resumed]))
+                    del attendances[:resumed]
+
+                    def checkpoint(consumed, last):
+                        device._save_ingest_checkpoint(resumed + consumed, last)
+
+                # records are converted while persisted, chunk by chunk
+                with self._run_phase('persist'):
+                    pers = self.persist_attendances(device, _drain_attendances(attendances, keep_raw=device.raw_storage == 'full'),
+                                                    checkpoint=checkpoint, keys=keys)
+                # records skipped by the checkpoint are stored punches, like any other duplicate
+                pers['fetched'] += resumed
+                pers['skipped_duplicates'] += resumed
+
+                if keys is not None and pers['fetched']:
+                    self._clear_device_log_if_safe(conn, pers, keys)
+                return pers
             except Exception as exc:
-                _logger.exception('Failed to fetch attendance from device %s:%s', device.device_ip, device.device_port)
+                _logger.exception('Failed to sync attendance from device %s:%s', device.device_ip, device.device_port)
                 raise UserError(f"Failed to fetch attendance from {device.name}: {exc}")
             finally:
                 if conn:
@@ -259,169 +1034,323 @@ class Sa40Device(models.Model):
                         conn.enable_device()
                     except Exception:
                         pass
+                    if disabled_at is not None:
+                        self._run_add_time('disable', pytime.perf_counter() - disabled_at)
                     try:
                         conn.disconnect()
                     except Exception:
                         pass
-        return results
 
+    def _attendance_keys(self, device, records):
+        """(device user id, UTC timestamp) keys of ``records``, as persist_attendances stores them."""
+        normalizer = TimestampNormalizer(device.tz)
+        keys = set()
+        for chunk in _chunked(records, INGEST_CHUNK_SIZE):
+            chunk = [_as_attendance_record(rec) for rec in chunk]
+            stamps = normalizer.normalize([rec.timestamp for rec in chunk])
+            keys.update((_log_user_uid(rec.user_id), ts) for rec, ts in zip(chunk, stamps) if ts is not None)
+        return keys
+
+    def _clear_device_log_if_safe(self, conn, pers, keys):
+        """
+        Commit, prove every fetched record is stored (``keys``: their (device user id, UTC
+        timestamp) keys), then clear the device log (same session).
+        """
+        self.ensure_one()
+        fetched = pers['fetched']
+        if pers.get('invalid') or pers.get('errors'):
+            _logger.warning("Not clearing device %s: %s fetched record(s) could not be stored",
+                            self.name, pers.get('invalid', 0) + pers.get('errors', 0))
+            return False
+        if pers['created'] + pers['skipped_duplicates'] != fetched:
+            _logger.warning("Not clearing device %s: %s created + %s duplicates for %s fetched",
+                            self.name, pers['created'], pers['skipped_duplicates'], fetched)
+            return False
+
+        # make the ingested records durable before anything is deleted on the device
+        self.env.flush_all()
+        self.env.cr.commit()
+
+        # every distinct fetched punch was either inserted or found in the table: look each one up
+        missing = 0
+        for chunk in _chunked(keys, INGEST_CHUNK_SIZE):
+            missing += len(set(chunk) - self._find_existing_log_keys(self, chunk))
+        if missing:
+            _logger.warning("Not clearing device %s: %s of %s fetched punches not found in database",
+                            self.name, missing, len(keys))
+            return False
+
+        conn.read_sizes()
+        on_device = getattr(conn, 'records', None)
+        if on_device != fetched:
+            _logger.warning("Not clearing device %s: device holds %s records, %s were fetched", self.name, on_device, fetched)
+            return False
+
+        conn.clear_attendance()
+        self.write({
+            'last_cleared_at': ofields.Datetime.now(),
+            'last_cleared_count': fetched,
+            'ingest_checkpoint': 0,
+            'ingest_checkpoint_key': False,
+        })
+        self.env.cr.commit()
+        _logger.info("Cleared %s records from device %s after verified ingest", fetched, self.name)
+        return True
+
+
+    ####################################################################
+    # Ingestion checkpoint
+    ####################################################################
+    def _get_resume_point(self, attendances):
+        """
+        Number of records at the head of ``attendances`` (the pyzk log just read) committed
+        by previous scheduled runs. The checkpoint only holds when the record it ends on is
+        still at the same position: a device cleared or replaced meanwhile restarts from 0.
+        """
+        self.ensure_one()
+        done = self.ingest_checkpoint
+        if not done:
+            return 0
+        if done <= len(attendances):
+            last = attendances[done - 1]
+            if _checkpoint_key(getattr(last, 'user_id', None), getattr(last, 'timestamp', None)) == self.ingest_checkpoint_key:
+                return done
+        _logger.info("Ingestion checkpoint of device %s no longer matches its log (%s records), restarting from the first record",
+                     self.name, len(attendances))
+        return 0
+
+    def _save_ingest_checkpoint(self, done, last):
+        """Record that the first ``done`` device records (ending on ``last``) are stored, and commit them."""
+        self.ensure_one()
+        self.write({
+            'ingest_checkpoint': done,
+            'ingest_checkpoint_key': _checkpoint_key(last.user_id, last.timestamp),
+            'ingest_checkpoint_at': ofields.Datetime.now(),
+        })
+        self.env.cr.commit()
 
     ####################################################################
     # Persist attendances
     ####################################################################
-    def persist_attendances(self, device, records):
-        LogModel = self.env['sa40.attendance.log']
-        created = skipped = invalid = 0
-        fetched = len(records or [])
+    def persist_attendances(self, device, records, chunk_size=INGEST_CHUNK_SIZE, checkpoint=None, keys=None):
+        """
+        Persist ``records`` (any iterable of AttendanceRecord or dicts) for ``device``,
+        consuming them ``chunk_size`` at a time: timestamps are converted from the device
+        timezone to UTC, one query finds the punches already stored, the new ones are
+        inserted with one batched create. Rejected rows are isolated in savepoints, the
+        caller's transaction is never rolled back.
+        ``checkpoint`` is called after each chunk with the number of records consumed so far
+        and the last of them (the scheduled sync commits there). ``keys``, when given, is a set
+        receiving the (device user id, UTC timestamp) key of every valid record.
+        Returns the counters: created, skipped_duplicates, invalid, fetched, errors (records
+        that failed to insert), stored (distinct punches now in the table) and the
+        min/max timestamps seen.
+        """
+        LogModel = self.env['sa40.attendance.log'].sudo()
+        created = skipped = invalid = errors = fetched = stored = 0
+        min_ts = max_ts = None
+
+        users_by_key = self._get_user_resolution_map(device)
+        trace = device.debug_trace
+        keep_raw = device.raw_storage == 'full'
+        normalizer = TimestampNormalizer(device.tz)
+        diag = IngestDiagnostics(device, trace=trace)
+
+        for chunk in _chunked(records or [], chunk_size):
+            fetched += len(chunk)
+            # (device user id, timestamp) -> vals; a punch repeated within the chunk is a duplicate.
+            # Punches without user id are keyed (None, timestamp): one per device and instant.
+            pending = {}
+            chunk = [_as_attendance_record(rec) for rec in chunk]
+            # device-local -> UTC for the whole chunk; None marks the rejected rows
+            stamps = normalizer.normalize([rec.timestamp for rec in chunk])
+            for rec, parsed_ts in zip(chunk, stamps):
+                try:
+                    device_user_id = rec.user_id
 
-        # Ensure the cursor is not in an aborted state from previous errors.
-        # If there's nothing to rollback this is a no-op.
-        try:
-            self.env.cr.rollback()
-        except Exception:
-            # if rollback itself fails for some reason, just continue -
-            # we'll still use savepoints below to isolate errors.
-            pass
+                    if trace:
+                        _logger.info("Persisting attendance rec: device=%s user=%s ts=%s raw=%s", device.id, device_user_id, rec.timestamp, rec.raw)
 
-        for rec in records or []:
-            # Local try only for non-DB issues (parsing etc.)
-            try:
-                device_user_id = rec.get('user_id')
-                ts = rec.get('timestamp')
-                status = rec.get('status')
-                raw = rec.get('raw')
+                    if parsed_ts is None:
+                        diag.sample(normalizer.reject_reason(rec.timestamp), "Skipping attendance with unusable timestamp %r: %s", rec.timestamp, rec)
+                        invalid += 1
+                        continue
 
-                _logger.warning("Persisting attendance rec: device=%s user=%s ts=%s raw=%s", device.id, device_user_id, ts, raw)
+                    uid = _log_user_uid(device_user_id)
+                    key = (uid, parsed_ts)
+                    if key in pending:
+                        skipped += 1
+                        continue
 
-                # Validate timestamp: must exist and be parseable
-                if not ts:
-                    _logger.warning("Skipping attendance with missing timestamp: %s", rec)
-                    invalid += 1
-                    continue
+                    # resolve the linked res.users through the per-device sa40.user map
+                    user = users_by_key.get(uid)
+                    vals = {
+                        'device_id': device.id,
+                        'log_user_uid': uid or False,
+                        'timestamp': parsed_ts,
+                        'status': rec.status,
+                        'punch': _punch_value(rec.punch),
+                        'raw': rec.raw if keep_raw else False,
+                        'user_id': user.user_id.id if user and user.user_id else False,
+                    }
+                    pending[key] = vals
+                    min_ts = parsed_ts if min_ts is None else min(min_ts, parsed_ts)
+                    max_ts = parsed_ts if max_ts is None else max(max_ts, parsed_ts)
 
-                # Try parsing timestamp robustly (same logic as before)
-                parsed_ts = None
-                if isinstance(ts, datetime):
-                    parsed_ts = ts
-                elif isinstance(ts, str):
-                    try:
-                        parsed_ts = ofields.Datetime.to_datetime(ts)
-                    except Exception:
-                        try:
-                            parsed_ts = datetime.fromisoformat(ts)
-                        except Exception:
-                            try:
-                                parsed_ts = datetime.strptime(ts, '%Y-%m-%d %H:%M:%S')
-                            except Exception:
-                                _logger.warning("Skipping attendance with invalid timestamp format: %s", ts)
-                                invalid += 1
-                                continue
-                else:
-                    _logger.warning("Skipping attendance with unsupported timestamp type: %r", type(ts))
+                except Exception as exc:
+                    # Any other unanticipated exception - mark invalid
+                    diag.sample('unhandled', "Unhandled error processing attendance record %s: %s", rec, exc)
                     invalid += 1
-                    continue
-
-                # Isolate DB ops per-record in a savepoint so one bad record does not abort everything
-                try:
-                    with self.env.cr.savepoint():
-                        # find linked partner via sa40.user if any (use sudo for search to avoid access issues)
-                        user = self.env['sa40.user'].sudo().search([
-                            ('device_id', '=', device.id),
-                            '|', ('device_user_id', '=', device_user_id), ('device_uid', '=', device_user_id)
-                        ], limit=1)
-                        partner_id = user.partner_id.id if user and user.partner_id else False
-
-                        vals = {
-                            'device_id': device.id,
-                            'log_user_uid': device_user_id,
-                            'timestamp': parsed_ts,
-                            'status': status,
-                            'raw': raw,
-                            'partner_id': partner_id,
-                        }
-
-                        LogModel.sudo().create(vals)
-                        created += 1
-
-                except Exception as db_exc:
-                    # Any DB error (unique constraint, integrity error, etc.) will be rolled back
-                    # to the savepoint automatically. Here we log and count it as skipped.
-                    _logger.exception("DB error while creating attendance log (rolled back to savepoint): %s | rec=%s", db_exc, rec)
-                    skipped += 1
+            last = chunk[-1]
+            del chunk, stamps
+
+            if keys is not None:
+                keys.update(pending)
+            if pending:
+                # unique(device_id, log_user_uid, timestamp): punches already ingested are expected
+                # on every resync, so they are filtered out up front and only counted.
+                existing = self._find_existing_log_keys(device, list(pending))
+                skipped += len(existing)
+                stored += len(existing)
+                vals_list = [vals for key, vals in pending.items() if key not in existing]
+                if trace and existing:
+                    _logger.info("Duplicate attendance skipped: device=%s count=%s", device.id, len(existing))
+                del pending
+
+                batch_created, batch_dup, batch_err = self._insert_log_batch(LogModel, vals_list, diag)
+                created += batch_created
+                skipped += batch_dup
+                errors += batch_err
+                stored += batch_created + batch_dup
+
+            if checkpoint:
+                checkpoint(fetched, last)
+
+        diag.summary(fetched=fetched, created=created, duplicates=skipped, invalid=invalid, errors=errors)
+        return {
+            'created': created, 'skipped_duplicates': skipped, 'invalid': invalid, 'fetched': fetched,
+            'errors': errors, 'stored': stored, 'min_timestamp': min_ts, 'max_timestamp': max_ts,
+        }
 
-            except Exception:
-                # Any other unanticipated exception (parsing, etc.) - mark invalid
-                _logger.exception('Unhandled error processing attendance record %s', rec)
-                invalid += 1
+    def _find_existing_log_keys(self, device, keys):
+        """
+        Return the subset of ``keys`` ((device user id, timestamp) pairs) already stored for
+        ``device``. A None user id matches the punches stored without one at that timestamp
+        (NULLs never collide in the unique index, so they are deduplicated here only).
+        """
+        existing = set()
+        unkeyed = [ts for uid, ts in keys if uid is None]
+        keys = [key for key in keys if key[0] is not None]
+        if unkeyed:
+            self.env.cr.execute("""
+                SELECT timestamp FROM sa40_attendance_log
+                 WHERE device_id = %(device)s AND log_user_uid IS NULL AND timestamp = ANY(%(stamps)s::timestamp[])
+                 UNION
+                SELECT timestamp FROM sa40_attendance_log_archive
+                 WHERE device_id = %(device)s AND log_user_uid IS NULL AND timestamp = ANY(%(stamps)s::timestamp[])
+            """, {'device': device.id, 'stamps': unkeyed})
+            existing.update((None, ts) for (ts,) in self.env.cr.fetchall())
+        if not keys:
+            return existing
+        uids, stamps = zip(*keys)
+        # punches past the retention horizon live in the archive: a device that was never
+        # cleared must not bring them back into the hot table
+        self.env.cr.execute("""
+            WITH k(uid, ts) AS (SELECT * FROM unnest(%s::varchar[], %s::timestamp[]))
+            SELECT l.log_user_uid, l.timestamp
+              FROM sa40_attendance_log l
+              JOIN k ON l.log_user_uid = k.uid AND l.timestamp = k.ts
+             WHERE l.device_id = %s
+             UNION
+            SELECT a.log_user_uid, a.timestamp
+              FROM sa40_attendance_log_archive a
+              JOIN k ON a.log_user_uid = k.uid AND a.timestamp = k.ts
+             WHERE a.device_id = %s
+        """, (list(uids), list(stamps), device.id, device.id))
+        existing.update(self.env.cr.fetchall())
+        return existing
+
+    def _insert_log_batch(self, LogModel, vals_list, diag):
+        """
+        Insert ``vals_list`` with one batched create. If the batch trips the unique constraint
+        (a concurrent ingest got there first), fall back to one savepoint per record.
+        Returns (created, duplicates, errors).
+        """
+        if not vals_list:
+            return 0, 0, 0
+        try:
+            with self.env.cr.savepoint():
+                LogModel.create(vals_list)
+            return len(vals_list), 0, 0
+        except psycopg2.IntegrityError:
+            pass
 
-        return {'created': created, 'skipped_duplicates': skipped, 'invalid': invalid, 'fetched': fetched}
+        created = duplicates = errors = 0
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    LogModel.create(vals)
+                created += 1
+            except psycopg2.IntegrityError:
+                duplicates += 1
+            except Exception as db_exc:
+                diag.sample('db_error', "DB error while creating attendance log (rolled back to savepoint): %s | vals=%s", db_exc, vals)
+                errors += 1
+        return created, duplicates, errors
 
 
     ####################################################################
     # High-level sync orchestration
     ####################################################################
-    def sync_data(self, persist=True, preview=False):
+    def sync_data(self, persist=True, preview=False, commit=False):
+        """
+        Fetch users and attendance for every device in ``self``, then persist them, or open the
+        preview wizard with ``preview``. ``commit`` allows intermediate commits (scheduled sync only).
+        """
         overall_users = {'fetched': 0, 'created': 0, 'updated': 0}
-        overall_att = {'fetched': 0, 'created': 0, 'skipped_duplicates': 0, 'invalid': 0}
+        overall_att = {'fetched': 0, 'created': 0, 'skipped_duplicates': 0, 'invalid': 0, 'errors': 0}
+        preview_lines = []
 
         for device in self:
-            users_res = device.fetch_users_from_device()
-            overall_users['fetched'] += users_res.get('fetched', 0)
-            overall_users['created'] += users_res.get('created', 0)
-            overall_users['updated'] += users_res.get('updated', 0)
-
-            # fetch attendances for this device
-            records = device.fetch_attendances_from_device()
-
-            if preview:
-                # build preview wizard like before
-                wizard = self.env['sa40.sync.wizard'].create({'device_id': device.id})
-                for rec in records:
-                    device_user_id = rec.get('user_id')
-                    ts = rec.get('timestamp')
-                    status = rec.get('status')
-                    raw = rec.get('raw')
-                    partner_name = ''
-                    user = self.env['sa40.user'].sudo().search([
-                        ('device_id', '=', device.id),
-                        '|', ('device_user_id', '=', device_user_id), ('device_uid', '=', device_user_id)
-                    ], limit=1)
-                    if user and user.partner_id:
-                        partner_name = user.partner_id.name
-                    self.env['sa40.sync.line'].create({
-                        'wizard_id': wizard.id,
-                        'log_user_uid': device_user_id,
-                        'timestamp': ts,
-                        'status': status,
-                        'raw': raw,
-                        'partner_name': partner_name,
-                    })
-                view = self.env.ref('your_module_name.view_sa40_sync_wizard_form', raise_if_not_found=False)
-                return {
-                    'name': 'Incoming SA40 Logs',
-                    'type': 'ir.actions.act_window',
-                    'res_model': 'sa40.sync.wizard',
-                    'res_id': wizard.id,
-                    'view_mode': 'form',
-                    'views': [(view.id, 'form')] if view else False,
-                    'view_id': view.id if view else False,
-                    'target': 'new',
-                }
+            with device._device_lock('sync'), self._track_run(device, 'sync') as device:
+                if preview:
+                    # read-only: the preview neither stores the device users nor links them
+                    records = device.iter_attendances_from_device()
+                    preview_lines += self._build_preview_lines(device, records)
+                    continue
+
+                users_res = device.fetch_users_from_device()
+                overall_users['fetched'] += users_res.get('fetched', 0)
+                overall_users['created'] += users_res.get('created', 0)
+                overall_users['updated'] += users_res.get('updated', 0)
 
-            if persist:
-                pers = device.persist_attendances(device, records)
+                if not persist:
+                    # stream the attendance of this device
+                    records = device.iter_attendances_from_device()
+                    overall_att['fetched'] += sum(1 for _rec in records)
+                    continue
+
+                # fetch and persist in one device session (may clear the device log afterwards)
+                pers = device._sync_attendance_session(commit=commit)
+                device._run_count(attendance_created=pers.get('created', 0),
+                                  attendance_duplicates=pers.get('skipped_duplicates', 0),
+                                  attendance_invalid=pers.get('invalid', 0),
+                                  attendance_errors=pers.get('errors', 0))
                 overall_att['fetched'] += pers.get('fetched', 0)
                 overall_att['created'] += pers.get('created', 0)
                 overall_att['skipped_duplicates'] += pers.get('skipped_duplicates', 0)
                 overall_att['invalid'] += pers.get('invalid', 0)
-            else:
-                overall_att['fetched'] += len(records)
+                overall_att['errors'] += pers.get('errors', 0)
+                device._schedule_next_poll(pers.get('created', 0))
+
+        if preview:
+            return self._open_preview_wizard(preview_lines)
 
         # Build a verbose message
         msg = (
             f"Users: fetched {overall_users['fetched']}, created {overall_users['created']}, updated {overall_users['updated']}.\n"
             f"Attendance: fetched {overall_att['fetched']}, created {overall_att['created']}, "
-            f"skipped (duplicates) {overall_att['skipped_duplicates']}, invalid {overall_att['invalid']}."
+            f"skipped (duplicates) {overall_att['skipped_duplicates']}, invalid {overall_att['invalid']}, errors {overall_att['errors']}."
         )
 
         return {
@@ -430,20 +1359,211 @@ class Sa40Device(models.Model):
             'params': {'title': 'SA40 Sync Complete', 'message': msg, 'sticky': False, 'type': 'success'}
         }
 
+    def action_preview_sync(self):
+        """UI button: fetch logs from the selected devices into the preview wizard without persisting."""
+        return self.sync_data(persist=False, preview=True)
 
+    def _build_preview_lines(self, device, records):
+        """
+        Turn fetched records into sa40.sync.line values (timestamps in UTC), keeping only
+        the punches an import would create: the (device user id, timestamp) keys already
+        stored, or repeated in the fetch, are left out. User names come from one
+        resolution map.
+        """
+        users_by_key = self._get_user_resolution_map(device)
+        normalizer = TimestampNormalizer(device.tz)
+
+        vals_list = []
+        seen = set()
+        for chunk in _chunked(records, INGEST_CHUNK_SIZE):
+            chunk = [_as_attendance_record(rec) for rec in chunk]
+            stamps = normalizer.normalize([rec.timestamp for rec in chunk])
+            pending = {}
+            for rec, ts in zip(chunk, stamps):
+                # unusable timestamps would be rejected on import anyway
+                if ts is None:
+                    continue
+                uid = _log_user_uid(rec.user_id)
+                key = (uid, ts)
+                if key in seen or key in pending:
+                    continue
+                user = users_by_key.get(uid)
+                pending[key] = {
+                    'device_id': device.id,
+                    'log_user_uid': uid or False,
+                    'timestamp': ts,
+                    'status': rec.status,
+                    'punch': _punch_value(rec.punch),
+                    'raw': rec.raw,
+                    'user_name': user.user_id.name if user and user.user_id else (user.name if user else ''),
+                }
+            seen.update(pending)
+            if pending:
+                existing = self._find_existing_log_keys(device, list(pending))
+                vals_list += [vals for key, vals in pending.items() if key not in existing]
+        return vals_list
+
+    def _open_preview_wizard(self, line_vals, batch_size=1000):
+        wizard = self.env['sa40.sync.wizard'].create({'device_ids': [(6, 0, self.ids)]})
+        SyncLine = self.env['sa40.sync.line']
+        for start in range(0, len(line_vals), batch_size):
+            batch = line_vals[start:start + batch_size]
+            for vals in batch:
+                vals['wizard_id'] = wizard.id
+            SyncLine.create(batch)
+
+        view = self.env.ref('biopro_sa40_sync.view_sa40_sync_wizard_form', raise_if_not_found=False)
+        return {
+            'name': 'Incoming SA40 Logs',
+            'type': 'ir.actions.act_window',
+            'res_model': 'sa40.sync.wizard',
+            'res_id': wizard.id,
+            'view_mode': 'form',
+            'views': [(view.id, 'form')] if view else False,
+            'view_id': view.id if view else False,
+            'target': 'new',
+        }
+
+
+
+    ####################################################################
+    # Adaptive polling schedule
+    ####################################################################
+    def _schedule_next_poll(self, new_punches):
+        """
+        Update the smoothed punch rate with the punches created by the poll that just ran
+        and plan the next poll so that about POLL_TARGET_PUNCHES accumulate in between,
+        within [poll_interval_min, poll_interval_max]. Upcoming session starts pull the
+        next poll forward.
+        """
+        self.ensure_one()
+        now = ofields.Datetime.now()
+        min_iv = max(self.poll_interval_min or 1, 1)
+        max_iv = max(self.poll_interval_max or 60, min_iv)
+
+        rate = self.punch_rate
+        if self.last_poll_at:
+            elapsed = max((now - self.last_poll_at).total_seconds() / 60.0, 1.0)
+            rate = POLL_RATE_SMOOTHING * (new_punches / elapsed) + (1 - POLL_RATE_SMOOTHING) * rate
+
+        if not self.last_poll_at:
+            interval = min_iv  # no rate sample yet: the next poll will provide one
+        else:
+            interval = POLL_TARGET_PUNCHES / rate if rate > 0 else max_iv
+        interval = min(max(interval, min_iv), max_iv)
+        next_poll = now + timedelta(minutes=interval)
+
+        for start in self._get_upcoming_session_starts(now, now + timedelta(minutes=max_iv)):
+            margin = timedelta(minutes=float(self.tolerance_period or 0.0))
+            if start - margin <= now <= start + margin:
+                # inside the arrival window of a session: poll as often as allowed
+                next_poll = min(next_poll, now + timedelta(minutes=min_iv))
+            elif now < start - margin < next_poll:
+                next_poll = start - margin
+
+        self.write({'punch_rate': rate, 'last_poll_at': now, 'next_poll_at': next_poll})
+
+    def _get_upcoming_session_starts(self, date_from, date_to):
+        """
+        Start datetimes (naive UTC) of open sc.attendance.sheet sessions that are running or
+        starting between ``date_from`` and ``date_to``. Empty when attendance sheets are not installed.
+        """
+        if 'sc.attendance.sheet' not in self.env:
+            return []
+        normalizer = TimestampNormalizer(self.tz)
+        margin = timedelta(minutes=float(self.tolerance_period or 0.0))
+        sheets = self.env['sc.attendance.sheet'].sudo().search([
+            ('date', '>=', (date_from - timedelta(days=1)).date()),
+            ('date', '<=', (date_to + timedelta(days=1)).date()),
+            ('lock_attendance', '=', 'open'),
+        ])
+        starts = set()
+        for sheet in sheets:
+            try:
+                local = datetime.combine(sheet.date, time(int(sheet.start_time), int((sheet.start_time % 1) * 60)))
+            except Exception:
+                continue
+            start = normalizer.to_utc(local)
+            if date_from - margin <= start <= date_to + margin:
+                starts.add(start)
+        return sorted(starts)
 
     ####################################################################
     # Cron entrypoint for all devices
     ####################################################################
     @api.model
     def cron_sync_all_devices(self):
-        devices = self.search([('active', '=', True)])
-        for dev in devices:
+        """
+        Scheduler tick: claim the devices due when the tick started one at a time and sync
+        each in its own transaction. The worker scheduled actions run it concurrently (on
+        any node): claims skip the devices other workers hold. Past SYNC_TICK_BUDGET seconds
+        the tick stops claiming and triggers the workers again for the devices left.
+        """
+        tick = ofields.Datetime.now()
+        deadline = pytime.monotonic() + SYNC_TICK_BUDGET
+        synced = 0
+        while True:
+            if pytime.monotonic() >= deadline:
+                self._trigger_sync_workers()
+                break
+            dev = self._claim_due_device(due_by=tick)
+            if not dev:
+                break
             try:
-                dev.sync_data(persist=True, preview=False)
+                dev.sync_data(persist=True, preview=False, commit=True)
+                self.env.cr.commit()
+                synced += 1
+            except DeviceBusyError:
+                self.env.cr.rollback()
+                _logger.info('Device %s is busy (manual operation in progress); skipped this tick', dev.name)
+                dev.write({'next_poll_at': ofields.Datetime.now() + timedelta(minutes=max(dev.poll_interval_min, 1))})
+                self.env.cr.commit()
             except Exception:
                 _logger.exception('Error syncing device %s in cron', dev.name)
-        return True
+                # the ingested chunks and the breaker state are already committed, the rest of the
+                # transaction is half applied: drop it, the lease delays the retry
+                self.env.cr.rollback()
+        return synced
+
+    @api.model
+    def _trigger_sync_workers(self):
+        """Run the active sync worker scheduled actions again as soon as possible."""
+        for xmlid in SYNC_WORKER_CRONS:
+            cron = self.env.ref(xmlid, raise_if_not_found=False)
+            if cron and cron.active:
+                cron.sudo()._trigger()
+
+    @api.model
+    def _claim_due_device(self, due_by=None):
+        """
+        Claim the next active device whose poll is due (by ``due_by``, now when None) and
+        whose breaker allows a connection:
+        the row is picked with FOR UPDATE SKIP LOCKED and leased (next_poll_at pushed
+        CLAIM_LEASE_MINUTES ahead) in a committed transaction, so no other worker picks it
+        up; the sync then reschedules it. Returns the device or an empty recordset.
+        """
+        now = ofields.Datetime.now()
+        self.env.flush_all()
+        self.env.cr.execute("""
+            UPDATE sa40_device
+               SET next_poll_at = %(lease)s
+             WHERE id = (SELECT id
+                           FROM sa40_device
+                          WHERE active
+                            AND (next_poll_at IS NULL OR next_poll_at <= %(due)s)
+                            AND (health_state = 'closed' OR next_retry_at IS NULL OR next_retry_at <= %(now)s)
+                          ORDER BY next_poll_at ASC NULLS FIRST, id
+                          LIMIT 1
+                            FOR UPDATE SKIP LOCKED)
+         RETURNING id
+        """, {'now': now, 'due': due_by or now, 'lease': now + timedelta(minutes=CLAIM_LEASE_MINUTES)})
+        row = self.env.cr.fetchone()
+        self.env.cr.commit()
+        if not row:
+            return self.browse()
+        device = self.browse(row[0])
+        device.invalidate_recordset(['next_poll_at'])
+        return device
 
 
 
@@ -473,122 +1593,122 @@ class Sa40Device(models.Model):
         base_domain = user_domain or []
 
         for device in self:
-            zk = conn = None
-            try:
-                zk, conn = self._connect_to_device(device)
-                conn.disable_device()
-
-                # read device users once (map uid -> name)
-                dev_users = conn.get_users() or []
-                dev_users_by_uid = {}
-                for u in dev_users:
-                    try:
-                        dev_users_by_uid[int(getattr(u, 'uid', 0))] = getattr(u, 'name', '') or ''
-                    except Exception:
-                        continue
-                used_uids = set(dev_users_by_uid.keys())
-                max_uid = 0 if not used_uids else max(used_uids)
-
-                domain = [('device_id', '=', device.id)] + base_domain
-                if only_with_partner:
-                    domain += [('partner_id', '!=', False)]
-                users = Sa40User.search(domain)
+            with device._device_lock('push users'), self._track_run(device, 'push') as device:
+                zk = conn = None
+                disabled_at = None
+                try:
+                    zk, conn = device._connect_to_device(device)
+                    conn.disable_device()
+                    disabled_at = pytime.perf_counter()
+
+                    # read device users once (map uid -> name)
+                    with device._run_phase('get_users'):
+                        dev_users = conn.get_users() or []
+                    dev_users_by_uid = {}
+                    for u in dev_users:
+                        try:
+                            dev_users_by_uid[int(getattr(u, 'uid', 0))] = getattr(u, 'name', '') or ''
+                        except Exception:
+                            continue
+                    used_uids = set(dev_users_by_uid.keys())
+                    max_uid = 0 if not used_uids else max(used_uids)
+
+                    domain = [('device_id', '=', device.id)] + base_domain
+                    if only_with_partner:
+                        # sa40.user reaches its partner through the linked res.users
+                        domain += [('user_id', '!=', False)]
+                    users = Sa40User.search(domain)
+                    pushed_before, skipped_before = counters['pushed'], counters['skipped']
+                    push_started = pytime.perf_counter()
+
+                    for user in users:
+                        # ensure we operate on a fresh sudo record when writing
+                        urec = user.sudo()
+
+                        uid = int(urec.device_uid) if urec.device_uid else 0
+                        if not uid:
+                            max_uid += 1
+                            while max_uid in used_uids:
+                                max_uid += 1
+                            uid = max_uid
 
-                for user in users:
-                    # ensure we operate on a fresh sudo record when writing
-                    urec = user.sudo()
+                        user_id_param = str(urec.device_user_id or urec.device_uid or urec.id)
+                        # PREFER partner name if present — this fixes the "I edited partner name but device got old name" case
+                        desired_name, card_val = urec._get_device_profile()
+                        device_name = desired_name[:DEVICE_NAME_LENGTH]
 
-                    uid = int(urec.device_uid) if urec.device_uid else 0
-                    if not uid:
-                        max_uid += 1
-                        while max_uid in used_uids:
-                            max_uid += 1
-                        uid = max_uid
+                        # If partner name differs from sa40.user.name, update sa40.user BEFORE pushing so the push uses the new name
+                        try:
+                            if (urec.name or '') != desired_name:
+                                try:
+                                    urec.write({'name': desired_name})
+                                    counters['updated_local'] += 1
+                                    if debug:
+                                        _logger.info("LOCAL WRITE: updated sa40.user %s name -> %s", urec.id, desired_name)
+                                except Exception:
+                                    _logger.exception("Failed to update local sa40.user.name for id %s", urec.id)
+                        except Exception:
+                            # just continue pushing even if local write fails
+                            _logger.exception("Error while comparing/writing sa40.user name for id %s", urec.id)
 
-                    user_id_param = str(urec.device_user_id or urec.device_uid or (urec.partner_id.id if urec.partner_id else urec.id))
-                    card_val = 0
-                    try:
-                        if urec.partner_id and urec.partner_id.biometric_id and str(urec.partner_id.biometric_id).isdigit():
-                            card_val = int(urec.partner_id.biometric_id)
-                    except Exception:
-                        card_val = 0
-
-                    # PREFER partner name if present — this fixes the "I edited partner name but device got old name" case
-                    desired_name = ''
-                    if urec.partner_id and urec.partner_id.name:
-                        desired_name = urec.partner_id.name
-                    elif urec.name:
-                        desired_name = urec.name
-                    else:
-                        desired_name = 'Unknown'
-                    device_name = (desired_name)[:31]
+                        prev_name = dev_users_by_uid.get(int(uid)) if uid in dev_users_by_uid else None
 
-                    # If partner name differs from sa40.user.name, update sa40.user BEFORE pushing so the push uses the new name
-                    try:
-                        if (urec.name or '') != desired_name:
-                            try:
-                                urec.write({'name': desired_name})
-                                counters['updated_local'] += 1
-                                if debug:
-                                    _logger.info("LOCAL WRITE: updated sa40.user %s name -> %s", urec.id, desired_name)
-                            except Exception:
-                                _logger.exception("Failed to update local sa40.user.name for id %s", urec.id)
-                    except Exception:
-                        # just continue pushing even if local write fails
-                        _logger.exception("Error while comparing/writing sa40.user name for id %s", urec.id)
+                        if debug:
+                            _logger.info("PUSH DEBUG: device=%s sa40.user=%s uid=%s user_id=%s name=%s prev_name=%s card=%s",
+                                         device.name, urec.id, uid, user_id_param, device_name, prev_name, card_val)
 
-                    prev_name = dev_users_by_uid.get(int(uid)) if uid in dev_users_by_uid else None
+                        try:
+                            success = conn.set_user(uid=int(uid),
+                                                    name=device_name,
+                                                    privilege=0,
+                                                    password='',
+                                                    group_id='',
+                                                    user_id=user_id_param,
+                                                    card=card_val)
+                            _logger.info("PUSH RESULT: sa40.user=%s set_user returned %s (device=%s uid=%s)",
+                                         urec.id, success, device.name, uid)
+
+                            if success:
+                                counters['pushed'] += 1
+
+                                if prev_name is None or prev_name == '':
+                                    counters['created_remote'] += 1
+                                elif str(prev_name).strip() != device_name:
+                                    counters['updated_remote'] += 1
+
+                                # refresh our local cache for the run
+                                dev_users_by_uid[int(uid)] = device_name
+                            else:
+                                counters['skipped'] += 1
+                                _logger.warning("set_user returned False for sa40.user %s -> uid %s on device %s",
+                                                urec.id, uid, device.name)
+                                continue
 
-                    if debug:
-                        _logger.info("PUSH DEBUG: device=%s sa40.user=%s uid=%s user_id=%s name=%s prev_name=%s card=%s",
-                                     device.name, urec.id, uid, user_id_param, device_name, prev_name, card_val)
+                            used_uids.add(int(uid))
 
-                    try:
-                        success = conn.set_user(uid=int(uid),
-                                                name=device_name,
-                                                privilege=0,
-                                                password='',
-                                                group_id='',
-                                                user_id=user_id_param,
-                                                card=card_val)
-                        _logger.info("PUSH RESULT: sa40.user=%s set_user returned %s (device=%s uid=%s)",
-                                     urec.id, success, device.name, uid)
-
-                        if success:
-                            counters['pushed'] += 1
-
-                            if prev_name is None or prev_name == '':
-                                counters['created_remote'] += 1
-                            elif str(prev_name).strip() != device_name:
-                                counters['updated_remote'] += 1
-
-                            # refresh our local cache for the run
-                            dev_users_by_uid[int(uid)] = device_name
-                        else:
+                        except Exception as exc:
+                            _logger.exception("Failed to push sa40.user %s to device %s: %s", urec.id, device.name, exc)
                             counters['skipped'] += 1
-                            _logger.warning("set_user returned False for sa40.user %s -> uid %s on device %s",
-                                            urec.id, uid, device.name)
-                            continue
-
-                        used_uids.add(int(uid))
 
-                    except Exception as exc:
-                        _logger.exception("Failed to push sa40.user %s to device %s: %s", urec.id, device.name, exc)
-                        counters['skipped'] += 1
+                    device._run_add_time('push', pytime.perf_counter() - push_started)
+                    device._run_count(users_pushed=counters['pushed'] - pushed_before,
+                                      users_skipped=counters['skipped'] - skipped_before)
 
-            except Exception as exc:
-                _logger.exception("Failed connecting/pushing to device %s", device.name)
-                raise UserError(f"Failed to push users to device {device.name}: {exc}")
-            finally:
-                if conn:
-                    try:
-                        conn.enable_device()
-                    except Exception:
-                        pass
-                    try:
-                        conn.disconnect()
-                    except Exception:
-                        pass
+                except Exception as exc:
+                    _logger.exception("Failed connecting/pushing to device %s", device.name)
+                    raise UserError(f"Failed to push users to device {device.name}: {exc}")
+                finally:
+                    if conn:
+                        try:
+                            conn.enable_device()
+                        except Exception:
+                            pass
+                        if disabled_at is not None:
+                            device._run_add_time('disable', pytime.perf_counter() - disabled_at)
+                        try:
+                            conn.disconnect()
+                        except Exception:
+                            pass
 
         return counters
 
@@ -630,10 +1750,497 @@ class Sa40Device(models.Model):
 
 
 
+    ####################################################################
+    # One-to-many user distribution
+    ####################################################################
+    def distribute_users(self, users):
+        """
+        Push the people of the sa40.user ``users`` (identified by their device user_id) to
+        every device in ``self`` at once: uids are allocated per device up front from the
+        sa40.user of that device, then a worker pool writes all devices concurrently, each
+        in one disabled session (:func:`_push_users_session`). Afterwards the sa40.user of
+        each device are created or updated with the uids actually written.
+        Busy devices and devices whose circuit breaker is open are skipped.
+        Returns {device: result} (see _push_users_session, plus ``skipped`` reasons).
+        """
+        self._ensure_pyzk()
+        Sa40User = self.env['sa40.user'].sudo().with_context(active_test=False)
+        people = {}
+        for user in users.sudo():
+            badge = _device_user_key(user.device_user_id, user.device_uid)
+            if badge not in people:
+                name, card = user._get_device_profile()
+                people[badge] = {'name': name, 'card': card, 'res_user': user.user_id.id}
+        results = {}
+        if not people:
+            return results
+
+        existing = defaultdict(dict)
+        used_uids = defaultdict(set)
+        for rec in Sa40User.search([('device_id', 'in', self.ids)]):
+            if rec.device_uid:
+                used_uids[rec.device_id.id].add(rec.device_uid)
+            if rec.device_user_id in people:
+                existing[rec.device_id.id][rec.device_user_id] = rec
+
+        with ExitStack() as locks:
+            jobs = []
+            for device in self:
+                if not device._breaker_is_due():
+                    results[device] = {'ok': False, 'error': 'circuit breaker open', 'skipped': True}
+                    continue
+                try:
+                    locks.enter_context(device._device_lock('distribute users'))
+                except DeviceBusyError:
+                    results[device] = {'ok': False, 'error': 'busy with another operation', 'skipped': True}
+                    continue
+                # allocate the uids of the device up front
+                known, used = existing[device.id], used_uids[device.id]
+                entries = []
+                for badge, person in people.items():
+                    uid = known[badge].device_uid if badge in known and known[badge].device_uid else 0
+                    if not uid:
+                        uid = max(used, default=0) + 1
+                        used.add(uid)
+                    entries.append(dict(person, uid=uid, user_id=badge))
+                jobs.append((device, (device.device_ip, device.device_port, int(device.device_timeout),
+                                      device.device_password, entries, frozenset(used))))
+
+            if jobs:
+                with ThreadPoolExecutor(max_workers=min(DISTRIBUTION_WORKERS, len(jobs))) as pool:
+                    futures = {pool.submit(_push_users_session, *args): device for device, args in jobs}
+                    for done, future in enumerate(as_completed(futures), 1):
+                        device = futures[future]
+                        results[device] = res = future.result()
+                        _logger.info("SA40 distribution %s/%s: %s %s (%s pushed, %s failed, %.1fs)",
+                                     done, len(jobs), device.name, 'done' if res['ok'] else f"failed: {res['error']}",
+                                     res['pushed'], res['failed'], res['seconds'])
+
+            for device, _args in jobs:
+                device._apply_distribution(results[device], people, existing[device.id])
+        return results
+
+    def _apply_distribution(self, res, people, known):
+        """Journal and record the outcome ``res`` of a distribution to ``self`` in Odoo (main thread)."""
+        self.ensure_one()
+        recorder = SyncRunRecorder()
+        recorder.add_time('push', res['seconds'])
+        recorder.add_counts(users_pushed=res['pushed'], users_skipped=res['failed'])
+        recorder.error = res['error'] or False
+        started_at = ofields.Datetime.now() - timedelta(seconds=res['seconds'])
+        self.env['sa40.sync.run']._record(self, 'push', recorder, started_at, res['seconds'])
+        if not res['ok']:
+            self._breaker_record_failure(res['error'], apart=False)
+            return
+        self._breaker_record_success()
+
+        now = self.env.cr.now()
+        Sa40User = self.env['sa40.user'].sudo().with_context(active_test=False)
+        moved = [(known[badge], uid) for badge, uid in res['uids'].items()
+                 if badge in known and known[badge].device_uid != uid]
+        # uids may be swapped between records: park the moving ones first (unique per device)
+        for rec, _uid in moved:
+            rec.write({'device_uid': -rec.id})
+        for rec, uid in moved:
+            rec.write({'device_uid': uid})
+        for badge, rec in known.items():
+            if badge in res['uids'] and rec.name != people[badge]['name']:
+                rec.write({'name': people[badge]['name']})
+        # distributing to an archived user enrols it again
+        Sa40User.browse([rec.id for badge, rec in known.items() if badge in res['uids']]).write({
+            'device_synced_at': now, 'active': True,
+        })
+        Sa40User.create([{
+            'name': people[badge]['name'],
+            'device_id': self.id,
+            'device_uid': uid,
+            'device_user_id': badge,
+            'user_id': people[badge]['res_user'],
+            'device_synced_at': now,
+        } for badge, uid in res['uids'].items() if badge not in known])
+
+    ####################################################################
+    # Two-way user reconciliation
+    ####################################################################
+    def reconcile_users(self, dry_run=False):
+        """
+        Reconcile the user table of every device in ``self`` with its sa40.user records:
+        the table is downloaded once, diffed in memory (:meth:`_diff_device_users`) and both
+        sides are updated within the same device session. With ``dry_run`` nothing is
+        written. Returns {device id: report text}.
+        """
+        self._ensure_pyzk()
+        Sa40User = self.env['sa40.user'].sudo().with_context(active_test=False)
+        reports = {}
+        for device in self:
+            with device._device_lock('reconcile users'), self._track_run(device, 'reconcile') as device:
+                try:
+                    with device._device_session() as conn:
+                        with device._run_phase('get_users'):
+                            dev_users = conn.get_users() or []
+                        device._run_count(users_fetched=len(dev_users))
+                        plan = device._diff_device_users(dev_users, Sa40User.search([('device_id', '=', device.id)]))
+                        reports[device.id] = device._format_reconcile_report(plan, dry_run)
+                        if not dry_run:
+                            with device._run_phase('push'):
+                                failed = device._apply_device_side(conn, plan)
+                            device._apply_odoo_side(plan, failed)
+                            if failed:
+                                reports[device.id] += device._format_reconcile_failures(failed)
+                except Exception as exc:
+                    _logger.exception("Failed to reconcile users of device %s", device.name)
+                    raise UserError(f"Failed to reconcile users of {device.name}: {exc}")
+        return reports
+
+    def _diff_device_users(self, dev_users, records):
+        """
+        Compare the pyzk users ``dev_users`` with the sa40.user ``records`` of the device
+        (archived ones included), matched on their device user_id. On a difference, the side
+        edited last wins: a record written in Odoo since its last sync (or never synced) is
+        sent to the device, otherwise the device values are copied back. Both stamps come
+        from the transaction clock (``cr.now()``), so a record written in the transaction
+        that synced it is not newer than its sync.
+        Nothing is deleted in Odoo: archived records stay archived, to be deleted by hand.
+        Returns the plan:
+          - odoo_create: vals of the device users unknown to Odoo
+          - odoo_write: (record, vals) taken from the device (name, uid)
+          - odoo_archive: records deleted on the device since their last sync
+          - device_set: (record, uid, pyzk user or None when new) to write on the device
+          - device_delete: (archived record, its pyzk user) to delete from the device
+          - collisions: notes on duplicate user_ids and reassigned uids
+          - held: notes on what was left alone on purpose
+        """
+        self.ensure_one()
+        plan = {
+            'odoo_create': [], 'odoo_write': [], 'odoo_archive': records.browse(),
+            'device_set': [], 'device_delete': [], 'collisions': [], 'held': [],
+        }
+        collisions = plan['collisions']
+
+        dev_by_key = {}
+        for u in dev_users:
+            key = _device_user_key(getattr(u, 'user_id', None), u.uid)
+            if key in dev_by_key:
+                collisions.append(f"user_id {key} is enrolled twice on the device (uid {dev_by_key[key].uid} and {u.uid}): uid {u.uid} left alone")
+                continue
+            dev_by_key[key] = u
+        rec_by_key = {}
+        for rec in records.sorted('id'):
+            key = _device_user_key(rec.device_user_id, rec.device_uid)
+            if key in rec_by_key:
+                collisions.append(f"user_id {key} is held by several Odoo users ({rec_by_key[key].name}, {rec.name}): {rec.name} left alone")
+                continue
+            rec_by_key[key] = rec
+
+        dev_uids = {int(u.uid) for u in dev_users}
+        used_uids = dev_uids | {rec.device_uid for rec in records if rec.device_uid}
+
+        def next_uid():
+            uid = max(used_uids, default=0) + 1
+            if uid > DEVICE_MAX_UID:
+                uid = next(n for n in range(1, DEVICE_MAX_UID + 1) if n not in used_uids)
+            used_uids.add(uid)
+            return uid
+
+        for key, u in dev_by_key.items():
+            rec = rec_by_key.pop(key, None)
+            uid = int(u.uid)
+            if rec is None:
+                plan['odoo_create'].append({
+                    'name': u.name or 'Unknown', 'device_id': self.id, 'device_uid': uid, 'device_user_id': key,
+                })
+            elif not rec.active:
+                plan['device_delete'].append((rec, u))
+            else:
+                vals = {}
+                if rec.device_uid != uid:
+                    collisions.append(f"{rec.name} ({key}) is uid {uid} on the device, not {rec.device_uid}: uid updated in Odoo")
+                    vals['device_uid'] = uid
+                if not _same_device_name(rec.name, u.name):
+                    if not rec.device_synced_at or rec.write_date > rec.device_synced_at:
+                        plan['device_set'].append((rec, uid, u))
+                    else:
+                        vals['name'] = u.name or 'Unknown'
+                if vals:
+                    plan['odoo_write'].append((rec, vals))
+
+        missing = records.browse()
+        for key, rec in rec_by_key.items():
+            if not rec.active:
+                # archived in Odoo and gone from the device: done
+                continue
+            if rec.device_synced_at and dev_users:
+                # deleted on the device (an empty table is a reset device: refill it)
+                missing |= rec
+                continue
+            uid = rec.device_uid
+            if not uid or uid in dev_uids:
+                new_uid = next_uid()
+                if uid:
+                    collisions.append(f"uid {uid} of {rec.name} ({key}) is taken on the device: allocated uid {new_uid}")
+                uid = new_uid
+                plan['odoo_write'].append((rec, {'device_uid': uid}))
+            plan['device_set'].append((rec, uid, None))
+
+        synced = len(records.filtered(lambda r: r.active and r.device_synced_at))
+        if len(missing) > max(RECONCILE_MAX_MISSING_USERS, RECONCILE_MAX_MISSING_RATIO * synced):
+            plan['held'].append(f"{len(missing)} of {synced} synced users are missing from the device: none archived. "
+                                "Check the device, then archive them by hand.")
+        else:
+            plan['odoo_archive'] = missing
+        return plan
+
+    def _apply_device_side(self, conn, plan):
+        """Apply the device part of ``plan`` on ``conn``. Returns the sa40.user that could not be written or deleted."""
+        failed = self.env['sa40.user'].browse()
+        for rec, u in plan['device_delete']:
+            try:
+                conn.delete_user(uid=int(u.uid))
+            except Exception as exc:
+                _logger.warning("Could not delete uid %s from device %s: %s", u.uid, self.name, exc)
+                failed |= rec
+        for rec, uid, u in plan['device_set']:
+            try:
+                # keep what Odoo does not manage (privilege, password, card) of existing device users
+                conn.set_user(uid=uid,
+                              name=(rec.name or 'Unknown')[:DEVICE_NAME_LENGTH],
+                              privilege=getattr(u, 'privilege', 0) if u else 0,
+                              password=getattr(u, 'password', '') if u else '',
+                              group_id=getattr(u, 'group_id', '') if u else '',
+                              user_id=_device_user_key(rec.device_user_id, uid),
+                              card=getattr(u, 'card', 0) if u else 0)
+            except Exception as exc:
+                _logger.warning("Could not write %s (uid %s) on device %s: %s", rec.name, uid, self.name, exc)
+                failed |= rec
+        unwritten = failed.filtered('active')
+        self._run_count(users_pushed=len(plan['device_set']) - len(unwritten), users_skipped=len(failed))
+        return failed
+
+    def _apply_odoo_side(self, plan, failed):
+        """
+        Apply the Odoo part of ``plan`` and stamp the records now matching the device as synced
+        (``failed``: the records the device refused, left as they are for the next run).
+        """
+        Sa40User = self.env['sa40.user'].sudo().with_context(active_test=False)
+        plan['odoo_archive'].write({'active': False})
+        writes = plan['odoo_write']
+        # uids may be swapped between records: park the moving ones first (unique per device)
+        for rec, vals in writes:
+            if 'device_uid' in vals:
+                rec.write({'device_uid': -rec.id})
+        for rec, vals in writes:
+            rec.write(vals)
+        now = self.env.cr.now()
+        created = Sa40User.create([dict(vals, device_synced_at=now) for vals in plan['odoo_create']])
+        created._auto_link()
+        synced = Sa40User.search([('device_id', '=', self.id), ('active', '=', True)]) - failed - created
+        synced.write({'device_synced_at': now})
+
+    def _format_reconcile_failures(self, failed):
+        lines = [f"Failed on device: {len(failed)} (left unchanged in Odoo, retried next run)"]
+        lines += [f"  {rec.device_user_id or '-'} {rec.name} (uid {rec.device_uid})" for rec in failed[:RECONCILE_REPORT_LINES]]
+        if len(failed) > RECONCILE_REPORT_LINES:
+            lines.append(f"  ... and {len(failed) - RECONCILE_REPORT_LINES} more")
+        return '\n' + '\n'.join(lines)
+
+    def _format_reconcile_report(self, plan, dry_run):
+        def user(rec, uid=None):
+            return f"{rec.device_user_id or '-'} {rec.name} (uid {uid if uid is not None else rec.device_uid})"
+
+        sections = [
+            ('Create in Odoo', [f"{v['device_user_id']} {v['name']} (uid {v['device_uid']})" for v in plan['odoo_create']]),
+            ('Update in Odoo', [f"{user(rec)}: " + ', '.join(f"{k} -> {v}" for k, v in vals.items())
+                                for rec, vals in plan['odoo_write']]),
+            ('Archive in Odoo', [user(rec) for rec in plan['odoo_archive']]),
+            ('Write on device', [user(rec, uid) + ('' if u else ' [new]') for rec, uid, u in plan['device_set']]),
+            ('Delete on device', [f"{getattr(u, 'user_id', '') or '-'} {u.name} (uid {u.uid})" for _rec, u in plan['device_delete']]),
+            ('UID collisions', plan['collisions']),
+            ('Held back', plan['held']),
+        ]
+        lines = [f"{self.name}: {'dry run, nothing written' if dry_run else 'applied'}"]
+        for title, items in sections:
+            lines.append(f"{title}: {len(items)}")
+            lines += [f"  {item}" for item in items[:RECONCILE_REPORT_LINES]]
+            if len(items) > RECONCILE_REPORT_LINES:
+                lines.append(f"  ... and {len(items) - RECONCILE_REPORT_LINES} more")
+        return '\n'.join(lines)
+
+    def action_open_user_reconcile(self):
+        """UI button: open the user reconciliation wizard for this device."""
+        self.ensure_one()
+        return {
+            'name': 'Reconcile Users',
+            'type': 'ir.actions.act_window',
+            'res_model': 'sa40.user.reconcile.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_device_id': self.id},
+        }
+
+    def action_open_usb_import(self):
+        """UI button: open the USB dump import wizard for this device."""
+        self.ensure_one()
+        return {
+            'name': 'Import USB Dump',
+            'type': 'ir.actions.act_window',
+            'res_model': 'sa40.usb.import.wizard',
+            'view_mode': 'form',
+            'target': 'new',
+            'context': {'default_device_id': self.id},
+        }
+
+    ####################################################################
+    # Fingerprint templates (sa40.fingerprint.template)
+    ####################################################################
+    @contextmanager
+    def _device_session(self):
+        """Connected, disabled session on the device of ``self``; re-enabled and closed on exit."""
+        self.ensure_one()
+        conn = None
+        disabled_at = None
+        try:
+            _zk, conn = self._connect_to_device(self)
+            conn.disable_device()
+            disabled_at = pytime.perf_counter()
+            yield conn
+        finally:
+            if conn:
+                try:
+                    conn.enable_device()
+                except Exception:
+                    pass
+                if disabled_at is not None:
+                    self._run_add_time('disable', pytime.perf_counter() - disabled_at)
+                try:
+                    conn.disconnect()
+                except Exception:
+                    pass
+
+    def pull_templates_from_device(self):
+        """Read the fingerprint templates of every device in ``self`` into the template store."""
+        self._ensure_pyzk()
+        Template = self.env['sa40.fingerprint.template'].sudo()
+        totals = defaultdict(int)
+        for device in self:
+            with device._device_lock('pull templates'), self._track_run(device, 'templates') as device:
+                try:
+                    with device._device_session() as conn:
+                        with device._run_phase('get_users'):
+                            dev_users = conn.get_users() or []
+                        user_ids_by_uid = {
+                            int(u.uid): str(u.user_id) for u in dev_users if getattr(u, 'user_id', None) not in (None, '')
+                        }
+                        with device._run_phase('get_templates'):
+                            fingers = conn.get_templates() or []
+                except Exception as exc:
+                    _logger.exception("Failed to read templates from device %s", device.name)
+                    raise UserError(f"Failed to read fingerprint templates from {device.name}: {exc}")
+                counters = Template._ingest_device_templates(device, fingers, user_ids_by_uid)
+                device._run_count(templates_pulled=counters['created'] + counters['updated'])
+                for key, value in counters.items():
+                    totals[key] += value
+        return dict(totals)
+
+    def replicate_templates_to_device(self):
+        """
+        Upload to every device in ``self`` the stored templates of its users that it is not
+        known to hold, grouped per user in bulk HR_save_usertemplates calls. Users not
+        enrolled on the target yet (push them first) are left out.
+        """
+        self._ensure_pyzk()
+        if Finger is None:
+            raise UserError("This pyzk build has no zk.finger module: fingerprint templates cannot be uploaded.")
+        Template = self.env['sa40.fingerprint.template'].sudo()
+        totals = defaultdict(int)
+        for device in self:
+            missing = Template._missing_on_device(device)
+            if not missing:
+                continue
+            with device._device_lock('push templates'), self._track_run(device, 'templates') as device:
+                pushed = Template.browse()
+                try:
+                    with device._device_session() as conn:
+                        with device._run_phase('get_users'):
+                            # the device's own User objects: HR_save_usertemplates rewrites them with the templates
+                            dev_users = {str(u.user_id): u for u in conn.get_users() or [] if getattr(u, 'user_id', None)}
+                        by_user = defaultdict(lambda: Template.browse())
+                        for tpl in missing:
+                            if tpl.device_user_id in dev_users:
+                                by_user[tpl.device_user_id] |= tpl
+                            else:
+                                totals['skipped'] += 1
+                        with device._run_phase('push'):
+                            for chunk in _chunked(by_user.items(), TEMPLATE_PUSH_BATCH):
+                                user_templates = [
+                                    (dev_users[user_id], [
+                                        Finger(dev_users[user_id].uid, tpl.fid, tpl.valid, base64.b64decode(tpl.template))
+                                        for tpl in tpls.with_context(bin_size=False)
+                                    ])
+                                    for user_id, tpls in chunk
+                                ]
+                                if hasattr(conn, 'HR_save_usertemplates'):
+                                    conn.HR_save_usertemplates(user_templates)
+                                else:
+                                    for user, fingers in user_templates:
+                                        conn.save_user_template(user, fingers)
+                                for _user_id, tpls in chunk:
+                                    pushed |= tpls
+                except Exception as exc:
+                    _logger.exception("Failed to push templates to device %s", device.name)
+                    raise UserError(f"Failed to push fingerprint templates to {device.name}: {exc}")
+                pushed.write({'device_ids': [(4, device.id)]})
+                device._run_count(templates_pushed=len(pushed))
+                totals['pushed'] += len(pushed)
+        return dict(totals)
+
+    def action_sync_templates(self):
+        """UI button: pull the templates of the selected devices, then replicate to every active device."""
+        pulled = self.pull_templates_from_device()
+        targets = self.search([('active', '=', True)]) | self
+        pushed = targets.replicate_templates_to_device()
+        msg = (f"Templates read: {pulled.get('fetched', 0)} (new {pulled.get('created', 0)}, "
+               f"changed {pulled.get('updated', 0)}). Uploaded: {pushed.get('pushed', 0)}"
+               + (f", {pushed['skipped']} skipped (user not on target device)." if pushed.get('skipped') else '.'))
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {'title': 'Fingerprint Templates', 'message': msg, 'type': 'success'}
+        }
+
+
     ####################################################################
     # Trigger rolecall attendance verification from logs
     ####################################################################
     def action_verify_attendance_from_logs(self, date=None):
+        """Journaled entrypoint (sa40.sync.run) for :meth:`_verify_attendance_from_logs`."""
+        self.ensure_one()
+        with self._track_run(self, 'verify') as device:
+            with device._run_phase('verify'):
+                return device._verify_attendance_from_logs(date=date)
+
+    def _write_sheet_deltas(self, deltas):
+        """
+        Write ``deltas`` ({sc.attendance.sheet: vals}), one write per changed sheet (the vals
+        differ from sheet to sheet), all in a single savepoint. When one write fails, each
+        sheet is retried on its own so one bad sheet does not block the others.
+        """
+        if not deltas:
+            return
+        try:
+            with self.env.cr.savepoint():
+                for sheet, vals in deltas.items():
+                    sheet.write(vals)
+        except Exception:
+            _logger.warning("Attendance write of %s sheets failed, retrying sheet by sheet", len(deltas))
+            for sheet, vals in deltas.items():
+                try:
+                    with self.env.cr.savepoint():
+                        sheet.write(vals)
+                except Exception as e:
+                    _logger.exception("Failed to write attendance changes for sheet %s: %s", sheet.id, e)
+        _logger.info("Verification of device %s wrote %s changed sheets", self.name, len(deltas))
+
+    def _verify_attendance_from_logs(self, date=None):
         """
         Visit all distinct dates found in the logs for this device and verify attendance
         for open sc.attendance.sheet on each date.
@@ -644,14 +2251,28 @@ class Sa40Device(models.Model):
         when a corresponding log exists (match by student.user_id only).
         - For late students append arrival time to sheet.note in format: 'Lastname Firstname (late): HH:MM'
         - Collect dates that had NO open attendance sheets and notify at the end.
+        - Record the final state of every batch student of each open sheet visited (absent
+          when never marked) as sa40.punctuality.entry, sheets without punches included.
+
+        With ``date``, only that day is verified; its logs are read from the archive as well
+        when the day lies past the retention horizon.
         """
         self.ensure_one()
         DeviceLog = self.env['sa40.attendance.log']
         OpStudent = self.env['op.student']
         ScSheet = self.env['sc.attendance.sheet']
 
-        # fetch all logs for this device (sudo)
-        logs_all = DeviceLog.sudo().search([('device_id', '=', self.id)])
+        normalizer = TimestampNormalizer(self.tz)
+        domain = [('device_id', '=', self.id)]
+        if date:
+            day = ofields.Date.to_date(date)
+            day_start = normalizer.to_utc(datetime.combine(day, time.min))
+            day_end = normalizer.to_utc(datetime.combine(day + timedelta(days=1), time.min))
+            domain += [('timestamp', '>=', day_start), ('timestamp', '<', day_end)]
+            logs_all = self.env['sa40.attendance.log.archive']._search_logs(domain, date_from=day_start)
+        else:
+            # fetch all logs of the active term for this device (sudo)
+            logs_all = DeviceLog.sudo().search(domain)
         if not logs_all:
             return {
                 'type': 'ir.actions.client',
@@ -659,24 +2280,13 @@ class Sa40Device(models.Model):
                 'params': {'title': 'Verification', 'message': 'No logs found for this device.', 'sticky': False},
             }
 
-        # Parse logs: build list of dicts with keys: 'log', 'ts_dt', 'user'
-        parsed_logs = []
-        for log in logs_all:
-            ts = log.timestamp
-            if not ts:
-                continue
-            try:
-                ts_dt = ofields.Datetime.to_datetime(ts) if isinstance(ts, str) else ts
-            except Exception:
-                try:
-                    ts_dt = datetime.fromisoformat(ts) if isinstance(ts, str) else ts
-                except Exception:
-                    _logger.warning("Unparseable timestamp %r for log %s; skipping", ts, log.id)
-                    continue
-
+        # Build list of dicts with keys: 'log', 'ts_dt', 'user'. Logs are stored in UTC while
+        # sheet dates and hours are local to the device: compare everything in device time.
+        parsed_logs = [
             # prefer attached res.users only (no partner fallback)
-            user = log.user_id or False
-            parsed_logs.append({'log': log, 'ts_dt': ts_dt, 'user': user})
+            {'log': log, 'ts_dt': normalizer.to_local(log.timestamp), 'user': log.user_id or False}
+            for log in logs_all if log.timestamp
+        ]
 
         if not parsed_logs:
             return {
@@ -706,6 +2316,10 @@ class Sa40Device(models.Model):
         total_students_updated = 0
         processed_dates = 0
         dates_without_open = []
+        # sheet -> write vals (M2M add/remove commands, note, teacher presence), written at the end
+        sheet_deltas = {}
+        # (sheet, student user, date, batch, batch name, status) for sa40.punctuality.entry
+        classifications = []
 
         # process each date (sorted)
         for log_date in sorted(dates_set):
@@ -739,7 +2353,6 @@ class Sa40Device(models.Model):
                 window_logs = [p for p in parsed_logs if (p['ts_dt'] >= window_start and p['ts_dt'] <= window_end)]
                 if not window_logs:
                     _logger.debug("No logs in window for sheet %s (%s - %s)", sheet.id, window_start, window_end)
-                    continue
 
                 # Build EARLIEST-log per res.users.id (take the earliest timestamp inside the window)
                 earliest_by_user = {}  # res.users.id -> datetime
@@ -750,34 +2363,31 @@ class Sa40Device(models.Model):
                     ts_dt = p['ts_dt']
                     if uid not in earliest_by_user or ts_dt < earliest_by_user[uid]:
                         earliest_by_user[uid] = ts_dt
-
-                if not earliest_by_user:
-                    # no logs with attached res.users in this window -> nothing to do for this sheet
-                    continue
+                # no logs with attached res.users in this window: the sheet is left as is, but its
+                # batch is still classified below (nobody punched, so nobody is made present)
 
                 # prepare ALL students of the batch and quick lookup by user_id
                 batch_students = sheet.batch_id.sudo().student_ids if sheet.batch_id else self.env['op.student']
                 student_by_user = {s.user_id.id: s for s in batch_students if s.user_id}
 
-                changed = False
-                present_ids = set(sheet.student_ids.ids)
-                late_ids = set(sheet.late_student_ids.ids)
-                excused_ids = set(sheet.excused_student_ids.ids)
+                before = {
+                    'student_ids': set(sheet.student_ids.ids),
+                    'late_student_ids': set(sheet.late_student_ids.ids),
+                    'excused_student_ids': set(sheet.excused_student_ids.ids),
+                }
+                present_ids = set(before['student_ids'])
+                late_ids = set(before['late_student_ids'])
+                excused_ids = set(before['excused_student_ids'])
                 note_lines_to_append = []
+                existing_note_lines = None
+                vals = {}
 
                 # teacher check (no tolerance) using earliest entry
                 if sheet.teacher_id and sheet.teacher_id.user_id:
                     teacher_uid = sheet.teacher_id.user_id.id
-                    if teacher_uid in earliest_by_user:
-                        if sheet.teacher_presence != 'present':
-                            try:
-                                with self.env.cr.savepoint():
-                                    sheet.write({'teacher_presence': 'present'})
-                                total_teacher_marked += 1
-                                changed = True
-                                _logger.info("Marked teacher present for sheet %s on %s (user %s)", sheet.id, log_date, teacher_uid)
-                            except Exception as e:
-                                _logger.exception("Failed to mark teacher present for sheet %s: %s", sheet.id, e)
+                    if teacher_uid in earliest_by_user and sheet.teacher_presence != 'present':
+                        vals['teacher_presence'] = 'present'
+                        total_teacher_marked += 1
 
                 # Iterate ALL students in the batch and try to find their earliest log in the window
                 for student in batch_students:
@@ -804,8 +2414,7 @@ class Sa40Device(models.Model):
                                 excused_ids.discard(student.id)
                                 total_students_present += 1
                                 total_students_updated += 1
-                                changed = True
-                                _logger.info("Student %s marked ON-TIME for sheet %s (log %s)", student.id, sheet.id, student_ts)
+                                _logger.debug("Student %s marked ON-TIME for sheet %s (log %s)", student.id, sheet.id, student_ts)
                         elif student_ts <= session_end:
                             if student.id not in late_ids:
                                 late_ids.add(student.id)
@@ -813,8 +2422,7 @@ class Sa40Device(models.Model):
                                 excused_ids.discard(student.id)
                                 total_students_late += 1
                                 total_students_updated += 1
-                                changed = True
-                                _logger.info("Student %s marked LATE for sheet %s (log %s)", student.id, sheet.id, student_ts)
+                                _logger.debug("Student %s marked LATE for sheet %s (log %s)", student.id, sheet.id, student_ts)
                                 # prepare note line: "Lastname Firstname (late): HH:MM"
                                 ln = getattr(student, 'last_name', None) or ''
                                 fn = getattr(student, 'first_name', None) or ''
@@ -824,35 +2432,41 @@ class Sa40Device(models.Model):
                                     display = f"{ln} {fn}".strip()
                                 arrival = student_ts.strftime('%H:%M')
                                 note_line = f"{display} (late): {arrival}"
-                                existing_note = sheet.note or ''
-                                if note_line not in existing_note:
+                                if existing_note_lines is None:
+                                    existing_note_lines = {line.strip() for line in (sheet.note or '').splitlines()}
+                                if note_line not in existing_note_lines:
+                                    existing_note_lines.add(note_line)
                                     note_lines_to_append.append(note_line)
                     except Exception as e:
                         _logger.exception("Error classifying student %s for sheet %s: %s", student.id, sheet.id, e)
                         continue
 
-                # apply changes if any
-                if changed:
-                    try:
-                        with self.env.cr.savepoint():
-                            before_present = sheet.student_ids.ids
-                            before_late = sheet.late_student_ids.ids
-                            new_vals = {
-                                'student_ids': [(6, 0, list(present_ids))],
-                                'late_student_ids': [(6, 0, list(late_ids))],
-                                'excused_student_ids': [(6, 0, list(excused_ids))],
-                            }
-                            if note_lines_to_append:
-                                cur_note = sheet.note or ''
-                                appended = ("\n".join(note_lines_to_append)).strip()
-                                new_note = (cur_note + ("\n" if cur_note and not cur_note.endswith("\n") else "") + appended).strip()
-                                new_vals['note'] = new_note
-                            sheet.write(new_vals)
-                            _logger.info("Wrote attendance for sheet %s on %s: present before=%s after=%s; late before=%s after=%s",
-                                        sheet.id, log_date, before_present, sheet.student_ids.ids, before_late, sheet.late_student_ids.ids)
-                    except Exception as e:
-                        _logger.exception("Failed to write attendance changes for sheet %s: %s", sheet.id, e)
-
+                # only the differences: (4, id) / (3, id) on the relation tables, no full replacement
+                for field, after in (('student_ids', present_ids), ('late_student_ids', late_ids),
+                                     ('excused_student_ids', excused_ids)):
+                    commands = ([(4, sid) for sid in sorted(after - before[field])]
+                                + [(3, sid) for sid in sorted(before[field] - after)])
+                    if commands:
+                        vals[field] = commands
+                if note_lines_to_append:
+                    cur_note = (sheet.note or '').rstrip('\n')
+                    vals['note'] = '\n'.join(([cur_note] if cur_note else []) + note_lines_to_append)
+                if vals:
+                    sheet_deltas[sheet] = vals
+
+                # final state of the whole batch, absent included, for the punctuality statistics:
+                # every open sheet of a visited date, with or without punches in its window
+                for student in batch_students:
+                    if not student.user_id:
+                        continue
+                    status = ('on_time' if student.id in present_ids else 'late' if student.id in late_ids
+                              else 'excused' if student.id in excused_ids else 'absent')
+                    classifications.append((sheet.id, student.user_id.id, sheet.date, sheet.batch_id.id,
+                                            sheet.batch_id.display_name, status))
+
+        self._write_sheet_deltas(sheet_deltas)
+        self.env['sa40.punctuality.entry'].sudo()._record_classifications(self, classifications)
+        self._run_count(students_updated=total_students_updated)
 
         # final notification
         if len(dates_set) == len(dates_without_open):
@@ -0,0 +1,87 @@
+# models/sa40_export_cache.py
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter keys for the cache budget
+PARAM_MAX_ENTRIES = 'biopro_sa40_sync.export_cache_max_entries'
+PARAM_MAX_MB = 'biopro_sa40_sync.export_cache_max_mb'
+DEFAULT_MAX_ENTRIES = 50
+DEFAULT_MAX_MB = 200
+
+
+class Sa40ExportCache(models.Model):
+    _name = 'sa40.export.cache'
+    _description = 'Cached SA40 export file'
+    _order = 'last_used_at desc, id desc'
+
+    fingerprint = fields.Char(required=True, index=True, readonly=True)
+    attachment_id = fields.Many2one('ir.attachment', required=True, ondelete='cascade', readonly=True)
+    file_size = fields.Integer(string='Size (bytes)', readonly=True)
+    model_choice = fields.Char(readonly=True)
+    export_format = fields.Char(readonly=True)
+    last_used_at = fields.Datetime(default=fields.Datetime.now, readonly=True)
+    hit_count = fields.Integer(default=0, readonly=True)
+
+    _sql_constraints = [
+        ('uniq_fingerprint', 'unique(fingerprint)', 'Export cache fingerprint must be unique'),
+    ]
+
+    ####################################################################
+    # Lookup / store
+    ####################################################################
+    @api.model
+    def _lookup(self, fingerprint):
+        """Return the cached attachment for ``fingerprint`` (and mark it used) or an empty recordset."""
+        entry = self.sudo().search([('fingerprint', '=', fingerprint)], limit=1)
+        if not entry:
+            return self.env['ir.attachment']
+        if not entry.attachment_id.exists():
+            entry.unlink()
+            return self.env['ir.attachment']
+        entry.write({'last_used_at': fields.Datetime.now(), 'hit_count': entry.hit_count + 1})
+        return entry.attachment_id
+
+    @api.model
+    def _store(self, fingerprint, attachment, model_choice=None, export_format=None):
+        self.sudo().create({
+            'fingerprint': fingerprint,
+            'attachment_id': attachment.id,
+            'file_size': attachment.file_size or 0,
+            'model_choice': model_choice,
+            'export_format': export_format,
+        })
+        self._evict()
+
+    ####################################################################
+    # LRU eviction
+    ####################################################################
+    @api.model
+    def _evict(self):
+        """Drop least-recently-used entries (and their attachments) until the budget fits."""
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_entries = int(ICP.get_param(PARAM_MAX_ENTRIES, DEFAULT_MAX_ENTRIES) or 0)
+        max_bytes = int(float(ICP.get_param(PARAM_MAX_MB, DEFAULT_MAX_MB) or 0) * 1024 * 1024)
+
+        entries = self.sudo().search([])  # most recently used first (_order)
+        kept_bytes = 0
+        to_evict = self.browse()
+        kept = 0
+        for entry in entries:
+            size = entry.file_size or 0
+            if (max_entries and kept >= max_entries) or (max_bytes and kept_bytes + size > max_bytes):
+                to_evict |= entry
+                continue
+            kept += 1
+            kept_bytes += size
+        if to_evict:
+            _logger.info("SA40 export cache: evicting %s entries", len(to_evict))
+            # unlinking the attachment cascades to the cache entry
+            to_evict.mapped('attachment_id').sudo().unlink()
+        return len(to_evict)
+
+    @api.autovacuum
+    def _gc_export_cache(self):
+        self._evict()
@@ -2,6 +2,7 @@
 import io
 import csv
 import base64
+import hashlib
 from datetime import datetime
 
 from odoo import models, fields, api, _
@@ -36,6 +37,9 @@ class Sa40ExportWizard(models.TransientModel):
                                 help='Limit export to a specific device (applies to both models).')
     date_from = fields.Datetime(string='From (timestamp)', help='Only for Attendance logs: start timestamp (inclusive)')
     date_to = fields.Datetime(string='To (timestamp)', help='Only for Attendance logs: end timestamp (inclusive)')
+    include_archive = fields.Boolean(string='Include archived logs',
+                                     help='Only for Attendance logs: also export logs moved to the archive. '
+                                          'Implied when "From" lies past the retention horizon.')
 
     # internal: store active_ids passed via context
     active_ids = fields.Char(string='Active IDs (internal)', readonly=True)
@@ -57,11 +61,8 @@ class Sa40ExportWizard(models.TransientModel):
         except Exception:
             return []
 
-    def action_export(self):
-        """Main entrypoint called by button: build bytes -> ir.attachment -> return act_url"""
-        self.ensure_one()
-
-        # build domain / recordset depending on model_choice
+    def _get_export_scope(self):
+        """Return (Model, domain, selected_ids) for the current wizard settings."""
         if self.export_selected:
             selected_ids = self._get_selected_ids_list()
         else:
@@ -76,17 +77,114 @@ class Sa40ExportWizard(models.TransientModel):
                 domain += [('timestamp', '>=', self.date_from)]
             if self.date_to:
                 domain += [('timestamp', '<=', self.date_to)]
-            if selected_ids:
-                records = Model.browse(selected_ids)
-            else:
-                records = Model.search(domain)
+        else:
+            Model = self.env['sa40.user'].sudo()
+            domain = []
+            if self.device_id:
+                domain += [('device_id', '=', self.device_id.id)]
+        if selected_ids:
+            domain = [('id', 'in', selected_ids)]
+        return Model, domain, selected_ids
+
+    def _get_archive_scope(self, domain, selected_ids):
+        """Return the archive model when the attendance export must also read archived logs, else None."""
+        if self.model_choice != 'attendance' or selected_ids:
+            return None
+        Archive = self.env['sa40.attendance.log.archive'].sudo()
+        if not self.include_archive and not self.date_from:
+            return None
+        if Archive._reaches_archive(self.date_from):
+            return Archive
+        return None
+
+    def _get_names_version(self, Model, domain, Archive=None):
+        """
+        Last write on the devices, users and partners referenced by the exported rows:
+        their names are exported, so renaming one of them invalidates the exports
+        showing it, and only those.
+        """
+        device_ids, user_ids = set(), set()
+        for Scope in ([Model] if Archive is None else [Model, Archive]):
+            for device, user in Scope._read_group(domain, groupby=['device_id', 'user_id']):
+                device_ids.add(device.id)
+                user_ids.add(user.id)
+        device_ids.discard(False)
+        user_ids.discard(False)
+        partner_ids = self.env['res.users'].sudo().with_context(active_test=False).browse(user_ids).partner_id.ids
+
+        def last_write(model, ids):
+            if not ids:
+                return ''
+            [(last,)] = self.env[model].sudo().with_context(active_test=False)._read_group(
+                [('id', 'in', list(ids))], aggregates=['write_date:max'])
+            return fields.Datetime.to_string(last) if last else ''
+
+        return (
+            last_write('sa40.device', device_ids),
+            last_write('res.users', user_ids),
+            last_write('res.partner', partner_ids),
+        )
+
+    def _get_export_fingerprint(self, Model, domain, selected_ids, Archive=None):
+        """
+        Fingerprint the export filters together with a data version of the scope
+        (row count, max id, max write_date), so any insert/update/delete invalidates it,
+        and with the version of the names the scope exports (see _get_names_version).
+        """
+        [(count, max_id, max_write)] = Model._read_group(domain, aggregates=['__count', 'id:max', 'write_date:max'])
+        archive_version = Archive._read_group(domain, aggregates=['__count', 'id:max']) if Archive is not None else []
+        names_version = self._get_names_version(Model, domain, Archive)
+        key = (
+            self.env.uid,
+            self.model_choice,
+            self.export_format,
+            self.device_id.id,
+            fields.Datetime.to_string(self.date_from) if self.date_from else '',
+            fields.Datetime.to_string(self.date_to) if self.date_to else '',
+            tuple(sorted(selected_ids)),
+            count,
+            max_id or 0,
+            fields.Datetime.to_string(max_write) if max_write else '',
+            tuple(map(tuple, archive_version)),
+            names_version,
+        )
+        return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+
+    def action_export(self):
+        """Main entrypoint called by button: build bytes -> ir.attachment -> return act_url"""
+        self.ensure_one()
+
+        if self.export_format == 'xlsx' and not OPENPYXL_AVAILABLE:
+            raise UserError(_("The Python library 'openpyxl' is required to export to XLSX. Install it on the server or switch to CSV."))
+
+        Model, domain, selected_ids = self._get_export_scope()
+
+        # serve the previous file if neither the filters nor the underlying data changed
+        ExportCache = self.env['sa40.export.cache']
+        Archive = self._get_archive_scope(domain, selected_ids)
+        fingerprint = self._get_export_fingerprint(Model, domain, selected_ids, Archive)
+        attachment = ExportCache._lookup(fingerprint)
+        if attachment:
+            return self._get_download_action(attachment)
+
+        if selected_ids:
+            records = Model.browse(selected_ids)
+        else:
+            records = Model.search(domain)
+        if Archive is not None:
+            # archived logs come first: they are the older ones
+            records = list(Archive.search(domain, order='timestamp, id')) + list(records)
+
+        if self.model_choice == 'attendance':
             filename_base = 'sa40_attendance_export'
             headers = [
                 'id', 'device_id', 'device_name', 'device_ip', 'log_user_uid',
-                'timestamp', 'status', 'partner_id', 'partner_name', 'raw'
+                'timestamp', 'status', 'punch', 'partner_id', 'partner_name', 'raw'
             ]
             rows = []
             for r in records:
+                # active and archived logs have separate id sequences
+                row_id = f"archive-{r.id}" if r._name == 'sa40.attendance.log.archive' else r.id
                 device_name = r.device_id.name if r.device_id else ''
                 device_ip = getattr(r.device_id, 'device_ip', '') if r.device_id else ''
                 ts = ''
@@ -94,37 +192,32 @@ class Sa40ExportWizard(models.TransientModel):
                     ts = fields.Datetime.to_string(r.timestamp) if r.timestamp else ''
                 except Exception:
                     ts = str(r.timestamp) if r.timestamp else ''
-                partner_id = r.partner_id.id if r.partner_id else ''
-                partner_name = r.partner_id.name if r.partner_id else ''
+                partner = r.user_id.partner_id if r.user_id else False
+                partner_id = partner.id if partner else ''
+                partner_name = partner.name if partner else ''
                 rows.append([
-                    r.id,
+                    row_id,
                     r.device_id.id if r.device_id else '',
                     device_name,
                     device_ip,
                     r.log_user_uid or '',
                     ts,
                     r.status or '',
+                    r.punch,
                     partner_id,
                     partner_name,
                     (r.raw or '').replace('\n', '\\n'),
                 ])
         else:
             # users
-            Model = self.env['sa40.user'].sudo()
-            domain = []
-            if self.device_id:
-                domain += [('device_id', '=', self.device_id.id)]
-            if selected_ids:
-                records = Model.browse(selected_ids)
-            else:
-                records = Model.search(domain)
             filename_base = 'sa40_users_export'
             headers = ['id', 'name', 'device_id', 'device_name', 'device_uid', 'device_user_id', 'partner_id', 'partner_name']
             rows = []
             for u in records:
                 device_name = u.device_id.name if u.device_id else ''
-                partner_id = u.partner_id.id if u.partner_id else ''
-                partner_name = u.partner_id.name if u.partner_id else ''
+                partner = u.user_id.partner_id if u.user_id else False
+                partner_id = partner.id if partner else ''
+                partner_name = partner.name if partner else ''
                 rows.append([
                     u.id,
                     u.name or '',
@@ -137,16 +230,15 @@ class Sa40ExportWizard(models.TransientModel):
                 ])
 
         # Dispatch to CSV or XLSX generator
+        stamp = fields.Datetime.to_string(fields.Datetime.context_timestamp(self, fields.Datetime.now())).replace(' ', '_').replace(':', '-')
         if self.export_format == 'csv':
             data_bytes = self._build_csv_bytes(headers, rows)
-            fname = f"{filename_base}_{fields.Datetime.to_string(fields.Datetime.context_timestamp(self, fields.Datetime.now())).replace(' ', '_').replace(':','-')}.csv"
+            fname = f"{filename_base}_{stamp}.csv"
             mimetype = 'text/csv'
         else:
             # xlsx
-            if not OPENPYXL_AVAILABLE:
-                raise UserError(_("The Python library 'openpyxl' is required to export to XLSX. Install it on the server or switch to CSV."))
             data_bytes = self._build_xlsx_bytes(headers, rows)
-            fname = f"{filename_base}_{fields.Datetime.to_string(fields.Datetime.context_timestamp(self, fields.Datetime.now())).replace(' ', '_').replace(':','-')}.xlsx"
+            fname = f"{filename_base}_{stamp}.xlsx"
             mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
 
         # create attachment
@@ -154,11 +246,13 @@ class Sa40ExportWizard(models.TransientModel):
             'name': fname,
             'type': 'binary',
             'datas': base64.b64encode(data_bytes).decode('utf-8'),
-            'datas_fname': fname,
             'mimetype': mimetype,
             # no res_model/res_id -> generic attachment
         })
+        ExportCache._store(fingerprint, attachment, model_choice=self.model_choice, export_format=self.export_format)
+        return self._get_download_action(attachment)
 
+    def _get_download_action(self, attachment):
         url = '/web/content/%s?download=true' % attachment.id
         return {
             'type': 'ir.actions.act_url',
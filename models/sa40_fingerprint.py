@@ -0,0 +1,104 @@
+# models/sa40_fingerprint.py
+import base64
+import hashlib
+import logging
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+
+class Sa40FingerprintTemplate(models.Model):
+    _name = 'sa40.fingerprint.template'
+    _description = 'SA40 fingerprint template'
+    _order = 'device_user_id, fid'
+
+    # a person is the same device user_id (badge number) on every terminal
+    device_user_id = fields.Char(string='Device user_id', required=True, index=True, readonly=True)
+    fid = fields.Integer(string='Finger', required=True, readonly=True)
+    valid = fields.Integer(default=1, readonly=True)
+    # biometric data: only administrators read it, replication runs as superuser
+    template = fields.Binary(attachment=False, required=True, readonly=True, groups='base.group_system')
+    template_hash = fields.Char(required=True, index=True, readonly=True)
+    size = fields.Integer(string='Size (bytes)', readonly=True)
+    sa40_user_id = fields.Many2one('sa40.user', string='Enrolled as', ondelete='set null', readonly=True)
+    source_device_id = fields.Many2one('sa40.device', string='Enrolled on', ondelete='set null', readonly=True)
+    device_ids = fields.Many2many('sa40.device', 'sa40_fingerprint_template_device_rel', 'template_id', 'device_id',
+                                  string='Present on', readonly=True,
+                                  help='Devices known to hold this exact template (same content hash).')
+
+    _sql_constraints = [
+        ('uniq_template_by_user_finger', 'unique(device_user_id, fid)', 'One template per finger and device user'),
+    ]
+
+    @api.model
+    def _hash(self, template):
+        return hashlib.sha256(template).hexdigest()
+
+    @api.model
+    def _ingest_device_templates(self, device, fingers, user_ids_by_uid):
+        """
+        Store the pyzk ``fingers`` read from ``device`` (``user_ids_by_uid``: device uid ->
+        device user_id). A template whose content hash changed replaces the stored one (the
+        last enrolment wins) and is then only known on ``device``. Afterwards ``device`` is
+        recorded as holding exactly the templates it returned. Returns the counters.
+        """
+        counters = {'fetched': len(fingers), 'created': 0, 'updated': 0, 'unchanged': 0, 'orphans': 0}
+        users_by_key = device._get_user_resolution_map(device)
+
+        incoming = {}
+        for finger in fingers:
+            user_id = user_ids_by_uid.get(int(getattr(finger, 'uid', 0) or 0))
+            template = bytes(getattr(finger, 'template', b'') or b'')
+            if not user_id or not template:
+                counters['orphans'] += 1
+                continue
+            incoming[(user_id, int(finger.fid))] = (template, int(getattr(finger, 'valid', 1)))
+
+        Template = self.sudo()
+        existing = {
+            (tpl.device_user_id, tpl.fid): tpl
+            for tpl in Template.search([('device_user_id', 'in', list({key[0] for key in incoming}))])
+        }
+        vals_list = []
+        present = Template.browse()
+        for (user_id, fid), (template, valid) in incoming.items():
+            digest = self._hash(template)
+            tpl = existing.get((user_id, fid))
+            if tpl and tpl.template_hash == digest:
+                counters['unchanged'] += 1
+                present |= tpl
+                continue
+            vals = {
+                'template': base64.b64encode(template),
+                'template_hash': digest,
+                'valid': valid,
+                'size': len(template),
+                'sa40_user_id': users_by_key[user_id].id if user_id in users_by_key else False,
+                'source_device_id': device.id,
+                'device_ids': [(6, 0, [device.id])],
+            }
+            if tpl:
+                tpl.write(vals)
+                counters['updated'] += 1
+                present |= tpl
+            else:
+                vals.update({'device_user_id': user_id, 'fid': fid})
+                vals_list.append(vals)
+        present |= Template.create(vals_list)
+        counters['created'] = len(vals_list)
+
+        present.filtered(lambda t: device not in t.device_ids).write({'device_ids': [(4, device.id)]})
+        # templates the device no longer returned were deleted or re-enrolled there
+        Template.search([('device_ids', 'in', device.id), ('id', 'not in', present.ids)]).write({'device_ids': [(3, device.id)]})
+        return counters
+
+    @api.model
+    def _missing_on_device(self, device):
+        """Stored templates of the users of ``device`` that ``device`` is not known to hold."""
+        user_ids = self.env['sa40.user'].sudo().search([
+            ('device_id', '=', device.id), ('device_user_id', '!=', False),
+        ]).mapped('device_user_id')
+        if not user_ids:
+            return self.browse()
+        return self.sudo().search([('device_user_id', 'in', user_ids), ('device_ids', 'not in', device.id)])
@@ -0,0 +1,128 @@
+# models/sa40_punctuality.py
+import logging
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+STATUSES = [('on_time', 'On time'), ('late', 'Late'), ('absent', 'Absent'), ('excused', 'Excused')]
+
+
+class Sa40PunctualityEntry(models.Model):
+    _name = 'sa40.punctuality.entry'
+    _description = 'SA40 punctuality classification'
+    _order = 'date desc, id desc'
+
+    # sc.attendance.sheet / op.batch belong to an optional module: kept as plain references
+    sheet_ref = fields.Integer(string='Sheet ID', required=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='Student', required=True, ondelete='cascade', index=True, readonly=True)
+    date = fields.Date(required=True, readonly=True)
+    week = fields.Date(required=True, index=True, readonly=True, help='Monday of the session week.')
+    batch_ref = fields.Integer(string='Batch ID', required=True, readonly=True)
+    batch_name = fields.Char(string='Batch', readonly=True)
+    status = fields.Selection(STATUSES, required=True, readonly=True)
+    device_id = fields.Many2one('sa40.device', ondelete='set null', readonly=True)
+
+    _sql_constraints = [
+        ('uniq_entry_by_sheet_user', 'unique(sheet_ref, user_id)', 'One classification per session and student'),
+    ]
+
+    @api.model
+    def _record_classifications(self, device, rows):
+        """
+        Upsert the classifications ``rows`` [(sheet id, res.users id, date, batch id, batch
+        name, status)] produced by the verification of ``device``, then rebuild the weekly
+        statistics of the (week, batch) pairs that actually changed. Returns the rows changed.
+        """
+        if not rows:
+            return 0
+        sheet_refs, user_ids, dates, batch_refs, batch_names, statuses = (list(col) for col in zip(*rows))
+        weeks = [day - timedelta(days=day.weekday()) for day in dates]
+        self.env.cr.execute("""
+            INSERT INTO sa40_punctuality_entry (sheet_ref, user_id, date, week, batch_ref, batch_name, status, device_id,
+                                                create_uid, create_date, write_uid, write_date)
+            SELECT r.sheet_ref, r.user_id, r.date, r.week, r.batch_ref, r.batch_name, r.status, %(device)s,
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM unnest(%(sheets)s::int[], %(users)s::int[], %(dates)s::date[], %(weeks)s::date[],
+                          %(batches)s::int[], %(names)s::varchar[], %(statuses)s::varchar[])
+                   AS r(sheet_ref, user_id, date, week, batch_ref, batch_name, status)
+            ON CONFLICT (sheet_ref, user_id) DO UPDATE
+               SET status = EXCLUDED.status, device_id = EXCLUDED.device_id,
+                   write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date
+             WHERE sa40_punctuality_entry.status IS DISTINCT FROM EXCLUDED.status
+            RETURNING week, batch_ref
+        """, {
+            'device': device.id, 'uid': self.env.uid, 'sheets': sheet_refs, 'users': user_ids, 'dates': dates,
+            'weeks': weeks, 'batches': batch_refs, 'names': batch_names, 'statuses': statuses,
+        })
+        changed_rows = self.env.cr.rowcount
+        changed = set(self.env.cr.fetchall())
+        self.invalidate_model()
+        if changed:
+            self.env['sa40.punctuality.stat']._refresh(changed)
+        return changed_rows
+
+
+class Sa40PunctualityStat(models.Model):
+    _name = 'sa40.punctuality.stat'
+    _description = 'SA40 weekly punctuality statistics'
+    _order = 'week desc, batch_name, user_id'
+
+    week = fields.Date(required=True, index=True, readonly=True)
+    batch_ref = fields.Integer(string='Batch ID', required=True, index=True, readonly=True)
+    batch_name = fields.Char(string='Batch', readonly=True)
+    user_id = fields.Many2one('res.users', string='Student', required=True, ondelete='cascade', index=True, readonly=True)
+    sessions = fields.Integer(readonly=True)
+    on_time = fields.Integer(string='On time', readonly=True)
+    late = fields.Integer(readonly=True)
+    absent = fields.Integer(readonly=True)
+    excused = fields.Integer(readonly=True)
+    on_time_rate = fields.Float(string='On time (%)', readonly=True, aggregator='avg', digits=(16, 1))
+    late_rate = fields.Float(string='Late (%)', readonly=True, aggregator='avg', digits=(16, 1))
+    absent_rate = fields.Float(string='Absent (%)', readonly=True, aggregator='avg', digits=(16, 1))
+
+    _sql_constraints = [
+        ('uniq_stat_by_week_batch_user', 'unique(week, batch_ref, user_id)', 'One statistic per week, batch and student'),
+    ]
+
+    @api.model
+    def _refresh(self, keys=None):
+        """Recompute the rows of the (week, batch id) pairs ``keys`` from the classifications (all rows when None)."""
+        if keys is None:
+            scope, params = 'TRUE', {}
+            self.env.cr.execute("DELETE FROM sa40_punctuality_stat")
+        else:
+            weeks, batches = (list(col) for col in zip(*keys))
+            scope = "(e.week, e.batch_ref) IN (SELECT * FROM unnest(%(weeks)s::date[], %(batches)s::int[]))"
+            params = {'weeks': weeks, 'batches': batches}
+            self.env.cr.execute("""
+                DELETE FROM sa40_punctuality_stat s
+                 USING unnest(%(weeks)s::date[], %(batches)s::int[]) AS k(week, batch_ref)
+                 WHERE s.week = k.week AND s.batch_ref = k.batch_ref
+            """, params)
+        self.env.cr.execute(f"""
+            INSERT INTO sa40_punctuality_stat (week, batch_ref, batch_name, user_id, sessions, on_time, late, absent, excused,
+                                               on_time_rate, late_rate, absent_rate,
+                                               create_uid, create_date, write_uid, write_date)
+            SELECT e.week, e.batch_ref, max(e.batch_name), e.user_id, count(*),
+                   count(*) FILTER (WHERE e.status = 'on_time'),
+                   count(*) FILTER (WHERE e.status = 'late'),
+                   count(*) FILTER (WHERE e.status = 'absent'),
+                   count(*) FILTER (WHERE e.status = 'excused'),
+                   100.0 * count(*) FILTER (WHERE e.status = 'on_time') / count(*),
+                   100.0 * count(*) FILTER (WHERE e.status = 'late') / count(*),
+                   100.0 * count(*) FILTER (WHERE e.status = 'absent') / count(*),
+                   %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM sa40_punctuality_entry e
+             WHERE {scope}
+             GROUP BY e.week, e.batch_ref, e.user_id
+        """, dict(params, uid=self.env.uid))
+        _logger.info("SA40 punctuality: %s weekly rows rebuilt", self.env.cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def action_rebuild(self):
+        """Rebuild every weekly row from the stored classifications."""
+        self.sudo()._refresh()
+        return {'type': 'ir.actions.client', 'tag': 'reload'}
@@ -0,0 +1,138 @@
+# models/sa40_sync_run.py
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# ir.config_parameter key: how long run journal rows are kept
+PARAM_RETENTION_DAYS = 'biopro_sa40_sync.sync_run_retention_days'
+DEFAULT_RETENTION_DAYS = 30
+
+# phase name -> sa40.sync.run field
+PHASE_FIELDS = {
+    'construct': 'time_construct',
+    'connect': 'time_connect',
+    'disable': 'time_disable',
+    'get_users': 'time_get_users',
+    'get_attendance': 'time_get_attendance',
+    'persist': 'time_persist',
+    'push': 'time_push',
+    'verify': 'time_verify',
+    'get_templates': 'time_get_templates',
+}
+
+COUNT_FIELDS = (
+    'users_fetched', 'attendance_fetched', 'attendance_created', 'attendance_duplicates',
+    'attendance_invalid', 'attendance_errors', 'users_pushed', 'users_skipped', 'students_updated',
+    'templates_pulled', 'templates_pushed',
+)
+
+
+class SyncRunRecorder:
+    """In-memory collector for one run; flushed to sa40.sync.run once at the end."""
+
+    def __init__(self):
+        self.timings = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.error = None
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.perf_counter() - start
+
+    def add_time(self, name, seconds):
+        self.timings[name] += seconds
+
+    def add_counts(self, **counts):
+        for key, value in counts.items():
+            self.counts[key] += int(value or 0)
+
+
+class Sa40SyncRun(models.Model):
+    _name = 'sa40.sync.run'
+    _description = 'SA40 sync run journal'
+    _order = 'started_at desc, id desc'
+
+    device_id = fields.Many2one('sa40.device', required=True, ondelete='cascade', index=True, readonly=True)
+    operation = fields.Selection([
+        ('sync', 'Sync'),
+        ('push', 'Push users'),
+        ('verify', 'Verify attendance'),
+        ('templates', 'Fingerprint templates'),
+        ('import', 'USB import'),
+        ('reconcile', 'Reconcile users'),
+    ], required=True, readonly=True)
+    state = fields.Selection([('done', 'Done'), ('failed', 'Failed')], default='done', readonly=True)
+    started_at = fields.Datetime(readonly=True, index=True)
+    duration = fields.Float(string='Total (s)', readonly=True, aggregator='avg')
+    error = fields.Text(readonly=True)
+
+    time_construct = fields.Float(string='ZK construction (s)', readonly=True, aggregator='avg')
+    time_connect = fields.Float(string='Connect (s)', readonly=True, aggregator='avg')
+    time_disable = fields.Float(string='Disabled window (s)', readonly=True, aggregator='avg')
+    time_get_users = fields.Float(string='get_users (s)', readonly=True, aggregator='avg')
+    time_get_attendance = fields.Float(string='get_attendance (s)', readonly=True, aggregator='avg')
+    time_persist = fields.Float(string='DB persist (s)', readonly=True, aggregator='avg')
+    time_push = fields.Float(string='User push (s)', readonly=True, aggregator='avg')
+    time_verify = fields.Float(string='Verification (s)', readonly=True, aggregator='avg')
+    time_get_templates = fields.Float(string='get_templates (s)', readonly=True, aggregator='avg')
+
+    users_fetched = fields.Integer(readonly=True)
+    attendance_fetched = fields.Integer(readonly=True)
+    attendance_created = fields.Integer(readonly=True)
+    attendance_duplicates = fields.Integer(readonly=True)
+    attendance_invalid = fields.Integer(readonly=True)
+    attendance_errors = fields.Integer(readonly=True)
+    users_pushed = fields.Integer(readonly=True)
+    users_skipped = fields.Integer(readonly=True)
+    students_updated = fields.Integer(readonly=True)
+    templates_pulled = fields.Integer(readonly=True)
+    templates_pushed = fields.Integer(readonly=True)
+
+    @api.model
+    def _prepare_run_vals(self, device, operation, recorder, started_at, duration):
+        vals = {
+            'device_id': device.id,
+            'operation': operation,
+            'state': 'failed' if recorder.error else 'done',
+            'started_at': started_at,
+            'duration': duration,
+            'error': recorder.error or False,
+        }
+        for phase, seconds in recorder.timings.items():
+            if phase in PHASE_FIELDS:
+                vals[PHASE_FIELDS[phase]] = seconds
+        for key in COUNT_FIELDS:
+            if key in recorder.counts:
+                vals[key] = recorder.counts[key]
+        return vals
+
+    @api.model
+    def _record(self, device, operation, recorder, started_at, duration):
+        vals = self._prepare_run_vals(device, operation, recorder, started_at, duration)
+        if not recorder.error:
+            return self.sudo().create(vals)
+        # the caller's transaction is about to be rolled back: journal the failure on its own cursor
+        try:
+            with self.env.registry.cursor() as cr:
+                self.with_env(self.env(cr=cr)).sudo().create(vals)
+        except Exception:
+            _logger.exception("Could not journal failed %s run for device %s", operation, device.id)
+        return self.browse()
+
+    @api.autovacuum
+    def _gc_sync_runs(self):
+        days = int(self.env['ir.config_parameter'].sudo().get_param(PARAM_RETENTION_DAYS, DEFAULT_RETENTION_DAYS) or 0)
+        if days <= 0:
+            return
+        limit_date = fields.Datetime.now() - timedelta(days=days)
+        self.sudo().search([('started_at', '<', limit_date)]).unlink()
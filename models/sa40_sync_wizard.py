@@ -1,5 +1,6 @@
 from odoo import models, fields, api
 import logging
+import pytz
 
 _logger = logging.getLogger(__name__)
 
@@ -7,11 +8,15 @@ _logger = logging.getLogger(__name__)
 class Sa40SyncLine(models.TransientModel):
     _name = 'sa40.sync.line'
     _description = 'Incoming SA40 log (transient)'
+    _order = 'device_id, timestamp, id'
 
-    wizard_id = fields.Many2one('sa40.sync.wizard', ondelete='cascade')
+    wizard_id = fields.Many2one('sa40.sync.wizard', ondelete='cascade', index=True)
+    device_id = fields.Many2one('sa40.device', string='Device')
+    selected = fields.Boolean(default=True)
     log_user_uid = fields.Char(string='Device User ID')
     timestamp = fields.Datetime()
     status = fields.Char()
+    punch = fields.Integer(string='Punch Type')
     raw = fields.Text()
     user_name = fields.Char(string='Linked User')  # was partner_name → renamed for consistency
 
@@ -20,33 +25,40 @@ class Sa40SyncWizard(models.TransientModel):
     _name = 'sa40.sync.wizard'
     _description = 'SA40 sync preview wizard'
 
-    device_id = fields.Many2one('sa40.device', required=True)
+    device_ids = fields.Many2many('sa40.device', string='Devices', readonly=True)
     line_ids = fields.One2many('sa40.sync.line', 'wizard_id', string='Incoming logs')
+    line_count = fields.Integer(compute='_compute_line_count')
+
+    @api.depends('line_ids')
+    def _compute_line_count(self):
+        for wizard in self:
+            wizard.line_count = len(wizard.line_ids)
 
     def persist_selected(self):
-        """Persist the incoming transient lines into sa40.attendance.log."""
-        count = 0
-        for line in self.line_ids:
-            # try to link to user if user_name exists
-            user = False
-            if line.user_name:
-                user = self.env['res.users'].search([('name', '=', line.user_name)], limit=1)
-
-            vals = {
-                'device_id': self.device_id.id,
-                'log_user_uid': line.log_user_uid,
-                'timestamp': line.timestamp,
+        """Persist the selected transient lines into sa40.attendance.log (bulk path, per device)."""
+        self.ensure_one()
+        lines = self.line_ids.filtered('selected')
+
+        records_by_device = {}
+        for line in lines:
+            records_by_device.setdefault(line.device_id, []).append({
+                'user_id': line.log_user_uid,
+                # lines hold UTC: anchor them so they are not converted from the device timezone again
+                'timestamp': pytz.utc.localize(line.timestamp) if line.timestamp else False,
                 'status': line.status,
+                'punch': line.punch,
                 'raw': line.raw,
-                'user_id': user.id if user else False,  # updated from partner_id → user_id
-            }
+            })
 
-            try:
-                self.env['sa40.attendance.log'].create(vals)
-                count += 1
-            except Exception as e:
-                _logger.warning("Skipping duplicate or invalid log (UID: %s): %s", line.log_user_uid, e)
+        count = skipped = invalid = errors = 0
+        for device, records in records_by_device.items():
+            if not device:
                 continue
+            res = device.persist_attendances(device, records)
+            count += res.get('created', 0)
+            skipped += res.get('skipped_duplicates', 0)
+            invalid += res.get('invalid', 0)
+            errors += res.get('errors', 0)
 
         # Notify user on completion
         return {
@@ -54,7 +66,7 @@ class Sa40SyncWizard(models.TransientModel):
             'tag': 'display_notification',
             'params': {
                 'title': 'Import Complete',
-                'message': f'Successfully imported {count} records.',
+                'message': f'Successfully imported {count} records (duplicates {skipped}, invalid {invalid}, errors {errors}).',
                 'sticky': False,
                 'type': 'success',
             }
@@ -0,0 +1,94 @@
+# models/sa40_usb_import_wizard.py
+import io
+import logging
+from contextlib import contextmanager
+
+from odoo import models, fields
+from odoo.exceptions import UserError
+
+from .sa40_device import AttendanceRecord
+
+_logger = logging.getLogger(__name__)
+
+
+def _iter_attlog_records(stream, keep_raw=False):
+    """
+    Yield an AttendanceRecord per line of an SA40 USB attendance dump (``attlog.dat``):
+    ``<user_id>\\t<YYYY-MM-DD HH:MM:SS>\\t<verify mode>\\t<punch>\\t<work code>\\t<reserved>``.
+    Some firmwares separate the columns with spaces instead of tabs. A line that cannot be
+    split yields a record without timestamp, counted as invalid by persist_attendances.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.split('\t')]
+        if len(parts) < 2:
+            parts = line.split()
+            if len(parts) >= 3:
+                # date and time were split apart
+                parts = [parts[0], f"{parts[1]} {parts[2]}"] + parts[3:]
+        if len(parts) < 2:
+            yield AttendanceRecord(parts[0] if parts else None, None, None, None, line)
+            continue
+        yield AttendanceRecord(
+            parts[0] or None,
+            parts[1],
+            parts[2] if len(parts) > 2 else None,
+            parts[3] if len(parts) > 3 else None,
+            line if keep_raw else None,
+        )
+
+
+class Sa40UsbImportWizard(models.TransientModel):
+    _name = 'sa40.usb.import.wizard'
+    _description = 'Import an SA40 USB attendance dump'
+
+    device_id = fields.Many2one('sa40.device', string='Device', required=True,
+                                help='Terminal the dump was downloaded from (timezone, user links, deduplication).')
+    # stored as an attachment: the import reads the file from the filestore, never the whole dump
+    data_file = fields.Binary(string='attlog.dat', required=True)
+    filename = fields.Char()
+
+    @contextmanager
+    def _open_data_file(self):
+        """Yield a binary file object on the uploaded dump."""
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', self._name), ('res_field', '=', 'data_file'), ('res_id', '=', self.id),
+        ], limit=1)
+        if not attachment:
+            raise UserError("Please upload the attlog.dat file downloaded from the device.")
+        if attachment.store_fname:
+            with open(attachment._full_path(attachment.store_fname), 'rb') as data:
+                yield data
+        else:
+            # database storage (ir_attachment.location = db): the bytes are in memory anyway
+            yield io.BytesIO(attachment.raw)
+
+    def action_import(self):
+        """Stream the dump through the bulk dedupe/insert path of persist_attendances."""
+        self.ensure_one()
+        device = self.device_id
+        with self._open_data_file() as data, self.env['sa40.device']._track_run(device, 'import') as device:
+            # decoded line by line; utf-8-sig drops the BOM some exports start with (first user_id)
+            stream = io.TextIOWrapper(data, encoding='utf-8-sig', errors='replace')
+            with device._run_phase('persist'):
+                res = device.persist_attendances(device, _iter_attlog_records(stream, keep_raw=device.raw_storage == 'full'))
+            device._run_count(attendance_fetched=res['fetched'],
+                              attendance_created=res['created'],
+                              attendance_duplicates=res['skipped_duplicates'],
+                              attendance_invalid=res['invalid'],
+                              attendance_errors=res.get('errors', 0))
+        _logger.info("USB import %s for device %s: %s", self.filename or 'attlog.dat', device.name, res)
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'USB Import Complete',
+                'message': (f"{res['fetched']} lines read: {res['created']} logs created, "
+                            f"{res['skipped_duplicates']} duplicates, {res['invalid']} invalid, {res.get('errors', 0)} errors."),
+                'sticky': True,
+                'type': 'success' if not (res['invalid'] or res.get('errors')) else 'warning',
+            }
+        }
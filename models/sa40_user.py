@@ -1,5 +1,29 @@
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+
+from odoo import models, fields
+
+from .sa40_device import DEVICE_NAME_LENGTH
+
+_logger = logging.getLogger(__name__)
+
+
+def _normalize_badge(value):
+    """Badge number as compared across the device and res.partner (leading zeros ignored)."""
+    value = str(value or '').strip()
+    if value.isdigit():
+        value = value.lstrip('0') or '0'
+    return value
+
+
+def _normalize_name(name):
+    """Casefolded name without accents nor punctuation, single spaced (device keypads drop accents)."""
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c)).casefold()
+    return ' '.join(re.sub(r'[\W_]+', ' ', name).split())
 
-from odoo import models, fields, api
 
 class Sa40User(models.Model):
     _name = 'sa40.user'
@@ -10,12 +34,157 @@ class Sa40User(models.Model):
     device_uid = fields.Integer(string='Device UID', help='Internal UID from device')
     device_user_id = fields.Char(string='Device user_id')
     user_id = fields.Many2one('res.users', string='Related User', help='Link to a user (student/teacher)')
+    active = fields.Boolean(default=True,
+                            help='Archive a user to remove it from the device at the next reconciliation.')
+    device_synced_at = fields.Datetime('Last matched device', readonly=True, copy=False,
+                                       help='Last time this user was read from or written to the device. A synced user '
+                                            'missing from the device was deleted there.')
+    auto_link_note = fields.Char('Auto-link', readonly=True, copy=False,
+                                 help='Set when several users match this device user: link it by hand.')
 
     _sql_constraints = [
         ('uniq_device_uid_per_device', 'unique(device_id, device_uid)', 'Device UID must be unique per device'),
     ]
-    
-    
+
+    def _get_device_profile(self):
+        """(name, card) written on the device: the linked user's partner wins over the stored name."""
+        self.ensure_one()
+        partner = self.user_id.partner_id
+        badge = (partner.biometric_id or '').strip()
+        return partner.name or self.name or 'Unknown', int(badge) if badge.isdigit() else 0
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'user_id' in vals:
+            self._relink_logs()
+        return res
+
+    ####################################################################
+    # Linking to res.users
+    ####################################################################
+    def _auto_link(self):
+        """
+        Link the unlinked users of ``self`` to res.users in one pass: the device user_id
+        is looked up in res.partner.biometric_id, then the normalised name in partner
+        names (token order ignored; a name cut by the device matches on its prefix).
+        Several candidates make the match ambiguous: nothing is linked and the candidates
+        are noted in ``auto_link_note``. The logs of the linked users are relinked.
+        Returns the counters.
+        """
+        todo = self.filtered(lambda u: not u.user_id)
+        counters = {'linked_by_id': 0, 'linked_by_name': 0, 'ambiguous': 0, 'unmatched': 0}
+        if not todo:
+            return counters
+
+        self.env['res.users'].flush_model(['partner_id', 'active'])
+        self.env['res.partner'].flush_model(['name', 'biometric_id'])
+        self.env.cr.execute("""
+            SELECT u.id, p.name, p.biometric_id
+              FROM res_users u
+              JOIN res_partner p ON p.id = u.partner_id
+             WHERE u.active
+        """)
+        by_badge, by_tokens, by_prefix = defaultdict(set), defaultdict(set), defaultdict(set)
+        names = {}
+        for user_id, name, badge in self.env.cr.fetchall():
+            names[user_id] = name
+            if badge and badge.strip():
+                by_badge[_normalize_badge(badge)].add(user_id)
+            norm = _normalize_name(name)
+            if norm:
+                by_tokens[' '.join(sorted(norm.split()))].add(user_id)
+                if len(name) > DEVICE_NAME_LENGTH:
+                    by_prefix[_normalize_name(name[:DEVICE_NAME_LENGTH])].add(user_id)
+
+        links, notes = {}, {}
+        for user in todo:
+            candidates = by_badge.get(_normalize_badge(user.device_user_id)) if user.device_user_id else None
+            key = 'linked_by_id'
+            if not candidates:
+                key = 'linked_by_name'
+                norm = _normalize_name(user.name)
+                candidates = by_tokens.get(' '.join(sorted(norm.split()))) if norm else None
+                if not candidates and len((user.name or '').strip()) >= DEVICE_NAME_LENGTH:
+                    candidates = by_prefix.get(norm)
+            if not candidates:
+                counters['unmatched'] += 1
+            elif len(candidates) == 1:
+                links[user.id] = next(iter(candidates))
+                counters[key] += 1
+            else:
+                notes[user.id] = 'Ambiguous: ' + ', '.join(f"{names[c]} (#{c})" for c in sorted(candidates))
+                counters['ambiguous'] += 1
+                _logger.info("SA40 auto-link: %s (%s) on %s matches %s users, left unlinked",
+                             user.name, user.device_user_id, user.device_id.name, len(candidates))
+
+        # bulk SQL instead of one write() per user: the write stamps are set here and the logs
+        # are relinked below, as the write() override would do
+        self.flush_model()
+        if links:
+            self.env.cr.execute("""
+                UPDATE sa40_user s
+                   SET user_id = m.user_id, auto_link_note = NULL, write_uid = %s, write_date = %s
+                  FROM unnest(%s::int[], %s::int[]) AS m(id, user_id)
+                 WHERE s.id = m.id
+            """, (self.env.uid, self.env.cr.now(), list(links), list(links.values())))
+        if notes:
+            self.env.cr.execute("""
+                UPDATE sa40_user s
+                   SET auto_link_note = m.note, write_uid = %s, write_date = %s
+                  FROM unnest(%s::int[], %s::varchar[]) AS m(id, note)
+                 WHERE s.id = m.id
+            """, (self.env.uid, self.env.cr.now(), list(notes), list(notes.values())))
+        self.invalidate_model(['user_id', 'auto_link_note', 'write_uid', 'write_date'])
+        counters['logs_relinked'] = self.browse(list(links))._relink_logs()
+        return counters
+
+    def _relink_logs(self):
+        """
+        Copy the res.users link of ``self`` onto their logs, active and archived, in SQL.
+        Logs are matched like persist_attendances resolves them: on the device user_id, or
+        on the device uid when no active user of the device has that user_id.
+        Returns the rows changed.
+        """
+        if not self:
+            return 0
+        self.flush_recordset(['user_id', 'device_id', 'device_user_id', 'device_uid'])
+        self.flush_model(['active'])
+        changed = 0
+        for table in ('sa40_attendance_log', 'sa40_attendance_log_archive'):
+            self.env.cr.execute(f"""
+                UPDATE {table} l
+                   SET user_id = s.user_id
+                  FROM sa40_user s
+                 WHERE s.id = ANY(%s) AND l.device_id = s.device_id
+                   AND (l.log_user_uid = s.device_user_id
+                        OR (s.device_uid <> 0 AND l.log_user_uid = s.device_uid::varchar
+                            AND NOT EXISTS (SELECT 1 FROM sa40_user o
+                                             WHERE o.device_id = l.device_id AND o.active
+                                               AND o.device_user_id = l.log_user_uid)))
+                   AND l.user_id IS DISTINCT FROM s.user_id
+            """, (self.ids,))
+            changed += self.env.cr.rowcount
+        self.env['sa40.attendance.log'].invalidate_model(['user_id'])
+        self.env['sa40.attendance.log.archive'].invalidate_model(['user_id'])
+        return changed
+
+    def action_auto_link(self):
+        """List button: auto-link the selected users (every unlinked user when none is selected)."""
+        users = self or self.search([('user_id', '=', False)])
+        counters = users.sudo()._auto_link()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': 'Auto-link Users',
+                'message': (f"Linked {counters['linked_by_id']} by biometric ID and {counters['linked_by_name']} by name "
+                            f"({counters.get('logs_relinked', 0)} logs relinked); {counters['ambiguous']} ambiguous, "
+                            f"{counters['unmatched']} without match."),
+                'sticky': bool(counters['ambiguous']),
+                'type': 'warning' if counters['ambiguous'] else 'success',
+            }
+        }
+
     def action_open_export_wizard(self):
         """Open the export wizard with active_ids from selected records."""
         ctx = dict(self.env.context or {})
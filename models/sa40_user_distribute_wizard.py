@@ -0,0 +1,43 @@
+# models/sa40_user_distribute_wizard.py
+from odoo import models, fields
+
+# per-user errors listed per device in the result
+RESULT_ERROR_LINES = 10
+
+
+class Sa40UserDistributeWizard(models.TransientModel):
+    _name = 'sa40.user.distribute.wizard'
+    _description = 'Distribute SA40 users to several devices'
+
+    user_ids = fields.Many2many('sa40.user', string='Users', required=True)
+    device_ids = fields.Many2many('sa40.device', string='Target devices', required=True,
+                                  default=lambda self: self.env['sa40.device'].search([('active', '=', True)]))
+    state = fields.Selection([('draft', 'Draft'), ('done', 'Done')], default='draft', readonly=True)
+    result = fields.Text(readonly=True)
+
+    def action_distribute(self):
+        """Push the users to every target device concurrently and show the outcome per device."""
+        self.ensure_one()
+        results = self.device_ids.distribute_users(self.user_ids)
+        lines = []
+        for device in self.device_ids:
+            res = results.get(device)
+            if res is None:
+                continue
+            if res.get('skipped'):
+                lines.append(f"{device.name}: skipped ({res['error']})")
+                continue
+            if not res['ok']:
+                lines.append(f"{device.name}: failed after {res['seconds']:.1f}s: {res['error']}")
+                continue
+            lines.append(f"{device.name}: {res['pushed']} pushed, {res['failed']} failed in {res['seconds']:.1f}s")
+            lines += [f"  {error}" for error in res['errors'][:RESULT_ERROR_LINES]]
+        self.write({'result': '\n'.join(lines) or 'Nothing to push.', 'state': 'done'})
+        return {
+            'name': 'Distribute Users',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
@@ -0,0 +1,35 @@
+# models/sa40_user_reconcile_wizard.py
+from odoo import models, fields
+
+
+class Sa40UserReconcileWizard(models.TransientModel):
+    _name = 'sa40.user.reconcile.wizard'
+    _description = 'Reconcile SA40 device users with Odoo'
+
+    device_id = fields.Many2one('sa40.device', string='Device', required=True)
+    state = fields.Selection([('draft', 'Draft'), ('preview', 'Previewed'), ('done', 'Applied')],
+                             default='draft', readonly=True)
+    report = fields.Text(readonly=True)
+
+    def action_preview(self):
+        """Dry run: download the device user table and report the diff without writing."""
+        self.ensure_one()
+        reports = self.device_id.reconcile_users(dry_run=True)
+        self.write({'report': reports.get(self.device_id.id), 'state': 'preview'})
+        return self._reopen()
+
+    def action_apply(self):
+        self.ensure_one()
+        reports = self.device_id.reconcile_users()
+        self.write({'report': reports.get(self.device_id.id), 'state': 'done'})
+        return self._reopen()
+
+    def _reopen(self):
+        return {
+            'name': 'Reconcile Users',
+            'type': 'ir.actions.act_window',
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }
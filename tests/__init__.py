@@ -0,0 +1,11 @@
+from . import test_sa40_benchmark
+from . import test_sa40_export
+from . import test_sa40_sync
+from . import test_sa40_ingestion
+from . import test_sa40_health
+from . import test_sa40_timezone
+from . import test_sa40_pairing
+from . import test_sa40_usb_import
+from . import test_sa40_reconcile
+from . import test_sa40_autolink
+from . import test_sa40_verification
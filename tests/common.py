@@ -0,0 +1,48 @@
+# tests/common.py
+"""Shared fixture of the SA40 test suites: pyzk replaced by :class:`FakeZK`."""
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase
+
+from ..models import sa40_device
+from .fake_zk import FakeFinger, FakeZK
+
+
+class Sa40FakeDeviceCase(TransactionCase):
+    """TransactionCase whose devices talk to in-process fake terminals."""
+
+    # second octet of the fake terminal addresses, one per suite
+    fake_network = 98
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.ip_seq = 0
+        FakeZK.reset()
+        cls.startClassPatcher(patch.object(sa40_device, 'ZK', FakeZK))
+        cls.startClassPatcher(patch.object(sa40_device, 'Finger', FakeFinger))
+
+    @classmethod
+    def tearDownClass(cls):
+        FakeZK.reset()
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        # breaker state and failed runs are written on a cursor of their own: keep it in the test transaction
+        if not self.registry.in_test_mode():
+            self.registry.enter_test_mode(self.cr)
+            self.addCleanup(self.registry.leave_test_mode)
+
+    def _new_device(self, tz='UTC', **fake_kwargs):
+        """Create an sa40.device bound to a freshly configured fake terminal."""
+        type(self).ip_seq += 1
+        ip = '10.%d.%d.%d' % (self.fake_network, self.ip_seq // 250, self.ip_seq % 250 + 1)
+        FakeZK.configure(ip, 4370, **fake_kwargs)
+        return self.env['sa40.device'].create({'name': 'Test %s' % ip, 'device_ip': ip, 'device_port': 4370, 'tz': tz})
+
+    def _fake_state(self, device):
+        return FakeZK._devices[(device.device_ip, int(device.device_port))]
+
+    def _new_user(self, login):
+        return self.env['res.users'].create({'name': login.title(), 'login': login})
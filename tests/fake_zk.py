@@ -0,0 +1,244 @@
+# tests/fake_zk.py
+"""
+In-process stand-in for pyzk's ``ZK`` class, serving synthetic users and attendance.
+
+Inject it in place of ``from zk import ZK``::
+
+    from unittest.mock import patch
+    from odoo.addons.biopro_sa40_sync.models import sa40_device
+    from odoo.addons.biopro_sa40_sync.tests.fake_zk import FakeZK
+
+    FakeZK.configure('10.0.0.1', 4370, users=500, punches=100000)
+    with patch.object(sa40_device, 'ZK', FakeZK):
+        device.sync_data()
+
+Device state lives in a class-level registry keyed by (ip, port), so successive
+connections (fetch, push, clear...) see the same terminal.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+
+
+class FakeUser:
+    def __init__(self, uid, name, privilege=0, password='', group_id='', user_id='', card=0):
+        self.uid = uid
+        self.name = name
+        self.privilege = privilege
+        self.password = password
+        self.group_id = group_id
+        self.user_id = user_id
+        self.card = card
+
+    def __str__(self):
+        return '<User>: [uid:{}, name:{} user_id:{}]'.format(self.uid, self.name, self.user_id)
+
+
+class FakeAttendance:
+    __slots__ = ('user_id', 'timestamp', 'status', 'punch', 'uid')
+
+    def __init__(self, user_id, timestamp, status, punch=0, uid=0):
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.status = status
+        self.punch = punch
+        self.uid = uid
+
+    def __str__(self):
+        return '<Attendance>: {} : {} ({}, {})'.format(self.user_id, self.timestamp, self.status, self.punch)
+
+
+class FakeFinger:
+    def __init__(self, uid, fid, valid, template):
+        self.uid = int(uid)
+        self.fid = int(fid)
+        self.valid = int(valid)
+        self.template = template
+        self.size = len(template)
+
+    def __eq__(self, other):
+        return self.__dict__ == other.__dict__
+
+
+class FakeDeviceState:
+    """Synthetic content and latency profile of one terminal."""
+
+    def __init__(self, users=100, punches=1000, templates_per_user=0, start=None, punch_interval=7,
+                 connect_latency=0.0, call_latency=0.0, per_record_latency=0.0, unreachable=False,
+                 firmware='Ver 6.60 Fake', serial='FAKE0001', clock_skew=0, seed=42):
+        self.connect_latency = connect_latency
+        self.call_latency = call_latency
+        self.per_record_latency = per_record_latency
+        self.unreachable = unreachable
+        self.firmware = firmware
+        self.serial = serial
+        self.clock_skew = clock_skew
+        self.enabled = True
+
+        rnd = random.Random(seed)
+        self.users = {
+            uid: FakeUser(uid, 'Fake User %s' % uid, user_id=str(1000 + uid))
+            for uid in range(1, users + 1)
+        }
+        self.templates = {}
+        for uid in self.users:
+            for fid in range(templates_per_user):
+                self.templates[(uid, fid)] = FakeFinger(uid, fid, 1, rnd.randbytes(512))
+
+        start = start or datetime(2025, 9, 1, 7, 0, 0)
+        user_ids = [u.user_id for u in self.users.values()] or ['1']
+        self.attendance = [
+            FakeAttendance(rnd.choice(user_ids), start + timedelta(seconds=i * punch_interval), 1, punch=i % 2)
+            for i in range(punches)
+        ]
+
+
+class FakeZK:
+    """Subset of the pyzk ``ZK`` API used by the addon, backed by :class:`FakeDeviceState`."""
+
+    _devices = {}
+
+    # call log per (ip, port), handy for assertions: [('set_user', uid), ...]
+    calls = {}
+
+    @classmethod
+    def configure(cls, ip, port=4370, **kwargs):
+        state = FakeDeviceState(**kwargs)
+        cls._devices[(ip, int(port))] = state
+        cls.calls[(ip, int(port))] = []
+        return state
+
+    @classmethod
+    def reset(cls):
+        cls._devices.clear()
+        cls.calls.clear()
+
+    def __init__(self, ip, port=4370, timeout=60, password=0, force_udp=False, ommit_ping=False,
+                 verbose=False, encoding='UTF-8'):
+        self.ip = ip
+        self.port = int(port)
+        self.timeout = timeout
+        self.password = password
+        self.is_connect = False
+        self.users = 0
+        self.records = 0
+        self.fingers = 0
+
+    # internals -----------------------------------------------------------
+    @property
+    def _state(self):
+        key = (self.ip, self.port)
+        if key not in self._devices:
+            self.configure(self.ip, self.port)
+        return self._devices[key]
+
+    def _call(self, name, *args, records=0):
+        self.calls.setdefault((self.ip, self.port), []).append((name,) + args)
+        state = self._state
+        delay = state.call_latency + records * state.per_record_latency
+        if delay:
+            time.sleep(delay)
+
+    # session ---------------------------------------------------------------
+    def connect(self):
+        state = self._state
+        if state.connect_latency:
+            time.sleep(min(state.connect_latency, self.timeout))
+        if state.unreachable:
+            raise ConnectionError("can't reach device (fake) %s:%s" % (self.ip, self.port))
+        self.is_connect = True
+        self._call('connect')
+        return self
+
+    def disconnect(self):
+        self._call('disconnect')
+        self.is_connect = False
+        return True
+
+    def enable_device(self):
+        self._call('enable_device')
+        self._state.enabled = True
+        return True
+
+    def disable_device(self):
+        self._call('disable_device')
+        self._state.enabled = False
+        return True
+
+    # info ------------------------------------------------------------------
+    def get_firmware_version(self):
+        self._call('get_firmware_version')
+        return self._state.firmware
+
+    def get_serialnumber(self):
+        self._call('get_serialnumber')
+        return self._state.serial
+
+    def get_device_name(self):
+        self._call('get_device_name')
+        return 'SA40 (fake)'
+
+    def get_time(self):
+        self._call('get_time')
+        return datetime.now() + timedelta(seconds=self._state.clock_skew)
+
+    def read_sizes(self):
+        self._call('read_sizes')
+        state = self._state
+        self.users = len(state.users)
+        self.records = len(state.attendance)
+        self.fingers = len(state.templates)
+        return True
+
+    # users -----------------------------------------------------------------
+    def get_users(self):
+        state = self._state
+        self._call('get_users', records=len(state.users))
+        return list(state.users.values())
+
+    def set_user(self, uid=None, name='', privilege=0, password='', group_id='', user_id='', card=0):
+        self._call('set_user', uid)
+        self._state.users[int(uid)] = FakeUser(int(uid), name, privilege, password, group_id, str(user_id), card)
+        return True
+
+    def delete_user(self, uid=0, user_id=''):
+        self._call('delete_user', uid)
+        state = self._state
+        if not uid and user_id:
+            uid = next((u.uid for u in state.users.values() if u.user_id == str(user_id)), 0)
+        state.users.pop(int(uid), None)
+        for key in [k for k in state.templates if k[0] == int(uid)]:
+            state.templates.pop(key)
+        return True
+
+    # attendance --------------------------------------------------------------
+    def get_attendance(self):
+        state = self._state
+        self._call('get_attendance', records=len(state.attendance))
+        return list(state.attendance)
+
+    def clear_attendance(self):
+        self._call('clear_attendance')
+        self._state.attendance = []
+        return True
+
+    # templates ----------------------------------------------------------------
+    def get_templates(self):
+        state = self._state
+        self._call('get_templates', records=len(state.templates))
+        return list(state.templates.values())
+
+    def save_user_template(self, user, fingers=None):
+        uid = user.uid if hasattr(user, 'uid') else int(user)
+        self._call('save_user_template', uid)
+        for finger in fingers or []:
+            self._state.templates[(uid, finger.fid)] = FakeFinger(uid, finger.fid, finger.valid, finger.template)
+        return True
+
+    def HR_save_usertemplates(self, user_templates):
+        self._call('HR_save_usertemplates', len(user_templates))
+        for user, fingers in user_templates:
+            uid = user.uid if hasattr(user, 'uid') else int(user)
+            for finger in fingers:
+                self._state.templates[(uid, finger.fid)] = FakeFinger(uid, finger.fid, finger.valid, finger.template)
+        return True
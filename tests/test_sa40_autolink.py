@@ -0,0 +1,48 @@
+# tests/test_sa40_autolink.py
+"""Bulk auto-linking of device users to res.users."""
+from datetime import datetime
+
+from odoo.tests import tagged
+
+from .common import Sa40FakeDeviceCase
+
+
+@tagged('post_install', '-at_install')
+class TestSa40AutoLink(Sa40FakeDeviceCase):
+
+    fake_network = 89
+
+    def _log(self, device, uid):
+        return self.env['sa40.attendance.log'].create({
+            'device_id': device.id, 'log_user_uid': uid, 'timestamp': datetime(2025, 1, 15, 8, 0), 'status': '1',
+        })
+
+    def test_auto_link(self):
+        device = self._new_device()
+        by_badge = self._new_user('autolink_badge')
+        by_badge.partner_id.biometric_id = '1001'
+        by_name = self._new_user('autolink_name')
+        by_name.partner_id.name = 'Jane Q Public'
+        twin_a, twin_b = self._new_user('autolink_twin_a'), self._new_user('autolink_twin_b')
+        (twin_a | twin_b).partner_id.write({'name': 'Same Name'})
+
+        Sa40User = self.env['sa40.user']
+        badge = Sa40User.create({'name': 'Whatever', 'device_id': device.id, 'device_uid': 1, 'device_user_id': '1001'})
+        # no device user_id: its logs carry the uid
+        name = Sa40User.create({'name': 'public jane q', 'device_id': device.id, 'device_uid': 2})
+        twin = Sa40User.create({'name': 'Same Name', 'device_id': device.id, 'device_uid': 3, 'device_user_id': '1003'})
+        logs = self._log(device, '1001') | self._log(device, '2')
+        # stamps older than this transaction
+        self.env.cr.execute("UPDATE sa40_user SET write_date = '2020-01-01' WHERE id = ANY(%s)", ([badge.id, name.id, twin.id],))
+        Sa40User.invalidate_model(['write_date'])
+
+        counters = (badge | name | twin)._auto_link()
+        self.assertEqual((counters['linked_by_id'], counters['linked_by_name'], counters['ambiguous']), (1, 1, 1))
+        self.assertEqual((badge.user_id, name.user_id), (by_badge, by_name))
+        self.assertFalse(twin.user_id)
+        self.assertIn('Ambiguous', twin.auto_link_note)
+        # written like any ORM write
+        self.assertEqual(set((badge | name | twin).mapped('write_date')), {self.env.cr.now()})
+        # logs matched on the user_id and on the uid, as ingestion resolves them
+        self.assertEqual(counters['logs_relinked'], 2)
+        self.assertEqual(logs.mapped('user_id'), by_badge | by_name)
@@ -0,0 +1,193 @@
+# tests/test_sa40_benchmark.py
+"""
+Offline performance benchmarks for the heavy SA40 paths, driven by :class:`FakeZK`.
+
+Not part of the standard run; launch explicitly, e.g.::
+
+    odoo-bin -d bench -i biopro_sa40_sync --test-tags /biopro_sa40_sync:sa40_benchmark --stop-after-init
+
+Sizes are taken from the environment (comma separated):
+  - ``SA40_BENCH_SIZES``       attendance punches   (default 10000,100000,1000000)
+  - ``SA40_BENCH_USER_SIZES``  device users         (default 1000,5000)
+
+Each measurement reports rows/sec, SQL query count and peak Python memory
+(tracemalloc, which itself slows the measured code down).
+"""
+import logging
+import os
+import time
+import tracemalloc
+from datetime import datetime
+
+from odoo.tests import tagged
+
+from .common import Sa40FakeDeviceCase
+
+_logger = logging.getLogger(__name__)
+
+
+def _sizes(var, default):
+    return [int(x) for x in os.environ.get(var, default).split(',') if x.strip()]
+
+
+BENCH_SIZES = _sizes('SA40_BENCH_SIZES', '10000,100000,1000000')
+USER_SIZES = _sizes('SA40_BENCH_USER_SIZES', '1000,5000')
+
+
+@tagged('post_install', '-at_install', '-standard', 'sa40_benchmark')
+class TestSa40Benchmark(Sa40FakeDeviceCase):
+
+    fake_network = 99
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        lines = ['%-28s %10s %10s %12s %10s %10s' % ('path', 'rows', 'seconds', 'rows/sec', 'queries', 'peak MiB')]
+        for label, rows, elapsed, rate, queries, peak in cls.results:
+            lines.append('%-28s %10d %10.2f %12.0f %10d %10.1f' % (label, rows, elapsed, rate, queries, peak))
+        _logger.info("SA40 benchmark results:\n%s", '\n'.join(lines))
+        super().tearDownClass()
+
+    ####################################################################
+    # Helpers
+    ####################################################################
+    def _seed_logs(self, device, count, users=500):
+        """Insert ``count`` logs straight in SQL (setup only, not measured)."""
+        self.env.cr.execute("""
+            INSERT INTO sa40_attendance_log (device_id, log_user_uid, timestamp, status, raw,
+                                             create_uid, create_date, write_uid, write_date)
+            SELECT %s, (1000 + 1 + (n %% %s))::text, %s::timestamp + n * interval '7 seconds', '1', NULL,
+                   %s, now() at time zone 'UTC', %s, now() at time zone 'UTC'
+              FROM generate_series(0, %s - 1) AS n
+        """, (device.id, users, datetime(2025, 9, 1, 7, 0, 0), self.env.uid, self.env.uid, count))
+        self.env['sa40.attendance.log'].invalidate_model()
+
+    def _measure(self, label, rows, func):
+        self.env.flush_all()
+        cr = self.env.cr
+        queries_before = cr.sql_log_count
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            result = func()
+            self.env.flush_all()
+        finally:
+            elapsed = time.perf_counter() - start
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        queries = cr.sql_log_count - queries_before
+        rate = rows / elapsed if elapsed else 0.0
+        self.results.append((label, rows, elapsed, rate, queries, peak / (1024 * 1024)))
+        _logger.info("SA40 bench %s: %s rows in %.2fs (%.0f rows/s, %s queries, peak %.1f MiB)",
+                     label, rows, elapsed, rate, queries, peak / (1024 * 1024))
+        return result
+
+    ####################################################################
+    # Benchmarks
+    ####################################################################
+    def test_persist_attendances(self):
+        for size in BENCH_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=min(max(size // 200, 10), 2000), punches=size)
+                device.fetch_users_from_device()
+                records = self._measure('fetch_attendances', size, device.fetch_attendances_from_device)
+                res = self._measure('persist_attendances', size,
+                                    lambda: device.persist_attendances(device, records))
+                self.assertEqual(res['created'] + res['skipped_duplicates'] + res['invalid'], size)
+
+    def test_stream_attendances(self):
+        for size in BENCH_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=min(max(size // 200, 10), 2000), punches=size)
+                device.fetch_users_from_device()
+                res = self._measure('stream + persist', size,
+                                    lambda: device.persist_attendances(device, device.iter_attendances_from_device()))
+                self.assertEqual(res['fetched'], size)
+
+    def test_fetch_users(self):
+        for size in USER_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=size, punches=0)
+                self._measure('fetch_users_from_device', size, device.fetch_users_from_device)
+                self.assertEqual(self.env['sa40.user'].search_count([('device_id', '=', device.id)]), size)
+
+    def test_push_users(self):
+        for size in USER_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=0, punches=0)
+                self.env['sa40.user'].create([{
+                    'name': 'Student %s' % i,
+                    'device_id': device.id,
+                    'device_user_id': str(5000 + i),
+                } for i in range(size)])
+                counters = self._measure('push_sa40_users_to_device', size, device.push_sa40_users_to_device)
+                self.assertEqual(counters['pushed'], size)
+
+    def test_distribute_users(self):
+        for size in USER_SIZES:
+            with self.subTest(size=size):
+                source = self._new_device(users=size, punches=0)
+                targets = self.env['sa40.device'].concat(*(self._new_device(users=0, punches=0) for _i in range(4)))
+                source.fetch_users_from_device()
+                users = self.env['sa40.user'].search([('device_id', '=', source.id)])
+                results = self._measure('distribute_users (4 devices)', size * 4, lambda: targets.distribute_users(users))
+                self.assertTrue(all(res['pushed'] == size for res in results.values()))
+                self.assertEqual(self.env['sa40.user'].search_count([('device_id', 'in', targets.ids)]), size * 4)
+
+    def test_reconcile_users(self):
+        for size in USER_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=size, punches=0)
+                device.fetch_users_from_device()
+                users = self.env['sa40.user'].search([('device_id', '=', device.id)])
+                users[:10].action_archive()
+                self.env['sa40.user'].create([{'name': 'New %s' % i, 'device_id': device.id, 'device_user_id': str(90000 + i)}
+                                              for i in range(10)])
+                self._measure('reconcile_users (dry run)', size, lambda: device.reconcile_users(dry_run=True))
+                self._measure('reconcile_users', size, device.reconcile_users)
+                self.assertEqual(self.env['sa40.user'].search_count([('device_id', '=', device.id)]), size)
+                # both sides match now: nothing left to do
+                report = device.reconcile_users(dry_run=True)[device.id]
+                self.assertIn('Write on device: 0', report)
+                self.assertIn('Archive in Odoo: 0', report)
+
+    def test_replicate_templates(self):
+        for size in USER_SIZES:
+            with self.subTest(size=size):
+                source = self._new_device(users=size, punches=0, templates_per_user=2)
+                target = self._new_device(users=size, punches=0)
+                (source | target).fetch_users_from_device()
+                self._measure('pull_templates_from_device', size * 2, source.pull_templates_from_device)
+                res = self._measure('replicate_templates_to_device', size * 2, target.replicate_templates_to_device)
+                self.assertEqual(res['pushed'], size * 2)
+                # nothing left to send on the next run
+                self.assertFalse(target.replicate_templates_to_device().get('pushed'))
+
+    def test_verify_attendance(self):
+        if 'sc.attendance.sheet' not in self.env or 'op.student' not in self.env:
+            self.skipTest("sc.attendance.sheet / op.student are not installed")
+        for size in BENCH_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=0, punches=0)
+                self._seed_logs(device, size)
+                self._measure('verify_attendance_from_logs', size, device.action_verify_attendance_from_logs)
+
+    def test_export(self):
+        for size in BENCH_SIZES:
+            with self.subTest(size=size):
+                device = self._new_device(users=0, punches=0)
+                self._seed_logs(device, size)
+                wizard = self.env['sa40.export.wizard'].create({
+                    'model_choice': 'attendance',
+                    'export_format': 'csv',
+                    'export_selected': False,
+                    'device_id': device.id,
+                })
+                action = self._measure('action_export', size, wizard.action_export)
+                self.assertEqual(action['type'], 'ir.actions.act_url')
+                # a second identical export is served from the export cache
+                self._measure('action_export (cached)', size, wizard.action_export)
@@ -0,0 +1,49 @@
+# tests/test_sa40_export.py
+"""Export wizard: cache fingerprint of the exported scope."""
+from datetime import datetime, timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from .common import Sa40FakeDeviceCase
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Export(Sa40FakeDeviceCase):
+
+    fake_network = 97
+
+    def _touch(self, record):
+        # bump write_date past the one of the current transaction
+        self.env.cr.execute(f'UPDATE "{record._table}" SET write_date = %s WHERE id = %s',
+                            (fields.Datetime.now() + timedelta(hours=1), record.id))
+        record.invalidate_model(['write_date'])
+
+    def test_export_fingerprint(self):
+        device = self._new_device()
+        user = self._new_user('export_linked')
+        self.env['sa40.user'].create({
+            'device_id': device.id, 'name': 'Linked', 'device_uid': 1,
+            'device_user_id': '1001', 'user_id': user.id,
+        })
+        device.persist_attendances(device, [{'user_id': '1001', 'timestamp': datetime(2025, 1, 15, 8, 0), 'status': 1}])
+        wizard = self.env['sa40.export.wizard'].create({'model_choice': 'attendance', 'device_id': device.id})
+
+        def fingerprint():
+            return wizard._get_export_fingerprint(*wizard._get_export_scope())
+
+        first = fingerprint()
+        self.assertEqual(fingerprint(), first)
+
+        # a partner the export does not show leaves the cached file valid
+        self._touch(self._new_user('export_unrelated').partner_id)
+        self.assertEqual(fingerprint(), first)
+
+        # the partner of an exported row changes the exported names
+        self._touch(user.partner_id)
+        second = fingerprint()
+        self.assertNotEqual(second, first)
+
+        # a new log in scope
+        device.persist_attendances(device, [{'user_id': '1001', 'timestamp': datetime(2025, 1, 15, 9, 0), 'status': 1}])
+        self.assertNotEqual(fingerprint(), second)
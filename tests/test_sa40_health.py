@@ -0,0 +1,75 @@
+# tests/test_sa40_health.py
+"""Connection health: circuit breaker and fleet health scan."""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from ..models.sa40_device import BREAKER_PROBE_TIMEOUT
+from .common import Sa40FakeDeviceCase
+from .fake_zk import FakeZK
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Health(Sa40FakeDeviceCase):
+
+    fake_network = 94
+
+    def test_breaker_state_machine(self):
+        device = self._new_device(unreachable=True)
+        with self.assertRaises(UserError):
+            device._connect_to_device(device)
+        self.assertEqual(device.health_state, 'open')
+        self.assertEqual(device.consecutive_failures, 1)
+        self.assertGreater(device.next_retry_at, fields.Datetime.now())
+        self.assertFalse(device._breaker_is_due())
+
+        # open and not due: refused without touching the device
+        calls = len(FakeZK.calls[(device.device_ip, device.device_port)])
+        with self.assertRaises(UserError):
+            device._connect_to_device(device)
+        self.assertEqual(len(FakeZK.calls[(device.device_ip, device.device_port)]), calls)
+
+        # due: a single short probe, which fails again with a longer backoff
+        device.next_retry_at = fields.Datetime.now() - timedelta(seconds=1)
+        self.assertEqual(device._breaker_before_connect(), min(int(device.device_timeout), BREAKER_PROBE_TIMEOUT))
+        self.assertEqual(device.health_state, 'open')
+        device._breaker_record_failure(ConnectionError('still down'))
+        self.assertEqual(device.health_state, 'open')
+        self.assertEqual(device.consecutive_failures, 2)
+
+        # reachable again: closed
+        self._fake_state(device).unreachable = False
+        device.next_retry_at = fields.Datetime.now() - timedelta(seconds=1)
+        _zk, conn = device._connect_to_device(device)
+        conn.disconnect()
+        self.assertEqual(device.health_state, 'closed')
+        self.assertEqual(device.consecutive_failures, 0)
+        self.assertFalse(device.next_retry_at)
+
+    def test_breaker_failure_reaches_the_database(self):
+        device = self._new_device(unreachable=True)
+        with self.assertRaises(UserError):
+            device._connect_to_device(device)
+        device.invalidate_recordset()
+        self.assertEqual((device.health_state, device.consecutive_failures), ('open', 1))
+
+    def test_health_scan_opens_breaker(self):
+        device = self._new_device(unreachable=True)
+        self.assertFalse(device._health_scan(force=True)[device]['ok'])
+        self.assertEqual(device.health_state, 'open')
+        # not forced: the open device is left alone until its retry time
+        self.assertEqual(device._health_scan(), {})
+
+    def test_health_scan_mixed_fleet(self):
+        up = self._new_device()
+        down = self._new_device(unreachable=True)
+        results = (up | down)._health_scan(force=True)
+        self.assertEqual({d: r['ok'] for d, r in results.items()}, {up: True, down: False})
+        (up | down).invalidate_recordset()
+        # one unreachable device does not cost the results of the others
+        self.assertEqual((up.health_state, up.serial_number), ('closed', 'FAKE0001'))
+        self.assertTrue(up.last_health_check)
+        self.assertEqual((down.health_state, down.consecutive_failures), ('open', 1))
+        self.assertTrue(down.last_health_check)
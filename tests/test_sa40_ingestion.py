@@ -0,0 +1,104 @@
+# tests/test_sa40_ingestion.py
+"""Attendance ingestion: streamed persistence, crash-resumable scheduled sync, diagnostics."""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from odoo.exceptions import UserError
+from odoo.tests import tagged
+
+from ..models import sa40_device
+from ..models.sa40_device import INGEST_CHUNK_SIZE, IngestDiagnostics, _checkpoint_key
+from .common import Sa40FakeDeviceCase
+from .fake_zk import FakeAttendance
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Ingestion(Sa40FakeDeviceCase):
+
+    fake_network = 95
+
+    def test_persist_attendances(self):
+        device = self._new_device(tz='Europe/Paris')
+        records = [
+            {'user_id': '1001', 'timestamp': datetime(2025, 1, 15, 8, 0), 'status': 1, 'punch': 0},
+            {'user_id': '1001', 'timestamp': datetime(2025, 1, 15, 8, 0), 'status': 1, 'punch': 0},
+            {'user_id': None, 'timestamp': datetime(2025, 1, 15, 9, 0), 'status': 1, 'punch': 0},
+            {'user_id': None, 'timestamp': datetime(2025, 1, 15, 9, 0), 'status': 1, 'punch': 0},
+            {'user_id': '1002', 'timestamp': 'garbage', 'status': 1, 'punch': 0},
+        ]
+        # records are consumed lazily, a couple at a time
+        res = device.persist_attendances(device, iter(records), chunk_size=2)
+        self.assertEqual((res['fetched'], res['created'], res['skipped_duplicates'], res['invalid'], res['errors']),
+                         (5, 2, 2, 1, 0))
+        logs = self.env['sa40.attendance.log'].search([('device_id', '=', device.id)], order='timestamp')
+        # stored in UTC
+        self.assertEqual(logs.mapped('timestamp'), [datetime(2025, 1, 15, 7, 0), datetime(2025, 1, 15, 8, 0)])
+
+        # a resync only finds duplicates, punches without user id included
+        res = device.persist_attendances(device, records)
+        self.assertEqual((res['created'], res['skipped_duplicates'], res['invalid']), (0, 4, 1))
+
+    def test_sync_streams_the_device_log(self):
+        device = self._new_device(users=5, punches=2500)
+        pers = device._sync_attendance_session()
+        self.assertEqual((pers['fetched'], pers['created'], pers['invalid']), (2500, 2500, 0))
+        self.assertEqual(self.env['sa40.attendance.log'].search_count([('device_id', '=', device.id)]), 2500)
+
+    def test_resume_point(self):
+        device = self._new_device()
+        start = datetime(2025, 9, 1, 7, 0)
+        log = [FakeAttendance(str(1000 + i), start + timedelta(minutes=i), 1) for i in range(5)]
+        self.assertEqual(device._get_resume_point(log), 0)
+
+        device.write({'ingest_checkpoint': 3, 'ingest_checkpoint_key': _checkpoint_key(log[2].user_id, log[2].timestamp)})
+        self.assertEqual(device._get_resume_point(log), 3)
+        # the device log was cleared or replaced: the checkpoint record moved or disappeared
+        self.assertEqual(device._get_resume_point(log[1:]), 0)
+        self.assertEqual(device._get_resume_point(log[:2]), 0)
+
+    def test_scheduled_sync_resumes_after_a_crash(self):
+        device = self._new_device(users=5, punches=2 * INGEST_CHUNK_SIZE + 500)
+        Device = type(device)
+        insert_batch = Device._insert_log_batch
+        batches = []
+
+        def crash_on_second_chunk(self, *args):
+            batches.append(len(args[1]))
+            if len(batches) == 2:
+                raise RuntimeError('worker killed')
+            return insert_batch(self, *args)
+
+        # every committed chunk stays in the test transaction
+        with patch.object(self.env.cr, 'commit'):
+            with patch.object(Device, '_insert_log_batch', crash_on_second_chunk), self.assertRaises(UserError):
+                device._sync_attendance_session(commit=True)
+            self.assertEqual(device.ingest_checkpoint, INGEST_CHUNK_SIZE)
+
+            pers = device._sync_attendance_session(commit=True)
+        self.assertEqual((pers['fetched'], pers['created'], pers['skipped_duplicates']),
+                         (2 * INGEST_CHUNK_SIZE + 500, INGEST_CHUNK_SIZE + 500, INGEST_CHUNK_SIZE))
+        self.assertEqual(device.ingest_checkpoint, 2 * INGEST_CHUNK_SIZE + 500)
+
+    def test_diagnostics_sampling(self):
+        self.patch(IngestDiagnostics, '_last_sampled', {})
+        device = SimpleNamespace(id=-1, name='Sampled')
+        clock = [1000.0]
+        with patch.object(sa40_device.pytime, 'monotonic', lambda: clock[0]), \
+                patch.object(sa40_device._logger, 'warning') as warning:
+            diag = IngestDiagnostics(device)
+            for _i in range(10):
+                diag.sample('bad_ts', "bad %s", 1)
+            self.assertEqual(warning.call_count, IngestDiagnostics.SAMPLES_PER_RUN)
+            self.assertEqual(diag.counts['bad_ts'], 10)
+
+            # the next run within the interval stays silent, but still counts
+            warning.reset_mock()
+            diag = IngestDiagnostics(device)
+            diag.sample('bad_ts', "bad %s", 1)
+            self.assertEqual((warning.call_count, diag.counts['bad_ts']), (0, 1))
+
+            # expired keys are dropped when a new sample is claimed
+            clock[0] += IngestDiagnostics.INTERVAL
+            IngestDiagnostics(SimpleNamespace(id=-2, name='Other')).sample('bad_ts', "bad %s", 1)
+            self.assertEqual(set(IngestDiagnostics._last_sampled), {(-2, 'bad_ts')})
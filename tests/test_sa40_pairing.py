@@ -0,0 +1,109 @@
+# tests/test_sa40_pairing.py
+"""Pairing of device punches into hr.attendance."""
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models.hr_employee import PARAM_BACKFILL_DAYS
+from .common import Sa40FakeDeviceCase
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Pairing(Sa40FakeDeviceCase):
+
+    fake_network = 92
+
+    def _pairing_fixture(self, **device_vals):
+        device = self._new_device()
+        if device_vals:
+            device.write(device_vals)
+        user = self._new_user('sa40.pairing.%s' % device.id)
+        employee = self.env['hr.employee'].create({'name': 'Pairing Employee', 'user_id': user.id})
+        self.env['sa40.user'].create({'name': 'Pairing Employee', 'device_id': device.id, 'device_uid': 1,
+                                      'device_user_id': '1001', 'user_id': user.id})
+        day = fields.Datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+        return device, employee, day
+
+    def _punch(self, device, when, punch=0):
+        return self.env['sa40.attendance.log'].create({
+            'device_id': device.id, 'log_user_uid': '1001', 'timestamp': when, 'status': '1', 'punch': punch,
+        })
+
+    def _attendances(self, employee):
+        return [(att.check_in, att.check_out)
+                for att in self.env['hr.attendance'].search([('employee_id', '=', employee.id)], order='check_in')]
+
+    def test_pairing_alternates_and_debounces(self):
+        device, employee, day = self._pairing_fixture()
+        for when in (day + timedelta(hours=8), day + timedelta(hours=8, minutes=1), day + timedelta(hours=17)):
+            last = self._punch(device, when)
+        totals = self.env['hr.employee']._sa40_pair_attendances()
+        self.assertEqual(self._attendances(employee), [(day + timedelta(hours=8), day + timedelta(hours=17))])
+        self.assertEqual(totals['debounced'], 1)
+        self.assertEqual(employee.sa40_attendance_watermark, last.id)
+        # nothing new: nothing to pair
+        self.assertFalse(self.env['hr.employee']._sa40_pair_attendances())
+
+    def test_pairing_late_punches(self):
+        device, employee, day = self._pairing_fixture()
+        self._punch(device, day + timedelta(hours=8))
+        self._punch(device, day + timedelta(hours=17))
+        self.env['hr.employee']._sa40_pair_attendances()
+        # the lunch break reaches the database after the evening punch
+        self._punch(device, day + timedelta(hours=12))
+        self._punch(device, day + timedelta(hours=13))
+        self.env['hr.employee']._sa40_pair_attendances()
+        self.assertEqual(self._attendances(employee), [
+            (day + timedelta(hours=8), day + timedelta(hours=12)),
+            (day + timedelta(hours=13), day + timedelta(hours=17)),
+        ])
+
+    def test_pairing_punch_states(self):
+        device, employee, day = self._pairing_fixture(punch_states=True)
+        self._punch(device, day + timedelta(hours=8), punch=0)
+        # forgot to check out, checked in again
+        self._punch(device, day + timedelta(hours=9), punch=0)
+        self._punch(device, day + timedelta(hours=17), punch=1)
+        self._punch(device, day + timedelta(hours=18), punch=1)
+        totals = self.env['hr.employee']._sa40_pair_attendances()
+        self.assertEqual(self._attendances(employee), [
+            (day + timedelta(hours=8), day + timedelta(hours=8)),
+            (day + timedelta(hours=9), day + timedelta(hours=17)),
+        ])
+        self.assertEqual(totals['orphan_out'], 1)
+
+    def test_pairing_keeps_hand_entered_shift(self):
+        device, employee, day = self._pairing_fixture()
+        manual = self.env['hr.attendance'].create({'employee_id': employee.id, 'check_in': day + timedelta(hours=8)})
+        self._punch(device, day + timedelta(hours=7))
+        last = self._punch(device, day + timedelta(hours=12))
+        totals = self.env['hr.employee']._sa40_pair_attendances()
+        self.assertFalse(totals.get('employees_failed'))
+        self.assertEqual(manual.check_out, day + timedelta(hours=12))
+        self.assertEqual(self._attendances(employee), [
+            (day + timedelta(hours=7), day + timedelta(hours=7)),
+            (day + timedelta(hours=8), day + timedelta(hours=12)),
+        ])
+        self.assertEqual(employee.sa40_attendance_watermark, last.id)
+
+    def test_pairing_backfill_bounds_the_first_run_only(self):
+        self.env['ir.config_parameter'].sudo().set_param(PARAM_BACKFILL_DAYS, 7)
+        device, employee, day = self._pairing_fixture()
+        old = day - timedelta(days=30)
+        # history older than the backfill window is left alone on the first run
+        self._punch(device, old + timedelta(hours=8))
+        self._punch(device, day + timedelta(hours=8))
+        self._punch(device, day + timedelta(hours=17))
+        self.env['hr.employee']._sa40_pair_attendances()
+        self.assertEqual(self._attendances(employee), [(day + timedelta(hours=8), day + timedelta(hours=17))])
+
+        # then an old shift imported late (USB dump) is paired like any new punch
+        self._punch(device, old + timedelta(days=1, hours=8))
+        last = self._punch(device, old + timedelta(days=1, hours=17))
+        self.env['hr.employee']._sa40_pair_attendances()
+        self.assertEqual(self._attendances(employee), [
+            (old + timedelta(days=1, hours=8), old + timedelta(days=1, hours=17)),
+            (day + timedelta(hours=8), day + timedelta(hours=17)),
+        ])
+        self.assertEqual(employee.sa40_attendance_watermark, last.id)
@@ -0,0 +1,101 @@
+# tests/test_sa40_reconcile.py
+"""Two-way reconciliation of the device user table with sa40.user."""
+from unittest.mock import patch
+
+from odoo.tests import tagged
+
+from .common import Sa40FakeDeviceCase
+from .fake_zk import FakeUser, FakeZK
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Reconcile(Sa40FakeDeviceCase):
+
+    fake_network = 90
+
+    def _reconcile_fixture(self):
+        device = self._new_device()
+        state = self._fake_state(device)
+        state.users = {
+            1: FakeUser(1, 'Device Name', user_id='1001'),
+            2: FakeUser(2, 'Bob', user_id='1002'),
+            3: FakeUser(3, 'Newcomer', user_id='1003'),
+            4: FakeUser(4, 'Gone', user_id='1004'),
+        }
+        Sa40User = self.env['sa40.user']
+        recs = {
+            'device_wins': Sa40User.create({'name': 'Odoo Name', 'device_id': device.id, 'device_uid': 1,
+                                            'device_user_id': '1001'}),
+            'odoo_wins': Sa40User.create({'name': 'Robert', 'device_id': device.id, 'device_uid': 2,
+                                          'device_user_id': '1002'}),
+            'archived': Sa40User.create({'name': 'Gone', 'device_id': device.id, 'device_uid': 4,
+                                         'device_user_id': '1004', 'active': False}),
+            'uid_taken': Sa40User.create({'name': 'Late Enrolment', 'device_id': device.id, 'device_uid': 3,
+                                          'device_user_id': '1005'}),
+            'deleted': Sa40User.create({'name': 'Deleted', 'device_id': device.id, 'device_uid': 6,
+                                        'device_user_id': '1006'}),
+        }
+        # synced by the transaction that wrote them: not edited since, the device side wins
+        (recs['device_wins'] | recs['deleted']).write({'device_synced_at': self.env.cr.now()})
+        return device, recs
+
+    def _plan(self, device):
+        records = self.env['sa40.user'].with_context(active_test=False).search([('device_id', '=', device.id)])
+        return device._diff_device_users(list(self._fake_state(device).users.values()), records)
+
+    def test_diff_device_users(self):
+        device, recs = self._reconcile_fixture()
+        plan = self._plan(device)
+
+        self.assertEqual([(v['device_user_id'], v['device_uid']) for v in plan['odoo_create']], [('1003', 3)])
+        writes = dict((rec, vals) for rec, vals in plan['odoo_write'])
+        self.assertEqual(writes[recs['device_wins']], {'name': 'Device Name'})
+        self.assertEqual(writes[recs['uid_taken']], {'device_uid': 7})
+        self.assertEqual(plan['odoo_archive'], recs['deleted'])
+        self.assertEqual([(rec, uid, bool(u)) for rec, uid, u in plan['device_set']],
+                         [(recs['odoo_wins'], 2, True), (recs['uid_taken'], 7, False)])
+        self.assertEqual([(rec, u.uid) for rec, u in plan['device_delete']], [(recs['archived'], 4)])
+        self.assertEqual(len(plan['collisions']), 1)
+        self.assertFalse(plan['held'])
+
+    def test_reconcile_users(self):
+        device, recs = self._reconcile_fixture()
+        report = device.reconcile_users()[device.id]
+        state = self._fake_state(device)
+        self.assertEqual(sorted(state.users), [1, 2, 3, 7])
+        self.assertEqual(state.users[2].name, 'Robert')
+        self.assertEqual(recs['device_wins'].name, 'Device Name')
+        # nothing is deleted in Odoo
+        self.assertTrue((recs['archived'] | recs['deleted']).exists())
+        self.assertFalse(recs['archived'].active or recs['deleted'].active)
+        self.assertNotIn('Failed on device', report)
+
+    def test_reconcile_keeps_undeleted_users(self):
+        device, recs = self._reconcile_fixture()
+        with patch.object(FakeZK, 'delete_user', side_effect=OSError('device busy')):
+            report = device.reconcile_users()[device.id]
+        # still on the device: retried at the next run
+        self.assertIn(4, self._fake_state(device).users)
+        self.assertIn('Failed on device: 1', report)
+        self.assertEqual([rec for rec, _u in self._plan(device)['device_delete']], [recs['archived']])
+
+    def test_reconcile_holds_back_mass_disappearance(self):
+        device = self._new_device(users=14)
+        device.fetch_users_from_device()
+        gone = self.env['sa40.user'].create([{
+            'name': f'Gone {uid}', 'device_id': device.id, 'device_uid': uid, 'device_user_id': str(1000 + uid),
+            'device_synced_at': self.env.cr.now(),
+        } for uid in range(15, 21)])
+        report = device.reconcile_users()[device.id]
+        # 6 of 20 synced users missing: the device was more likely reset than cleaned up
+        self.assertTrue(all(gone.mapped('active')))
+        self.assertIn('Held back: 1', report)
+
+    def test_fetched_users_are_in_sync(self):
+        device = self._new_device(users=5)
+        device.fetch_users_from_device()
+        # stamped with the transaction clock, like write_date: nothing looks edited in Odoo
+        plan = self._plan(device)
+        self.assertFalse(plan['device_set'] or plan['odoo_write'] or plan['odoo_archive'])
+        users = self.env['sa40.user'].search([('device_id', '=', device.id)])
+        self.assertEqual(set(users.mapped('device_synced_at')), {self.env.cr.now()})
@@ -0,0 +1,127 @@
+# tests/test_sa40_sync.py
+"""Sync orchestration against :class:`FakeZK`: preview, device locks, device log clearing, cron claims."""
+from datetime import timedelta
+from unittest.mock import patch
+
+from odoo import fields
+
+from odoo.sql_db import db_connect
+from odoo.tests import tagged
+
+from ..models import sa40_device
+from ..models.sa40_device import CLAIM_LEASE_MINUTES, DEVICE_LOCK_NAMESPACE, DeviceBusyError
+from .common import Sa40FakeDeviceCase
+from .fake_zk import FakeAttendance, FakeZK
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Sync(Sa40FakeDeviceCase):
+
+    fake_network = 96
+
+    def test_preview_lists_only_new_punches(self):
+        device = self._new_device(users=2, punches=6)
+        state = self._fake_state(device)
+        punches = list(state.attendance)
+        # an older punch missing from Odoo is still new, a repeated one is listed once
+        device.persist_attendances(device, [punches[0], punches[2]])
+        state.attendance.append(FakeAttendance(punches[5].user_id, punches[5].timestamp, 1))
+
+        action = device.action_preview_sync()
+        lines = self.env['sa40.sync.wizard'].browse(action['res_id']).line_ids
+        self.assertEqual(
+            sorted((line.log_user_uid, line.timestamp) for line in lines),
+            sorted((p.user_id, p.timestamp) for p in [punches[1], punches[3], punches[4], punches[5]]),
+        )
+        # the preview only reads the device
+        self.assertNotIn(('get_users',), FakeZK.calls[(device.device_ip, 4370)])
+        self.assertFalse(self.env['sa40.user'].search([('device_id', '=', device.id)]))
+
+    def test_device_lock_contention(self):
+        device = self._new_device()
+        # another worker, on a connection of its own, holds the device
+        with db_connect(self.env.cr.dbname).cursor() as other:
+            other.execute("SELECT pg_advisory_lock(%s, %s)", (DEVICE_LOCK_NAMESPACE, device.id))
+            try:
+                with self.assertRaises(DeviceBusyError):
+                    device._acquire_device_lock('test')
+                with self.assertRaises(DeviceBusyError):
+                    device.sync_data()
+            finally:
+                other.execute("SELECT pg_advisory_unlock(%s, %s)", (DEVICE_LOCK_NAMESPACE, device.id))
+        self.assertNotIn(self.env.cr, sa40_device._LOCK_CURSORS)
+        self.assertFalse(FakeZK.calls[(device.device_ip, 4370)])
+
+        # free again; nested operations of one transaction share its locks
+        device.name = 'Locked'
+        with device._device_lock('sync'), device._device_lock('fetch users'):
+            self.assertEqual(sa40_device._LOCK_CURSORS[self.env.cr][1], 2)
+        self.assertNotIn(self.env.cr, sa40_device._LOCK_CURSORS)
+        # the locks never touch the caller's transaction
+        self.assertEqual(device.name, 'Locked')
+
+    def _sync_and_clear(self, device):
+        # the scheduled sync commits before clearing: keep it in the test transaction
+        with patch.object(self.env.cr, 'commit'):
+            return device._sync_attendance_session(commit=True)
+
+    def test_clear_after_verified_ingest(self):
+        device = self._new_device(users=3, punches=20)
+        device.clear_after_sync = True
+        pers = self._sync_and_clear(device)
+        self.assertEqual((pers['fetched'], pers['created']), (20, 20))
+        self.assertFalse(self._fake_state(device).attendance)
+        self.assertEqual(device.last_cleared_count, 20)
+
+    def test_no_clear_when_a_fetched_punch_is_missing(self):
+        device = self._new_device(users=3, punches=20)
+        device.clear_after_sync = True
+        Device = type(device)
+        clear_if_safe = Device._clear_device_log_if_safe
+
+        def lose_one_punch(self, conn, pers, keys):
+            # a fetched punch disappears while another one lands in the same time range:
+            # the number of rows between the first and last fetched punches is unchanged
+            log = self.env['sa40.attendance.log'].search([('device_id', '=', self.id)], order='timestamp', offset=5, limit=1)
+            log.copy({'log_user_uid': 'other'})
+            log.unlink()
+            return clear_if_safe(self, conn, pers, keys)
+
+        with patch.object(Device, '_clear_device_log_if_safe', lose_one_punch):
+            self._sync_and_clear(device)
+        self.assertEqual(len(self._fake_state(device).attendance), 20)
+        self.assertNotIn(('clear_attendance',), FakeZK.calls[(device.device_ip, 4370)])
+        self.assertFalse(device.last_cleared_at)
+
+    def _only_devices(self, *devices):
+        self.env['sa40.device'].search([('id', 'not in', [d.id for d in devices])]).active = False
+
+    def test_claim_leases_due_devices(self):
+        first, second, later = self._new_device(), self._new_device(), self._new_device()
+        self._only_devices(first, second, later)
+        tick = fields.Datetime.now()
+        later.next_poll_at = tick + timedelta(minutes=5)
+        Device = self.env['sa40.device']
+        with patch.object(self.env.cr, 'commit') as commit:
+            claimed = Device._claim_due_device(due_by=tick) | Device._claim_due_device(due_by=tick)
+            self.assertEqual(claimed, first | second)
+            # leased: neither is handed out again, and the device due after the tick waits
+            self.assertFalse(Device._claim_due_device(due_by=tick))
+            self.assertEqual(commit.call_count, 3)
+        for device in claimed:
+            self.assertGreaterEqual(device.next_poll_at, tick + timedelta(minutes=CLAIM_LEASE_MINUTES))
+        # a device whose breaker is open and not due is not claimed either
+        later.write({'health_state': 'open', 'next_retry_at': tick + timedelta(hours=1)})
+        with patch.object(self.env.cr, 'commit'):
+            self.assertFalse(Device._claim_due_device(due_by=tick + timedelta(minutes=10)))
+
+    def test_cron_rolls_back_a_failed_device(self):
+        device = self._new_device()
+        self._only_devices(device)
+        with patch.object(type(device), 'sync_data', side_effect=RuntimeError('boom')), \
+                patch.object(self.env.cr, 'commit') as commit, \
+                patch.object(self.env.cr, 'rollback') as rollback:
+            self.assertEqual(self.env['sa40.device'].cron_sync_all_devices(), 0)
+        # the half-applied transaction is dropped, only the claims were committed
+        self.assertEqual(rollback.call_count, 1)
+        self.assertEqual(commit.call_count, 2)
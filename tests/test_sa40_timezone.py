@@ -0,0 +1,101 @@
+# tests/test_sa40_timezone.py
+"""Device timezones: timestamp normalisation, clock skew and the 18.0.1.2 migration."""
+import importlib.util
+import os
+from datetime import datetime
+
+import pytz
+
+from odoo import fields
+from odoo.tests import tagged
+
+from ..models.sa40_device import TimestampNormalizer
+from .common import Sa40FakeDeviceCase
+
+MIGRATION = os.path.join(os.path.dirname(__file__), os.pardir, 'migrations', '18.0.1.2', 'post-migrate.py')
+
+
+def _load_migration():
+    spec = importlib.util.spec_from_file_location('sa40_post_migrate_18_0_1_2', MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Timezone(Sa40FakeDeviceCase):
+
+    fake_network = 93
+
+    def test_normalizer_dst(self):
+        normalizer = TimestampNormalizer('Europe/Paris')
+        # winter (UTC+1) and summer (UTC+2) time
+        self.assertEqual(normalizer.to_utc(datetime(2025, 1, 15, 8, 0)), datetime(2025, 1, 15, 7, 0))
+        self.assertEqual(normalizer.to_utc(datetime(2025, 7, 15, 8, 0)), datetime(2025, 7, 15, 6, 0))
+        # around the spring switch (02:00 -> 03:00)
+        self.assertEqual(normalizer.to_utc(datetime(2025, 3, 30, 1, 30)), datetime(2025, 3, 30, 0, 30))
+        self.assertEqual(normalizer.to_utc(datetime(2025, 3, 30, 3, 30)), datetime(2025, 3, 30, 1, 30))
+        # the repeated autumn hour is read as standard time
+        self.assertEqual(normalizer.to_utc(datetime(2025, 10, 26, 2, 30)), datetime(2025, 10, 26, 1, 30))
+        self.assertEqual(normalizer.to_local(datetime(2025, 10, 26, 0, 30)), datetime(2025, 10, 26, 2, 30))
+        self.assertEqual(normalizer.to_local(datetime(2025, 10, 26, 1, 30)), datetime(2025, 10, 26, 2, 30))
+
+    def test_normalizer_batch(self):
+        normalizer = TimestampNormalizer('Europe/Paris')
+        anchored = fields.Datetime.to_datetime('2025-01-15 07:00:00').replace(tzinfo=pytz.utc)
+        self.assertEqual(
+            normalizer.normalize(['2025-01-15 08:00:00', anchored, 'not a date', None]),
+            [datetime(2025, 1, 15, 7, 0), datetime(2025, 1, 15, 7, 0), None, None],
+        )
+        # an unknown zone falls back to UTC instead of failing the sync
+        self.assertEqual(TimestampNormalizer('Mars/Olympus').to_utc(datetime(2025, 1, 1, 8, 0)), datetime(2025, 1, 1, 8, 0))
+
+    def test_health_scan_clock_skew(self):
+        device = self._new_device(clock_skew=120)
+        result = device._health_scan(force=True)[device]
+        self.assertTrue(result['ok'])
+        self.assertAlmostEqual(device.clock_skew, 120, delta=5)
+        self.assertEqual(device.serial_number, 'FAKE0001')
+
+    def _legacy_logs(self, device, stamps):
+        # rows as stored before 18.0.1.2: device clock readings
+        self.env.cr.executemany(
+            "INSERT INTO sa40_attendance_log (device_id, log_user_uid, timestamp) VALUES (%s, '1001', %s)",
+            [(device.id, ts) for ts in stamps])
+
+    def test_migration_shifts_to_utc_and_parks_collisions(self):
+        device = self._new_device()
+        self._legacy_logs(device, [
+            datetime(2025, 1, 15, 8, 0),
+            datetime(2025, 1, 15, 9, 0),   # becomes 08:00 UTC: the previous row must move first
+            datetime(2025, 3, 30, 2, 30),  # inside the spring gap, same instant as 03:30
+            datetime(2025, 3, 30, 3, 30),
+        ])
+        self.env.ref('base.user_admin').partner_id.tz = 'Europe/Paris'
+        self.env.flush_all()
+
+        _load_migration().migrate(self.env.cr, '18.0.1.1')
+
+        self.env.invalidate_all()
+        self.assertEqual(device.tz, 'Europe/Paris')
+        logs = self.env['sa40.attendance.log'].search([('device_id', '=', device.id)], order='timestamp')
+        self.assertEqual(logs.mapped('timestamp'), [
+            datetime(2025, 1, 15, 7, 0), datetime(2025, 1, 15, 8, 0), datetime(2025, 3, 30, 1, 30),
+        ])
+        self.env.cr.execute("SELECT timestamp FROM sa40_attendance_log_tz_conflict WHERE device_id = %s", (device.id,))
+        self.assertEqual(self.env.cr.fetchall(), [(datetime(2025, 3, 30, 2, 30),)])
+
+    def test_migration_without_admin_timezone(self):
+        device = self._new_device()
+        self._legacy_logs(device, [datetime(2025, 1, 15, 8, 0)])
+        self.env.ref('base.user_admin').partner_id.tz = False
+        self.env.flush_all()
+
+        migration = _load_migration()
+        with self.assertLogs(migration._logger, level='WARNING'):
+            migration.migrate(self.env.cr, '18.0.1.1')
+
+        self.env.invalidate_all()
+        self.assertEqual(device.tz, 'UTC')
+        self.assertEqual(self.env['sa40.attendance.log'].search([('device_id', '=', device.id)]).timestamp,
+                         datetime(2025, 1, 15, 8, 0))
@@ -0,0 +1,53 @@
+# tests/test_sa40_usb_import.py
+"""Offline import of SA40 USB attendance dumps."""
+import base64
+import io
+
+from odoo.tests import tagged
+
+from ..models.sa40_usb_import_wizard import _iter_attlog_records
+from .common import Sa40FakeDeviceCase
+
+
+@tagged('post_install', '-at_install')
+class TestSa40UsbImport(Sa40FakeDeviceCase):
+
+    fake_network = 91
+
+    def test_attlog_parser(self):
+        data = ('\ufeff    1001\t2025-01-15 08:00:00\t1\t0\t0\t0\n'
+                '\n'
+                '1002 2025-01-15 08:05:00 1 1 0 0\n'
+                'garbage\n').encode('utf-8')
+        stream = io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', errors='replace')
+        records = list(_iter_attlog_records(stream))
+        self.assertEqual([(r.user_id, r.timestamp, r.punch) for r in records], [
+            ('1001', '2025-01-15 08:00:00', '0'),
+            ('1002', '2025-01-15 08:05:00', '1'),
+            ('garbage', None, None),
+        ])
+
+    def test_usb_import(self):
+        device = self._new_device()
+        content = '\ufeff1001\t2025-01-15 08:00:00\t1\t0\t0\t0\n1001\t2025-01-15 17:00:00\t1\t1\t0\t0\n'
+        wizard = self.env['sa40.usb.import.wizard'].create({
+            'device_id': device.id, 'data_file': base64.b64encode(content.encode('utf-8')),
+        })
+        wizard.action_import()
+        logs = self.env['sa40.attendance.log'].search([('device_id', '=', device.id)])
+        self.assertEqual(set(logs.mapped('log_user_uid')), {'1001'})
+        self.assertEqual(len(logs), 2)
+        run = self.env['sa40.sync.run'].search([('device_id', '=', device.id), ('operation', '=', 'import')], limit=1)
+        self.assertEqual((run.attendance_created, run.attendance_invalid), (2, 0))
+
+    def test_usb_import_reads_the_stored_file(self):
+        device = self._new_device()
+        wizard = self.env['sa40.usb.import.wizard'].create({
+            'device_id': device.id, 'data_file': base64.b64encode(b'1001\t2025-01-15 08:00:00\t1\t0\t0\t0\n'),
+        })
+        attachment = self.env['ir.attachment'].sudo().search([
+            ('res_model', '=', wizard._name), ('res_field', '=', 'data_file'), ('res_id', '=', wizard.id),
+        ])
+        self.assertEqual(len(attachment), 1)
+        with wizard._open_data_file() as data:
+            self.assertEqual(data.readline(), b'1001\t2025-01-15 08:00:00\t1\t0\t0\t0\n')
@@ -0,0 +1,51 @@
+# tests/test_sa40_verification.py
+"""Attendance sheet verification: sheet writes, punctuality statistics."""
+from datetime import date
+
+from odoo.tests import tagged
+
+from .common import Sa40FakeDeviceCase
+
+
+@tagged('post_install', '-at_install')
+class TestSa40Verification(Sa40FakeDeviceCase):
+
+    fake_network = 88
+
+    def test_write_sheet_deltas(self):
+        if 'sc.attendance.sheet' not in self.env:
+            self.skipTest("sc.attendance.sheet is not installed")
+        sheets = self.env['sc.attendance.sheet'].sudo().search([], limit=2)
+        if len(sheets) < 2:
+            self.skipTest("needs two attendance sheets")
+        device = self._new_device()
+        first, second = sheets
+        device._write_sheet_deltas({first: {'note': 'Doe John (late): 08:20'}, second: {'note': 'Doe John (late): 08:20'}})
+        self.assertEqual(sheets.mapped('note'), ['Doe John (late): 08:20'] * 2)
+        # a failing sheet does not block the others
+        device._write_sheet_deltas({first: {'note': 'kept'}, second: {'teacher_presence': 'not a presence'}})
+        self.assertEqual(first.note, 'kept')
+
+    def test_punctuality_statistics(self):
+        device = self._new_device()
+        alice, bob = self._new_user('sa40.alice'), self._new_user('sa40.bob')
+        monday, tuesday = date(2025, 9, 1), date(2025, 9, 2)
+        Entry = self.env['sa40.punctuality.entry']
+        rows = [
+            (101, alice.id, monday, 7, 'Batch A', 'on_time'),
+            (101, bob.id, monday, 7, 'Batch A', 'absent'),
+            (102, alice.id, tuesday, 7, 'Batch A', 'late'),
+            (102, bob.id, tuesday, 7, 'Batch A', 'on_time'),
+        ]
+        self.assertEqual(Entry._record_classifications(device, rows), 4)
+
+        stat = self.env['sa40.punctuality.stat'].search([('user_id', '=', alice.id), ('week', '=', monday)])
+        self.assertEqual((stat.sessions, stat.on_time, stat.late, stat.absent), (2, 1, 1, 0))
+        self.assertAlmostEqual(stat.on_time_rate, 50.0)
+
+        # unchanged classifications are not rewritten
+        self.assertEqual(Entry._record_classifications(device, rows), 0)
+        # a later verification marks bob late on monday
+        self.assertEqual(Entry._record_classifications(device, [(101, bob.id, monday, 7, 'Batch A', 'late')]), 1)
+        stat = self.env['sa40.punctuality.stat'].search([('user_id', '=', bob.id), ('week', '=', monday)])
+        self.assertEqual((stat.on_time, stat.late, stat.absent), (1, 1, 0))